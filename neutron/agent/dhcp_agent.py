@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import sys
 
@@ -37,6 +38,7 @@ from neutron.common import utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
+from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import service
@@ -64,18 +66,37 @@ class DhcpAgent(manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('reload_allocations_interval', default=0,
+                   help=_("Number of seconds during which the port events "
+                          "of a network are merged into a single reload of "
+                          "its DHCP server. 0 reloads on every event.")),
+        cfg.BoolOpt('compact_network_cache', default=False,
+                    help=_("Keep the networks, subnets and ports known to "
+                           "the agent in slotted objects rather than in "
+                           "dicts, which takes much less memory. Only "
+                           "enable if the DHCP driver does not need them "
+                           "to be dicts.")),
     ]
 
     def __init__(self, host=None):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync_reasons = []
+        # ids of the networks whose allocations are waiting to be reloaded
+        self.pending_reloads = set()
+        # network id -> info fetched by the resync in progress, None when
+        # the info must be fetched again as an event changed the network
+        self.pending_syncs = {}
+        # Set to False when the server doesn't support
+        # get_active_networks_changes
+        self.use_active_networks_changes_rpc = True
         self.conf = cfg.CONF
         self.cache = NetworkCache()
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
         self.plugin_rpc = DhcpPluginApi(topics.PLUGIN,
-                                        ctx, self.conf.use_namespaces)
+                                        ctx, self.conf.use_namespaces,
+                                        self.conf.compact_network_cache)
         # create dhcp dir to store dhcp info
         dhcp_dir = os.path.dirname("/%s/dhcp/" % self.conf.state_path)
         if not os.path.isdir(dhcp_dir):
@@ -129,6 +150,7 @@ class DhcpAgent(manager.Manager):
             getattr(driver, action)(**action_kwargs)
             return True
         except exceptions.Conflict:
+            self.cache.forget_revision(network.id)
             # No need to resync here, the agent will receive the event related
             # to a status update for the network
             LOG.warning(_('Unable to %(action)s dhcp for %(net_id)s: there is '
@@ -136,6 +158,7 @@ class DhcpAgent(manager.Manager):
                           'that the network and/or its subnet(s) still exist.')
                         % {'net_id': network.id, 'action': action})
         except Exception as e:
+            self.cache.forget_revision(network.id)
             self.schedule_resync(e)
             if (isinstance(e, n_rpc.RemoteError)
                 and e.exc_type == 'NetworkNotFound'
@@ -149,16 +172,34 @@ class DhcpAgent(manager.Manager):
         """Schedule a resync for a given reason."""
         self.needs_resync_reasons.append(reason)
 
-    @utils.synchronized('dhcp-agent')
     def sync_state(self):
-        """Sync the local DHCP state with Neutron."""
+        """Sync the local DHCP state with Neutron.
+
+        Only the networks changed since the last sync are configured, the
+        networks unknown to the agent first, by num_sync_threads green
+        threads. The network events are not blocked by the resync: a
+        network changed by an event before its turn is skipped or fetched
+        again.
+        """
         LOG.info(_('Synchronizing state'))
+        networks = self._prepare_sync()
+        if networks is None:
+            return
         pool = eventlet.GreenPool(cfg.CONF.num_sync_threads)
+        for network in networks:
+            pool.spawn(self._sync_network, network.id)
+        pool.waitall()
+        LOG.info(_('Synchronizing state complete'))
+
+    @utils.synchronized('dhcp-agent')
+    def _prepare_sync(self):
+        """Disable the deleted networks and return the ones to configure."""
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            active_network_ids = set(network.id for network in active_networks)
+            networks, unchanged_ids = self._get_active_networks_changes()
+            active_network_ids = set(unchanged_ids)
+            active_network_ids.update(network.id for network in networks)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
                     self.disable_dhcp_helper(deleted_id)
@@ -166,15 +207,58 @@ class DhcpAgent(manager.Manager):
                     self.schedule_resync(e)
                     LOG.exception(_('Unable to sync network state on deleted '
                                     'network %s'), deleted_id)
-
-            for network in active_networks:
-                pool.spawn(self.safe_configure_dhcp_for_network, network)
-            pool.waitall()
-            LOG.info(_('Synchronizing state complete'))
-
         except Exception as e:
             self.schedule_resync(e)
             LOG.exception(_('Unable to sync network state.'))
+            return
+
+        # The networks created while the agent was down wait the longest
+        networks.sort(key=lambda network: network.id in known_network_ids)
+        self.pending_syncs = dict((network.id, network)
+                                  for network in networks)
+        return networks
+
+    def _get_active_networks_changes(self):
+        """Return the networks to configure and the ids of the others."""
+        if self.use_active_networks_changes_rpc:
+            try:
+                return self.plugin_rpc.get_active_networks_changes(
+                    self.cache.get_revisions())
+            except n_rpc.RemoteError as e:
+                if e.exc_type not in ('NoSuchMethod', 'UnsupportedVersion'):
+                    raise
+                LOG.info(_("The server doesn't support "
+                           "get_active_networks_changes, using "
+                           "get_active_networks_info"))
+                self.use_active_networks_changes_rpc = False
+        return self.plugin_rpc.get_active_networks_info(), []
+
+    def _sync_network(self, network_id):
+        with self._network_lock(network_id):
+            if network_id not in self.pending_syncs:
+                # Already configured by an event
+                return
+            network = self.pending_syncs.pop(network_id)
+            if network is None:
+                network = self.safe_get_network_info(network_id)
+                if not network:
+                    return
+            self.safe_configure_dhcp_for_network(network)
+
+    def _network_lock(self, network_id):
+        """Serialize the events and the resync of a network."""
+        return lockutils.lock('dhcp-agent-network-%s' % network_id)
+
+    @contextlib.contextmanager
+    def _network_event(self, network_id):
+        """Handle an event which fetches the network info itself.
+
+        The info fetched by the resync is older, the network is dropped from
+        the resync.
+        """
+        with self._network_lock(network_id):
+            self.pending_syncs.pop(network_id, None)
+            yield
 
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
@@ -269,27 +353,32 @@ class DhcpAgent(manager.Manager):
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
         network_id = payload['network']['id']
-        self.enable_dhcp_helper(network_id)
+        with self._network_event(network_id):
+            self.enable_dhcp_helper(network_id)
 
     @utils.synchronized('dhcp-agent')
     def network_update_end(self, context, payload):
         """Handle the network.update.end notification event."""
         network_id = payload['network']['id']
-        if payload['network']['admin_state_up']:
-            self.enable_dhcp_helper(network_id)
-        else:
-            self.disable_dhcp_helper(network_id)
+        with self._network_event(network_id):
+            if payload['network']['admin_state_up']:
+                self.enable_dhcp_helper(network_id)
+            else:
+                self.disable_dhcp_helper(network_id)
 
     @utils.synchronized('dhcp-agent')
     def network_delete_end(self, context, payload):
         """Handle the network.delete.end notification event."""
-        self.disable_dhcp_helper(payload['network_id'])
+        network_id = payload['network_id']
+        with self._network_event(network_id):
+            self.disable_dhcp_helper(network_id)
 
     @utils.synchronized('dhcp-agent')
     def subnet_update_end(self, context, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        with self._network_event(network_id):
+            self.refresh_dhcp_helper(network_id)
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
@@ -300,16 +389,58 @@ class DhcpAgent(manager.Manager):
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            with self._network_event(network.id):
+                self.refresh_dhcp_helper(network.id)
+
+    def reload_allocations(self, network):
+        """Reload the allocations of a network after a port event.
+
+        When reload_allocations_interval is set, the first event starts a
+        short-lived thread which waits for that interval and then reloads
+        each network with pending events once, from the cache.
+        """
+        if network.id in self.pending_syncs:
+            # The cached network may not be configured yet, the resync
+            # will configure it with its current info
+            self.pending_syncs[network.id] = None
+            return
+        if not self.conf.reload_allocations_interval:
+            self.call_driver('reload_allocations', network)
+            return
+        if self.pending_reloads:
+            self.pending_reloads.add(network.id)
+            return
+        self.pending_reloads.add(network.id)
+
+        def last_out_reloads():
+            eventlet.sleep(self.conf.reload_allocations_interval)
+            self._reload_pending_allocations()
+
+        eventlet.spawn_n(last_out_reloads)
+
+    @utils.synchronized('dhcp-agent')
+    def _reload_pending_allocations(self):
+        network_ids = self.pending_reloads
+        self.pending_reloads = set()
+        for network_id in network_ids:
+            with self._network_lock(network_id):
+                # The network may have been disabled in the meantime
+                network = self.cache.get_network_by_id(network_id)
+                if network and network_id not in self.pending_syncs:
+                    self.call_driver('reload_allocations', network)
 
     @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
         """Handle the port.update.end notification event."""
-        updated_port = dhcp.DictModel(payload['port'])
-        network = self.cache.get_network_by_id(updated_port.network_id)
-        if network:
-            self.cache.put_port(updated_port)
-            self.call_driver('reload_allocations', network)
+        if self.conf.compact_network_cache:
+            updated_port = dhcp.PortModel(payload['port'])
+        else:
+            updated_port = dhcp.DictModel(payload['port'])
+        with self._network_lock(updated_port.network_id):
+            network = self.cache.get_network_by_id(updated_port.network_id)
+            if network:
+                self.cache.put_port(updated_port)
+                self.reload_allocations(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -319,9 +450,10 @@ class DhcpAgent(manager.Manager):
         """Handle the port.delete.end notification event."""
         port = self.cache.get_port_by_id(payload['port_id'])
         if port:
-            network = self.cache.get_network_by_id(port.network_id)
-            self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            with self._network_lock(port.network_id):
+                network = self.cache.get_network_by_id(port.network_id)
+                self.cache.remove_port(port)
+                self.reload_allocations(network)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -384,24 +516,46 @@ class DhcpPluginApi(n_rpc.RpcProxy):
         1.0 - Initial version.
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
+        1.2 - Added get_active_networks_changes.
 
     """
 
     BASE_RPC_API_VERSION = '1.1'
 
-    def __init__(self, topic, context, use_namespaces):
+    def __init__(self, topic, context, use_namespaces, compact_models=False):
         super(DhcpPluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.context = context
         self.host = cfg.CONF.host
         self.use_namespaces = use_namespaces
+        # Model of the networks, which are cached by the agent
+        if compact_models:
+            self.net_model = dhcp.CompactNetModel
+        else:
+            self.net_model = dhcp.NetModel
 
     def get_active_networks_info(self):
         """Make a remote process call to retrieve all network info."""
         networks = self.call(self.context,
                              self.make_msg('get_active_networks_info',
                                            host=self.host))
-        return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+        return [self.net_model(self.use_namespaces, n) for n in networks]
+
+    def get_active_networks_changes(self, revisions):
+        """Make a remote process call to retrieve the changed networks.
+
+        :param revisions: dict of network id -> revision known to the agent
+        :returns: the info of the active networks whose revision changed,
+                  and the ids of the other active networks
+        """
+        changes = self.call(self.context,
+                            self.make_msg('get_active_networks_changes',
+                                          host=self.host,
+                                          revisions=revisions),
+                            version='1.2')
+        return ([self.net_model(self.use_namespaces, n)
+                 for n in changes['networks']],
+                changes['unchanged'])
 
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
@@ -410,7 +564,7 @@ class DhcpPluginApi(n_rpc.RpcProxy):
                                           network_id=network_id,
                                           host=self.host))
         if network:
-            return dhcp.NetModel(self.use_namespaces, network)
+            return self.net_model(self.use_namespaces, network)
 
     def get_dhcp_port(self, network_id, device_id):
         """Make a remote process call to get the dhcp port."""
@@ -469,6 +623,22 @@ class NetworkCache(object):
     def get_network_ids(self):
         return self.cache.keys()
 
+    def get_revisions(self):
+        """Return the revision of the networks fetched by a resync."""
+        return dict((network.id, network.revision)
+                    for network in self.cache.values()
+                    if 'revision' in network)
+
+    def forget_revision(self, network_id):
+        """Make the next resync fetch the network again.
+
+        Called when the cached network no longer matches the revision it
+        was fetched at, or its configuration failed.
+        """
+        network = self.get_network_by_id(network_id)
+        if network and 'revision' in network:
+            del network.revision
+
     def get_network_by_id(self, network_id):
         return self.cache.get(network_id)
 
@@ -501,6 +671,7 @@ class NetworkCache(object):
 
     def put_port(self, port):
         network = self.get_network_by_id(port.network_id)
+        self.forget_revision(network.id)
         for index in range(len(network.ports)):
             if network.ports[index].id == port.id:
                 network.ports[index] = port
@@ -512,6 +683,7 @@ class NetworkCache(object):
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
+        self.forget_revision(network.id)
 
         for index in range(len(network.ports)):
             if network.ports[index] == port:
@@ -14,6 +14,7 @@
 #
 # @author: Jaume Devesa, devvesa@gmail.com, Midokura SARL
 
+import collections
 import sys
 
 from oslo.config import cfg
@@ -71,24 +72,12 @@ class DRAgentPluginApi(n_rpc.RpcProxy):
                          topic=self.topic)
 
     def get_advertisenetworks(self, context):
-        """Get the routes advertised from the peers connected with the dynamic
-        routing protocol.
+        """Get the prefixes advertised to the peers connected with the
+        dynamic routing protocol.
 
         :param context: an instance of neutron.context.
-        :returns: a list of dictionaries of a subnet like below:
-            [
-               {
-                'name': '',
-                'network_id': 'ed2e3c10-2e43-4297-9006-2863a2d1abbc',
-                'tenant_id': 'c1210485b2424d48804aad5d39c61b8f',
-                'allocation_pools': [{'start': '10.10.0.2', 'end': '10.10.0.254'}],
-                'gateway_ip': '10.10.0.1',
-                'ip_version': 4,
-                'cidr': '10.10.0.0/24',
-                'id': '4156c7a5-e8c4-4aff-a6e1-8f3c7bc83861',
-                'enable_dhcp': true
-               },
-            ]
+        :returns: a list of the advertised prefixes like below:
+            ['10.10.0.0/24', '192.168.1.0/24']
         """
         networks = self.call(context,
                              self.make_msg('sync_advertisenetworks',
@@ -96,17 +85,146 @@ class DRAgentPluginApi(n_rpc.RpcProxy):
                              topic=self.topic)
         return networks
 
-    def put_discovernetworks(self, context, networks):
+    def get_advertise_routes_generation(self, context):
+        """Get the generation of the routing instance hosted by the agent.
+
+        :param context: an instance of neutron.context.
+        :returns: a dictionary like below:
+            {
+             'routinginstance_id': '4156c7a5-e8c4-4aff-a6e1-8f3c7bc83861',
+             'generation': 42
+            }
+        """
         return self.call(context,
-                         self.make_msg('sync_discovernetworks',
-                                       host=self.host,
-                                       networks=networks),
-                         topic=self.topic)
+                         self.make_msg('get_advertise_routes_generation',
+                                       host=self.host),
+                         topic=self.topic,
+                         version='1.1')
 
+    def get_advertise_routes_snapshot(self, context):
+        """Get all the prefixes advertised by the hosted routing instance.
 
-def dump_remote_best_path_change(event):
-    LOG.debug(_('the best path changed:'), event.remote_as, event.prefix,
-              event.nexthop, event.is_withdraw)
+        :param context: an instance of neutron.context.
+        :returns: a dictionary like below:
+            {
+             'routinginstance_id': '4156c7a5-e8c4-4aff-a6e1-8f3c7bc83861',
+             'generation': 42,
+             'prefixes': ['10.10.0.0/24', '192.168.1.0/24']
+            }
+        """
+        return self.call(context,
+                         self.make_msg('get_advertise_routes_snapshot',
+                                       host=self.host),
+                         topic=self.topic,
+                         version='1.1')
+
+    def put_discoverroutes(self, context, routes):
+        """Send a batch of routes learned from the routing peers.
+
+        :param context: an instance of neutron.context.
+        :param routes: a list of dictionaries of a route like below:
+            [
+              {
+               'destination': '172.16.0.0/16',
+               'nexthop': '10.23.43.22',
+               'withdraw': False,
+               'replaces': '10.23.43.21'
+              },
+            ]
+            'replaces' is only set when the route replaces a previously
+            sent one with another nexthop.
+        """
+        return self.cast(context,
+                         self.make_msg('sync_discoverroutes',
+                                       host=self.host,
+                                       routes=routes),
+                         topic=self.topic,
+                         version='1.2')
+
+
+class DiscoveredRouteQueue(object):
+    """Bounded queue coalescing the best path changes of the peers.
+
+    Only the latest state of every prefix is kept until the queue is
+    drained, so a prefix flapping between two flushes is sent once. When
+    max_pending prefixes are waiting put() asks the caller to drain the
+    queue right away instead of growing it further.
+
+    The nexthop of every prefix the server acknowledged is recorded, so a
+    withdraw names the route the server added and a new best path names
+    the one it replaces. The server then leaves alone the routes it did
+    not learn from the agent.
+    """
+
+    def __init__(self, max_pending, batch_size):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending = collections.OrderedDict()
+        self._sent = {}
+        self.stats = {'received': 0,
+                      'coalesced': 0,
+                      'sent': 0,
+                      'batches': 0,
+                      'forced_flushes': 0,
+                      'max_pending': 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, prefix, nexthop, withdraw):
+        """Queue the new state of a prefix.
+
+        :returns: True if the queue is full and has to be drained.
+        """
+        self.stats['received'] += 1
+        if prefix in self._pending:
+            self.stats['coalesced'] += 1
+            del self._pending[prefix]
+        self._pending[prefix] = {'destination': prefix,
+                                 'nexthop': nexthop,
+                                 'withdraw': withdraw}
+        self.stats['max_pending'] = max(self.stats['max_pending'],
+                                        len(self._pending))
+        if len(self._pending) >= self.max_pending:
+            self.stats['forced_flushes'] += 1
+            return True
+        return False
+
+    def requeue(self, routes):
+        """Put back routes that could not be sent.
+
+        Newer states queued in the meantime take precedence.
+        """
+        for route in routes:
+            self._pending.setdefault(route['destination'], route)
+
+    def acknowledge(self, routes):
+        """Record the routes the server has received."""
+        for route in routes:
+            if route['withdraw']:
+                self._sent.pop(route['destination'], None)
+            else:
+                self._sent[route['destination']] = route['nexthop']
+
+    def _prepare(self, route):
+        sent = self._sent.get(route['destination'])
+        route.pop('replaces', None)
+        if route['withdraw']:
+            if sent:
+                route['nexthop'] = sent
+        elif sent and sent != route['nexthop']:
+            route['replaces'] = sent
+        return route
+
+    def batches(self):
+        """Drain the queue in batches of at most batch_size routes."""
+        pending, self._pending = self._pending, collections.OrderedDict()
+        routes = [self._prepare(route) for route in pending.values()]
+        for i in range(0, len(routes), self.batch_size):
+            batch = routes[i:i + self.batch_size]
+            self.stats['sent'] += len(batch)
+            self.stats['batches'] += 1
+            yield batch
 
 
 class DRAgent(manager.Manager):
@@ -125,9 +243,27 @@ class DRAgent(manager.Manager):
             help=_('The BGP identifier, which MUST be the IPv4 address of the '
                    'node where the dynamic routing agent holds the BGP '
                    'speaker lives.')),
+        cfg.IntOpt(
+            'discovered_routes_interval', default=2,
+            help=_('Seconds during which the best path changes received '
+                   'from the peers are coalesced before being sent to the '
+                   'server.')),
+        cfg.IntOpt(
+            'discovered_routes_batch_size', default=500,
+            help=_('Maximum number of discovered routes sent to the server '
+                   'in a single message.')),
+        cfg.IntOpt(
+            'discovered_routes_max_pending', default=10000,
+            help=_('Number of pending discovered routes that triggers '
+                   'sending them to the server before the end of the '
+                   'interval.')),
     ]
 
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.1 Initial version
+    #   1.2 Added advertise_routes_changed
+    #   1.3 Added routinginstance_rescheduled
+    RPC_API_VERSION = '1.3'
     # This class should be set after the configuration file is loaded
     # explicitly.
     BGP_DRIVER_CLASS = None
@@ -137,34 +273,133 @@ class DRAgent(manager.Manager):
         self.plugin_rpc = DRAgentPluginApi(topics.DRAGENT, host)
         self.fullsync = True
         self.peers = {}
-        self.advertise_networks = {}
+        self.routinginstance_id = None
+        self.advertise_generation = None
+        self.advertise_networks = set()
+        self.discovered_routes = DiscoveredRouteQueue(
+            cfg.CONF.discovered_routes_max_pending,
+            cfg.CONF.discovered_routes_batch_size)
         self.driver = self.__class__.BGP_DRIVER_CLASS(
             cfg.CONF.local_as_number,
             cfg.CONF.router_id,
-            best_path_change_handler=dump_remote_best_path_change)
+            best_path_change_handler=self.best_path_changed)
         super(DRAgent, self).__init__()
 
-    def add_routingpeer(self, context, routing_peer):
+    def after_start(self):
+        self.discovered_routes_loop = loopingcall.FixedIntervalLoopingCall(
+            self._send_discovered_routes)
+        self.discovered_routes_loop.start(
+            interval=cfg.CONF.discovered_routes_interval)
+        LOG.info(_("DR agent started"))
+
+    def best_path_changed(self, event):
+        """Handle a best path change notified by the BGP speaker."""
+        LOG.debug(_('The best path changed: remote_as=%(remote_as)s '
+                    'prefix=%(prefix)s nexthop=%(nexthop)s '
+                    'withdraw=%(withdraw)s'),
+                  {'remote_as': event.remote_as, 'prefix': event.prefix,
+                   'nexthop': event.nexthop, 'withdraw': event.is_withdraw})
+        if self.discovered_routes.put(event.prefix, event.nexthop,
+                                      event.is_withdraw):
+            self._send_discovered_routes()
+
+    def _send_discovered_routes(self):
+        for batch in self.discovered_routes.batches():
+            try:
+                self.plugin_rpc.put_discoverroutes(self.context, batch)
+            except Exception:
+                LOG.exception(_("Failed sending %d discovered routes, they "
+                                "will be retried"), len(batch))
+                self.discovered_routes.requeue(batch)
+            else:
+                self.discovered_routes.acknowledge(batch)
+
+    def add_routingpeer(self, context, payload):
         """Add a new routing peer.
 
         :param context: an instance of neutron.context
-        :param routing_peer: a dictionary of the peer ID and its AS number
+        :param payload: a dictionary of the routing peer as returned by
+            DRAgentPluginApi.get_peers
         """
-        peer_id = routing_peer['peer']
-        peer_as = routing_peer['remote_as']
-        password = routing_peer['password'] or None  # Forbid empty passwords
-        self.driver.add_peer(peer_id, peer_as, password=password)
-        self.peers.add(peer_id)
+        self._add_peer(payload)
 
-    def remove_routingpeer(self, context, routing_peer):
+    def remove_routingpeer(self, context, payload):
         """Remove the given routing peer.
 
         :param context: an instance of neutron.context
-        :param routing_peer: a dictionary of the peer ID and its AS number
+        :param payload: the ID of the routing peer
+        """
+        self._remove_peer(payload)
+
+    def _add_peer(self, routing_peer):
+        password = routing_peer['password'] or None  # Forbid empty passwords
+        self.driver.add_peer(routing_peer['peer'], routing_peer['remote_as'],
+                             password=password)
+        self.peers[routing_peer['id']] = routing_peer
+
+    def _remove_peer(self, routingpeer_id):
+        routing_peer = self.peers.pop(routingpeer_id, None)
+        if routing_peer:
+            self.driver.del_peer(routing_peer['peer'])
+
+    def routinginstance_rescheduled(self, context, payload):
+        """Fetch the snapshot of the routing instance now hosted.
+
+        The agent a routing instance moved from withdraws its prefixes and
+        the one it moved to advertises them.
+
+        :param context: an instance of neutron.context
+        :param payload: the ID of the rescheduled routing instance
+        """
+        try:
+            self._sync_advertise_networks()
+        except Exception:
+            LOG.exception(_("Failed synchronizing the advertised routes of "
+                            "rescheduled routing instance %s"), payload)
+            self.fullsync = True
+
+    def advertise_routes_changed(self, context, payload):
+        """Apply a delta of the prefixes advertised by a routing instance.
+
+        Deltas are versioned with the generation of the routing instance.
+        Stale ones are ignored and a gap in the sequence schedules a full
+        resync on the next periodic task.
+
+        :param context: an instance of neutron.context
+        :param payload: a dictionary like below:
+            {
+             'routinginstance_id': '4156c7a5-e8c4-4aff-a6e1-8f3c7bc83861',
+             'generation': 43,
+             'added': ['10.10.1.0/24'],
+             'removed': []
+            }
         """
-        peer_id = routing_peer['peer']
-        self.driver.del_peer(peer_id)
-        self.peers.remove(peer_id)
+        if payload['routinginstance_id'] != self.routinginstance_id:
+            return
+        generation = payload['generation']
+        if self.advertise_generation is None or self.fullsync:
+            return
+        if generation <= self.advertise_generation:
+            LOG.debug(_('Ignoring stale advertise routes generation %s'),
+                      generation)
+            return
+        if generation != self.advertise_generation + 1:
+            LOG.info(_('Missed advertise routes changes between generation '
+                       '%(current)s and %(received)s, scheduling a full '
+                       'resync'), {'current': self.advertise_generation,
+                                   'received': generation})
+            self.fullsync = True
+            return
+        self._update_advertise_networks(payload['added'], payload['removed'])
+        self.advertise_generation = generation
+
+    def _update_advertise_networks(self, added, removed):
+        if removed:
+            self.driver.withdraw_routes(removed)
+        if added:
+            self.driver.advertise_routes(added)
+        self.advertise_networks.difference_update(removed)
+        self.advertise_networks.update(added)
 
     @periodic_task.periodic_task
     def periodic_sync_peers_task(self, context):
@@ -173,29 +408,39 @@ class DRAgent(manager.Manager):
     def _sync_peers_task(self, context):
         LOG.debug(_("Starting _sync_peers_task - fullsync:%s"),
                   self.fullsync)
-        if not self.fullsync:
-            return
-
-       def calculate_diff(current_dictionary, resources, key):
-            ids = map(lambda x: x[key], resources)
-            current_ids = current_dictionary.keys()
-            removed_resource_set = set(current_ids) - set(ids)
-            addeed_resource_set = set(ids) - set(current_ids)
-            updated_resource_set = set(current_ids) & set(ids)
-            dirty_resource_set = addeed_resource_set & updated_resource_set
-            for removed_resource in removed_resource_set:
-                removed_id = removed_resource[key]
-                del dictionary[removed_id]
-            for dirty_resource in dirty_resource_set:
-                dirty_id = dirty_resource[key]
-                dictionary[dirty_id] = dirty_resource
-
-        # Naive diff calculation for the peers.
-        peers = self.plugin_rpc.get_peers(self.context)
-        calculate_diff(self.peers, peers, 'peer')
-        # Naive diff calculation for the advertised networks.
-        subnets = self.plugin_rpc.get_advertisenetworks(self.context)
-        calculate_diff(self.advertise_networks, subnets, 'id')
+        try:
+            if self.fullsync:
+                self._sync_peers()
+                self._sync_advertise_networks()
+                self.fullsync = False
+            else:
+                self._check_advertise_generation()
+        except Exception:
+            LOG.exception(_("Failed synchronizing dynamic routing state"))
+            self.fullsync = True
+
+    def _sync_peers(self):
+        peers = dict((peer['id'], peer)
+                     for peer in self.plugin_rpc.get_peers(self.context))
+        for routingpeer_id in set(self.peers) - set(peers):
+            self._remove_peer(routingpeer_id)
+        for routingpeer_id in set(peers) - set(self.peers):
+            self._add_peer(peers[routingpeer_id])
+
+    def _sync_advertise_networks(self):
+        snapshot = self.plugin_rpc.get_advertise_routes_snapshot(self.context)
+        prefixes = set(snapshot['prefixes'])
+        self._update_advertise_networks(prefixes - self.advertise_networks,
+                                        self.advertise_networks - prefixes)
+        self.routinginstance_id = snapshot['routinginstance_id']
+        self.advertise_generation = snapshot['generation']
+
+    def _check_advertise_generation(self):
+        state = self.plugin_rpc.get_advertise_routes_generation(self.context)
+        if (state['routinginstance_id'] != self.routinginstance_id or
+                state['generation'] != self.advertise_generation):
+            LOG.debug(_('Advertise routes out of sync, fetching snapshot'))
+            self._sync_advertise_networks()
 
 
 class DRAgentWithStateReport(DRAgent):
@@ -218,6 +463,12 @@ class DRAgentWithStateReport(DRAgent):
 
     def _report_state(self):
         LOG.debug(_("Report state task started"))
+        configurations = self.agent_state['configurations']
+        configurations['peers'] = len(self.peers)
+        configurations['advertise_routes'] = len(self.advertise_networks)
+        configurations['discovered_routes'] = dict(
+            self.discovered_routes.stats,
+            pending=len(self.discovered_routes))
         try:
             self.state_rpc.report_state(self.context, self.agent_state)
             self.agent_state.pop('start_flag', None)
@@ -240,7 +491,7 @@ def main(manager='neutron.agent.dr_agent.DRAgentWithStateReport'):
         cfg.CONF.bgp_speaker_driver)
 
     common_config.init(sys.argv[1:])
-    config.setup_logging(conf)
+    common_config.setup_logging(cfg.CONF)
     server = neutron_service.Service.create(
         binary='neutron-dr-agent',
         topic=topics.DR_AGENT,
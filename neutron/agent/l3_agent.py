@@ -14,6 +14,7 @@
 #
 
 import sys
+import time
 
 import datetime
 import eventlet
@@ -163,6 +164,9 @@ class RouterInfo(object):
             #FIXME(danwent): use_ipv6=True,
             namespace=self.ns_name)
         self.routes = []
+        # State last applied by process_router. None until the router has
+        # been fully reconciled with its namespace, or after a failure.
+        self.applied_state = None
         # DVR Data
         # Linklocal router to floating IP addr
         self.rtr_2_fip = None
@@ -395,6 +399,10 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of routers processed concurrently. A "
+                          "router is never processed by more than one "
+                          "worker at a time.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -437,6 +445,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         self.fip_priorities = set(range(FIP_PR_START, FIP_PR_END))
 
         self._queue = RouterProcessingQueue()
+        # Duration in seconds of the last update processed for each router
+        self.router_processing_times = {}
         super(L3NATAgent, self).__init__(conf=self.conf)
 
         self.target_ex_net_id = None
@@ -457,6 +467,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             LOG.error(msg)
             raise SystemExit(1)
 
+        if self.conf.router_processing_workers < 1:
+            msg = _('router_processing_workers must be at least 1.')
+            LOG.error(msg)
+            raise SystemExit(1)
+
     def _list_namespaces(self):
         """Get a set of all router namespaces on host
 
@@ -709,6 +724,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         # TODO(mrsmith) - we shouldn't need to check here
         if 'distributed' not in ri.router:
             ri.router['distributed'] = False
+        # Reset the snapshot first so that a failure while processing forces
+        # a full reconcile on the next update.
+        applied = ri.applied_state
+        ri.applied_state = None
+        full_reconcile = applied is None
+        applied = applied or {}
         ri.iptables_manager.defer_apply_on()
         ex_gw_port = self._get_ex_gw_port(ri)
         internal_ports = ri.router.get(l3_constants.INTERFACE_KEY, [])
@@ -747,7 +768,14 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                               self.get_internal_device_name,
                               self.root_helper)
 
-        existing_devices = self._get_existing_devices(ri)
+        # Devices can only become stale when ports went away, so the
+        # namespace is listed only for those updates or a full reconcile.
+        gw_port_changed = ((ex_gw_port or {}).get('id') !=
+                           (ri.ex_gw_port or {}).get('id'))
+        if full_reconcile or old_ports or gw_port_changed:
+            existing_devices = self._get_existing_devices(ri)
+        else:
+            existing_devices = []
         current_internal_devs = set([n for n in existing_devices
                                      if n.startswith(INTERNAL_DEV_PREFIX)])
         current_port_devs = set([self.get_internal_device_name(id) for
@@ -791,44 +819,67 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         # Process static routes for router
         self.routes_updated(ri)
         # Process SNAT rules for external gateway
+        state = {}
         if (not ri.router['distributed'] or
             ex_gw_port and ri.router['gw_port_host'] == self.host):
             # Get IPv4 only internal CIDRs
             internal_cidrs = [p['ip_cidr'] for p in ri.internal_ports
                               if netaddr.IPNetwork(p['ip_cidr']).version == 4]
+            state['snat'] = (ex_gw_port, internal_cidrs, interface_name,
+                             ri.router.get('enable_snat', True))
+            if state['snat'] == applied.get('snat'):
+                # The rules built for this gateway and these subnets are
+                # already in place.
+                ri._snat_action = None
             ri.perform_snat_action(self._handle_router_snat_rules,
                                    internal_cidrs, interface_name)
 
         # Process SNAT/DNAT rules for floating IPs
         fip_statuses = {}
-        try:
-            if ex_gw_port:
-                existing_floating_ips = ri.floating_ips
-                self.process_router_floating_ip_nat_rules(ri)
-                ri.iptables_manager.defer_apply_off()
-                # Once NAT rules for floating IPs are safely in place
-                # configure their addresses on the external gateway port
-                fip_statuses = self.process_router_floating_ip_addresses(
-                    ri, ex_gw_port)
-        except Exception:
-            # TODO(salv-orlando): Less broad catching
-            # All floating IPs must be put in error state
-            for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, []):
-                fip_statuses[fip['id']] = l3_constants.FLOATINGIP_STATUS_ERROR
-
         if ex_gw_port:
-            # Identify floating IPs which were disabled
-            ri.floating_ips = set(fip_statuses.keys())
-            for fip_id in existing_floating_ips - ri.floating_ips:
-                fip_statuses[fip_id] = l3_constants.FLOATINGIP_STATUS_DOWN
-            # Update floating IP status on the neutron server
-            self.plugin_rpc.update_floatingip_statuses(
-                self.context, ri.router_id, fip_statuses)
+            state['floating_ips'] = (ex_gw_port, set(
+                (fip['id'], fip['floating_ip_address'],
+                 fip['fixed_ip_address'], fip.get('host'))
+                for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, [])))
+        if (ex_gw_port and
+                state['floating_ips'] == applied.get('floating_ips')):
+            # Floating IP rules, addresses and statuses are up to date
+            ri.iptables_manager.defer_apply_off()
+        else:
+            try:
+                if ex_gw_port:
+                    existing_floating_ips = ri.floating_ips
+                    self.process_router_floating_ip_nat_rules(ri)
+                    ri.iptables_manager.defer_apply_off()
+                    # Once NAT rules for floating IPs are safely in place
+                    # configure their addresses on the external gateway port
+                    fip_statuses = self.process_router_floating_ip_addresses(
+                        ri, ex_gw_port)
+            except Exception:
+                # TODO(salv-orlando): Less broad catching
+                # All floating IPs must be put in error state
+                for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, []):
+                    fip_statuses[fip['id']] = (
+                        l3_constants.FLOATINGIP_STATUS_ERROR)
+
+            if ex_gw_port:
+                # Identify floating IPs which were disabled
+                ri.floating_ips = set(fip_statuses.keys())
+                for fip_id in existing_floating_ips - ri.floating_ips:
+                    fip_statuses[fip_id] = l3_constants.FLOATINGIP_STATUS_DOWN
+                # Update floating IP status on the neutron server
+                self.plugin_rpc.update_floatingip_statuses(
+                    self.context, ri.router_id, fip_statuses)
+                if (l3_constants.FLOATINGIP_STATUS_ERROR in
+                        fip_statuses.values()):
+                    # Retry the floating IPs on the next update
+                    del state['floating_ips']
 
         # Update ex_gw_port and enable_snat on the router info cache
         ri.ex_gw_port = ex_gw_port
         ri.snat_ports = snat_ports
         ri.enable_snat = ri.router.get('enable_snat')
+        ri.applied_state = state
 
     def _handle_router_snat_rules(self, ri, ex_gw_port, internal_cidrs,
                                   interface_name, action):
@@ -1579,6 +1630,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_router():
             LOG.debug("Starting router update for %s", update.id)
+            start = time.time()
             router = update.router
             if update.action != DELETE_ROUTER and not router:
                 try:
@@ -1596,16 +1648,31 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
 
             if not router:
                 self._router_removed(update.id)
+                self.router_processing_times.pop(update.id, None)
                 continue
 
             self._process_routers([router])
-            LOG.debug("Finished a router update for %s", update.id)
+            elapsed = time.time() - start
+            self.router_processing_times[update.id] = elapsed
+            LOG.debug("Finished a router update for %(id)s in %(time).3fs",
+                      {'id': update.id, 'time': elapsed})
             rp.fetched_and_processed(update.timestamp)
 
+    def get_router_processing_stats(self):
+        """Summarize the last processing time of the hosted routers."""
+        times = self.router_processing_times.values()
+        if not times:
+            return {'routers': 0, 'average_time': 0.0, 'max_time': 0.0}
+        return {'routers': len(times),
+                'average_time': round(sum(times) / len(times), 3),
+                'max_time': round(max(times), 3)}
+
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
         while True:
+            # spawn_n blocks while all the workers are busy, so at most
+            # router_processing_workers routers are processed at once.
             pool.spawn_n(self._process_router_update)
 
     def _process_router_delete(self):
@@ -1757,6 +1824,8 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        configurations['router_processing'] = (
+            self.get_router_processing_stats())
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -14,6 +14,7 @@
 
 import abc
 
+import netaddr
 import six
 
 from neutron.openstack.common import log as logging
@@ -34,6 +35,7 @@ class LinuxBGPDriver(object):
         self.as_number = as_number
         self.router_id = router_id
         self.best_path_change_handler = best_path_change_handler
+        self.advertised_routes = set()
 
     @abc.abstractmethod
     def add_peer(self, peer_id, peer_as, password=None):
@@ -51,3 +53,36 @@ class LinuxBGPDriver(object):
 
         :param peer_id: the peer ID
         """
+
+    @abc.abstractmethod
+    def advertise_routes(self, prefixes):
+        """Advertise a batch of prefixes to the routing peers.
+
+        Drivers apply the whole batch in a single pass; prefixes that are
+        already advertised are skipped.
+
+        :param prefixes: an iterable of CIDRs
+        """
+
+    @abc.abstractmethod
+    def withdraw_routes(self, prefixes):
+        """Withdraw a batch of prefixes from the routing peers.
+
+        Prefixes that are not advertised are skipped.
+
+        :param prefixes: an iterable of CIDRs
+        """
+
+    def _coalesce_routes(self, prefixes, advertise=True):
+        """Return the prefixes of a batch that change the advertised set.
+
+        Duplicates and different spellings of the same CIDR are collapsed,
+        so every prefix is handed to the speaker at most once per batch.
+        """
+        prefixes = set(str(netaddr.IPNetwork(prefix).cidr)
+                       for prefix in prefixes)
+        if advertise:
+            prefixes -= self.advertised_routes
+        else:
+            prefixes &= self.advertised_routes
+        return sorted(prefixes)
@@ -37,3 +37,17 @@ class RyuBGPDriver(base.LinuxBGPDriver):
 
     def del_peer(self, peer_id):
         self.bgp_speaker.neighbor_del(peer_id)
+
+    def advertise_routes(self, prefixes):
+        prefixes = self._coalesce_routes(prefixes)
+        for prefix in prefixes:
+            self.bgp_speaker.prefix_add(prefix)
+        self.advertised_routes.update(prefixes)
+        LOG.debug(_('Advertised %d prefixes'), len(prefixes))
+
+    def withdraw_routes(self, prefixes):
+        prefixes = self._coalesce_routes(prefixes, advertise=False)
+        for prefix in prefixes:
+            self.bgp_speaker.prefix_del(prefix)
+        self.advertised_routes.difference_update(prefixes)
+        LOG.debug(_('Withdrew %d prefixes'), len(prefixes))
@@ -130,6 +130,181 @@ class NetModel(DictModel):
         return self._ns_name
 
 
+class SlotModel(object):
+    """Compact counterpart of DictModel for the resources cached by agents.
+
+    The known fields of a resource are kept in __slots__ and the other ones
+    in a dict, so that an instance takes a fraction of the memory of a
+    DictModel while providing the same attribute access. The items of the
+    list fields in _nested are converted to the given models, other nested
+    dicts to DictModels. The strings repeated within a resource, e.g. the
+    network id of all its ports, are stored once.
+    """
+
+    __slots__ = ('_extra',)
+    # Names of the __slots__ holding fields
+    _fields = ()
+    # field name -> model of the items of the field
+    _nested = {}
+
+    def __init__(self, d, strings=None):
+        object.__setattr__(self, '_extra', None)
+        if strings is None:
+            strings = {}
+        for key, value in d.iteritems():
+            setattr(self, key, self._convert(key, value, strings))
+
+    @classmethod
+    def _convert(cls, key, value, strings):
+        if isinstance(value, basestring):
+            if isinstance(value, unicode):
+                # The ids and addresses are ASCII, which takes much less
+                # memory as a str
+                try:
+                    value = value.encode('ascii')
+                except UnicodeError:
+                    pass
+            return strings.setdefault(value, value)
+        elif isinstance(value, dict):
+            return DictModel(value)
+        elif isinstance(value, (list, tuple)):
+            model = cls._nested.get(key)
+            if model:
+                return type(value)(model(item, strings) for item in value)
+            return type(value)(cls._convert(None, item, strings)
+                               for item in value)
+        return value
+
+    def __getattr__(self, name):
+        # Only called for the names which are neither set slots nor class
+        # attributes
+        if name.startswith('__') or name == '_extra':
+            raise AttributeError(name)
+        try:
+            return self._extra[name]
+        except (KeyError, TypeError):
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            if self._extra is None:
+                object.__setattr__(self, '_extra', {})
+            self._extra[name] = value
+
+    def __delattr__(self, name):
+        try:
+            object.__delattr__(self, name)
+        except AttributeError:
+            if not self._extra or name not in self._extra:
+                raise
+            del self._extra[name]
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def iteritems(self):
+        for name in self._fields:
+            try:
+                yield name, getattr(self, name)
+            except AttributeError:
+                pass
+        if self._extra:
+            for item in self._extra.iteritems():
+                yield item
+
+    def to_dict(self):
+        def convert(value):
+            if isinstance(value, SlotModel):
+                return value.to_dict()
+            elif isinstance(value, (list, tuple)):
+                return type(value)(convert(item) for item in value)
+            return value
+
+        return dict((key, convert(value)) for key, value in self.iteritems())
+
+    def __eq__(self, other):
+        if isinstance(other, SlotModel):
+            other = other.to_dict()
+        elif not isinstance(other, dict):
+            return NotImplemented
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    # Mutable, like DictModel
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
+
+
+class FixedIpModel(SlotModel):
+    _fields = ('subnet_id', 'ip_address')
+    __slots__ = _fields
+
+
+class PortModel(SlotModel):
+    _fields = ('id', 'name', 'network_id', 'tenant_id', 'admin_state_up',
+               'status', 'mac_address', 'fixed_ips', 'device_id',
+               'device_owner', 'extra_dhcp_opts', 'security_groups',
+               'allowed_address_pairs')
+    __slots__ = _fields
+    _nested = {'fixed_ips': FixedIpModel}
+
+
+class SubnetModel(SlotModel):
+    _fields = ('id', 'name', 'network_id', 'tenant_id', 'ip_version', 'cidr',
+               'gateway_ip', 'enable_dhcp', 'allocation_pools',
+               'dns_nameservers', 'host_routes', 'shared', 'ipv6_ra_mode',
+               'ipv6_address_mode')
+    __slots__ = _fields
+
+
+class CompactNetModel(SlotModel):
+    """NetModel keeping the network, its subnets and ports in SlotModels."""
+
+    _fields = ('id', 'name', 'tenant_id', 'admin_state_up', 'status',
+               'shared', 'subnets', 'ports', 'revision')
+    __slots__ = _fields + ('_ns_name',)
+    _nested = {'subnets': SubnetModel, 'ports': PortModel}
+
+    def __init__(self, use_namespaces, d):
+        super(CompactNetModel, self).__init__(d)
+
+        self._ns_name = (use_namespaces and
+                         "%s%s" % (NS_PREFIX, self.id) or None)
+
+    @property
+    def namespace(self):
+        return self._ns_name
+
+
 @six.add_metaclass(abc.ABCMeta)
 class DhcpBase(object):
 
@@ -435,10 +610,14 @@ class Dnsmasq(DhcpLocalProcess):
             return
 
         self._release_unused_leases()
+        self._conf_files_changed = False
         self._output_hosts_file()
         self._output_addn_hosts_file()
         self._output_opts_file()
-        if self.active:
+        if not self._conf_files_changed:
+            LOG.debug(_('Allocations unchanged for network: %s'),
+                      self.network.id)
+        elif self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
         else:
@@ -520,7 +699,7 @@ class Dnsmasq(DhcpLocalProcess):
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, ip_address))
 
-        utils.replace_file(filename, buf.getvalue())
+        self._replace_file_if_changed(filename, buf.getvalue())
         LOG.debug(_('Done building host file %s'), filename)
         return filename
 
@@ -561,7 +740,7 @@ class Dnsmasq(DhcpLocalProcess):
             # order to obtain it in PTR responses.
             buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
         addn_hosts = self.get_conf_file_name('addn_hosts')
-        utils.replace_file(addn_hosts, buf.getvalue())
+        self._replace_file_if_changed(addn_hosts, buf.getvalue())
         return addn_hosts
 
     def _output_opts_file(self):
@@ -642,9 +821,24 @@ class Dnsmasq(DhcpLocalProcess):
                                                    ','.join(ips)))
 
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        self._replace_file_if_changed(name, '\n'.join(options))
         return name
 
+    def _replace_file_if_changed(self, filename, data):
+        """Write a config file unless it already holds data.
+
+        dnsmasq only needs to be signalled when one of its files changed, and
+        rewriting the host files of a large network is not free.
+        """
+        try:
+            with open(filename) as f:
+                if f.read() == data:
+                    return
+        except IOError:
+            pass
+        utils.replace_file(filename, data)
+        self._conf_files_changed = True
+
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
             self.interface_name,
@@ -0,0 +1,102 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Kernel limit on the length of a set name
+IPSET_NAME_MAX_LENGTH = 31
+IPSET_FAMILY = {constants.IPv4: 'inet',
+                constants.IPv6: 'inet6'}
+
+
+def get_ipset_name(prefix, ethertype, set_id):
+    """Build a set name unique to an ethertype and an id, e.g. a UUID."""
+    return ('%s%s%s' % (prefix, ethertype, set_id))[:IPSET_NAME_MAX_LENGTH]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    The members of the sets created by the manager are remembered, so that
+    only the members added or removed since the last update are sent to the
+    kernel. All the changes to a set are made by a single 'ipset restore'.
+    """
+
+    def __init__(self, root_helper=None, namespace=None):
+        self.root_helper = root_helper
+        self.namespace = namespace
+        # set name -> set of the members in the kernel
+        self.ipsets = {}
+
+    def set_members(self, name, ethertype, members):
+        """Create the set if needed and make members its only members.
+
+        :param members: addresses or CIDRs of the given ethertype
+        """
+        members = set(members)
+        lines = []
+        current = self.ipsets.get(name)
+        if current is None:
+            # The set may be left over from a previous run of the agent
+            lines.append('create %s hash:net family %s' %
+                         (name, IPSET_FAMILY[ethertype]))
+            lines.append('flush %s' % name)
+            current = set()
+        lines += ['add %s %s' % (name, member)
+                  for member in sorted(members - current)]
+        lines += ['del %s %s' % (name, member)
+                  for member in sorted(current - members)]
+        if lines:
+            LOG.debug(_("Updating ipset %(name)s: %(added)s added, "
+                        "%(removed)s removed"),
+                      {'name': name, 'added': len(members - current),
+                       'removed': len(current - members)})
+            self._restore(lines)
+        self.ipsets[name] = members
+
+    def destroy(self, name):
+        """Destroy a set, which must not be used by any iptables rule."""
+        LOG.debug(_("Destroying ipset %s"), name)
+        self._execute(['ipset', 'destroy', name])
+        del self.ipsets[name]
+
+    def destroy_unknown(self, prefixes):
+        """Destroy the sets with one of the prefixes not created by us.
+
+        They are left over from a previous run of the agent. The sets still
+        used by an iptables rule are kept.
+        """
+        prefixes = tuple(prefixes)
+        for name in self._execute(['ipset', 'list', '-name']).split():
+            if name in self.ipsets or not name.startswith(prefixes):
+                continue
+            LOG.debug(_("Destroying unknown ipset %s"), name)
+            try:
+                self._execute(['ipset', 'destroy', name])
+            except RuntimeError:
+                LOG.warn(_("Unable to destroy unknown ipset %s"), name)
+
+    def _restore(self, lines):
+        self._execute(['ipset', 'restore', '-exist'],
+                      process_input='\n'.join(lines) + '\n')
+
+    def _execute(self, cmd, process_input=None):
+        if self.namespace:
+            cmd = ['ip', 'netns', 'exec', self.namespace] + cmd
+        return linux_utils.execute(cmd, root_helper=self.root_helper,
+                                   process_input=process_input)
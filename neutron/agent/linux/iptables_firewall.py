@@ -17,6 +17,7 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
@@ -30,8 +31,18 @@ SPOOF_FILTER = 'spoof-filter'
 CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
+DIRECTION_IP_PREFIX = {INGRESS_DIRECTION: 'source_ip_prefix',
+                       EGRESS_DIRECTION: 'dest_ip_prefix'}
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
+IPSET_PREFIX = 'N'
 LINUX_DEV_LEN = 14
 
+cfg.CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                    group='SECURITYGROUP')
+cfg.CONF.import_opt('incremental_iptables',
+                    'neutron.agent.securitygroups_rpc', group='SECURITYGROUP')
+
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
     """Driver which enforces security groups through iptables rules."""
@@ -41,7 +52,13 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def __init__(self):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
-            use_ipv6=True)
+            use_ipv6=True,
+            incremental=cfg.CONF.SECURITYGROUP.incremental_iptables)
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        if self.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
+            self._unknown_ipsets_removed = False
         # list of port which has security group
         self.filtered_ports = {}
         self._add_fallback_chain_v4v6()
@@ -58,7 +75,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -66,10 +83,17 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             LOG.info(_('Attempted to update port filter which is not '
                        'filtered %s'), port['device'])
             return
+        if (not self._defer_apply and
+                self._only_ipset_members_changed(
+                    {port['device']: self.filtered_ports[port['device']]},
+                    {port['device']: port})):
+            self.filtered_ports[port['device']] = port
+            self._update_ipsets(self.filtered_ports)
+            return
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -80,7 +104,12 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
+        self._apply()
+
+    def _apply(self):
         self.iptables.apply()
+        if not self._defer_apply:
+            self._remove_unused_ipsets()
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -94,6 +123,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._setup_chain(port, EGRESS_DIRECTION)
             self.iptables.ipv4['filter'].add_rule(SG_CHAIN, '-j ACCEPT')
             self.iptables.ipv6['filter'].add_rule(SG_CHAIN, '-j ACCEPT')
+        # The sets must exist before the rules using them are applied
+        self._update_ipsets(ports)
 
     def _remove_chains(self):
         """Remove ingress and egress chain for a port."""
@@ -174,7 +205,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                 ipv4_sg_rules.append(rule)
             elif rule.get('ethertype') == constants.IPv6:
                 if rule.get('protocol') == 'icmp':
-                    rule['protocol'] = 'icmpv6'
+                    # Leave the rules of the port untouched, they are
+                    # compared when the port is updated
+                    rule = dict(rule, protocol='icmpv6')
                 ipv6_sg_rules.append(rule)
         return ipv4_sg_rules, ipv6_sg_rules
 
@@ -279,16 +312,22 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         iptables_rules = []
         self._drop_invalid_packets(iptables_rules)
         self._allow_established(iptables_rules)
+        if self.enable_ipset:
+            security_group_rules = self._remove_remote_group_members(
+                security_group_rules)
         for rule in security_group_rules:
             # These arguments MUST be in the format iptables-save will
-            # display them: source/dest, protocol, sport, dport, target
+            # display them: source/dest, protocol, set, sport, dport, target
             # Otherwise the iptables_manager code won't be able to find
             # them to preserve their [packet:byte] counts.
             args = self._ip_prefix_arg('s',
                                        rule.get('source_ip_prefix'))
             args += self._ip_prefix_arg('d',
                                         rule.get('dest_ip_prefix'))
-            args += self._protocol_arg(rule.get('protocol'))
+            protocol_args = self._protocol_arg(rule.get('protocol'))
+            args += protocol_args[:2]
+            args += self._ipset_arg(rule)
+            args += protocol_args[2:]
             args += self._port_arg('sport',
                                    rule.get('protocol'),
                                    rule.get('source_port_range_min'),
@@ -304,6 +343,89 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
 
         return iptables_rules
 
+    def _remove_remote_group_members(self, security_group_rules):
+        """Merge the rules expanded from the same remote group rule.
+
+        The server converts a rule with a remote group into one rule per
+        member address. In ipset mode the addresses are the members of the
+        ipset of the group, matched by a single rule.
+        """
+        rules = []
+        seen = set()
+        for rule in security_group_rules:
+            if rule.get('remote_group_id'):
+                rule = dict(rule)
+                rule.pop(DIRECTION_IP_PREFIX[rule['direction']], None)
+                key = tuple(sorted(rule.items()))
+                if key in seen:
+                    continue
+                seen.add(key)
+            rules.append(rule)
+        return rules
+
+    def _get_ipset_members(self, ports):
+        """Return the members of the ipset of each remote group.
+
+        :returns: a dict of set name -> (ethertype, set of CIDRs)
+        """
+        ipsets = {}
+        for port in ports.values():
+            for rule in port.get('security_group_rules', []):
+                remote_group_id = rule.get('remote_group_id')
+                if not remote_group_id:
+                    continue
+                ethertype = rule['ethertype']
+                name = ipset_manager.get_ipset_name(
+                    IPSET_PREFIX, ethertype, remote_group_id)
+                members = ipsets.setdefault(name, (ethertype, set()))[1]
+                ip_prefix = rule.get(DIRECTION_IP_PREFIX[rule['direction']])
+                if ip_prefix:
+                    members.add(ip_prefix)
+        return ipsets
+
+    def _update_ipsets(self, ports):
+        if not self.enable_ipset:
+            return
+        for name, (ethertype, members) in self._get_ipset_members(
+                ports).items():
+            self.ipset.set_members(name, ethertype, members)
+
+    def _remove_unused_ipsets(self):
+        """Destroy the sets no longer used once the rules are applied."""
+        if not self.enable_ipset:
+            return
+        used = self._get_ipset_members(self.filtered_ports)
+        for name in list(self.ipset.ipsets):
+            if name not in used:
+                self.ipset.destroy(name)
+        if not self._unknown_ipsets_removed:
+            # The rules of a previous run of the agent, which may match the
+            # sets it left, have been replaced by now.
+            self.ipset.destroy_unknown(
+                ipset_manager.get_ipset_name(IPSET_PREFIX, ethertype, '')
+                for ethertype in (constants.IPv4, constants.IPv6))
+            self._unknown_ipsets_removed = True
+
+    def _only_ipset_members_changed(self, old_ports, new_ports):
+        """Whether updating the ipsets is enough to filter new_ports.
+
+        This is the case when the ports only differ by the members of
+        their remote groups, which leave their iptables rules unchanged.
+        """
+        if not self.enable_ipset or set(old_ports) != set(new_ports):
+            return False
+        for device, new_port in new_ports.items():
+            old_port = old_ports[device]
+            if (dict(old_port, security_group_rules=None) !=
+                    dict(new_port, security_group_rules=None)):
+                return False
+            if (self._remove_remote_group_members(
+                    old_port.get('security_group_rules', [])) !=
+                    self._remove_remote_group_members(
+                        new_port.get('security_group_rules', []))):
+                return False
+        return True
+
     def _drop_invalid_packets(self, iptables_rules):
         # Always drop invalid packets
         iptables_rules += ['-m state --state ' 'INVALID -j DROP']
@@ -351,6 +473,15 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _ipset_arg(self, rule):
+        remote_group_id = rule.get('remote_group_id')
+        if not self.enable_ipset or not remote_group_id:
+            return []
+        name = ipset_manager.get_ipset_name(
+            IPSET_PREFIX, rule['ethertype'], remote_group_id)
+        return ['-m', 'set', '--match-set', name,
+                IPSET_DIRECTION[rule['direction']]]
+
     def _port_chain_name(self, port, direction):
         return iptables_manager.get_chain_name(
             '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
@@ -364,10 +495,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_off(self):
         if self._defer_apply:
             self._defer_apply = False
+            if self._only_ipset_members_changed(
+                    self._pre_defer_filtered_ports, self.filtered_ports):
+                self._pre_defer_filtered_ports = None
+                self._update_ipsets(self.filtered_ports)
+                # The iptables rules are unchanged, don't rewrite them
+                self.iptables.defer_apply_off(apply=False)
+                return
             self._remove_chains_apply(self._pre_defer_filtered_ports)
             self._pre_defer_filtered_ports = None
             self._setup_chains_apply(self.filtered_ports)
             self.iptables.defer_apply_off()
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
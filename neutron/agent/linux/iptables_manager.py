@@ -103,6 +103,12 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # (name, wrap) of the chains that may have changed since the table
+        # was last applied
+        self.dirty_chains = set()
+        # (name, wrap) -> rules of the chains as last applied, None if the
+        # table has never been applied
+        self.applied_chains = None
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -121,6 +127,7 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self.dirty_chains.add((name, wrap))
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -159,6 +166,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self.dirty_chains.add((name, wrap))
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -180,6 +188,8 @@ class IptablesTable(object):
             jump_snippet = '-j %s-%s' % (self.wrap_name, name)
 
         # finally, remove rules from list that have a matching jump chain
+        self.dirty_chains.update((r.chain, r.wrap) for r in self.rules
+                                 if jump_snippet in r.rule)
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
 
@@ -204,6 +214,7 @@ class IptablesTable(object):
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag))
+        self.dirty_chains.add((chain, wrap))
 
     def _wrap_target_chain(self, s, wrap):
         if s.startswith('$'):
@@ -227,6 +238,7 @@ class IptablesTable(object):
 
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name))
+            self.dirty_chains.add((chain, wrap))
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name))
@@ -243,6 +255,8 @@ class IptablesTable(object):
                          if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self.dirty_chains.add((chain, wrap))
 
     def clear_rules_by_tag(self, tag):
         if not tag:
@@ -250,6 +264,79 @@ class IptablesTable(object):
         rules = [rule for rule in self.rules if rule.tag == tag]
         for rule in rules:
             self.rules.remove(rule)
+            self.dirty_chains.add((rule.chain, rule.wrap))
+
+    def _get_chain_rules(self, chains):
+        """Return the rules of the chains in the order they are applied.
+
+        :param chains: (name, wrap) of the chains
+        :returns: a dict of (name, wrap) -> list of rule strings
+        """
+        top_rules = dict((chain, []) for chain in chains)
+        bot_rules = dict((chain, []) for chain in chains)
+        for rule in self.rules:
+            key = (rule.chain, rule.wrap)
+            if key in top_rules:
+                (top_rules if rule.top else bot_rules)[key].append(str(rule))
+
+        def _weed_out_duplicates(rules):
+            # Like IptablesManager._modify_rules, keep the last occurrence
+            seen = set()
+            unique_rules = []
+            for rule in reversed(rules):
+                if rule not in seen:
+                    seen.add(rule)
+                    unique_rules.append(rule)
+            unique_rules.reverse()
+            return unique_rules
+
+        return dict((chain,
+                     _weed_out_duplicates(top_rules[chain] + bot_rules[chain]))
+                    for chain in chains)
+
+    def _get_chains(self):
+        # The built-in chains only have rules
+        chains = set((rule.chain, rule.wrap) for rule in self.rules)
+        chains.update((name, True) for name in self.chains)
+        chains.update((name, False) for name in self.unwrapped_chains)
+        return chains
+
+    def mark_applied(self, changed=None):
+        """Record that the rules of the table are in the kernel.
+
+        :param changed: the chains written by an incremental apply, as
+                        returned by get_changed_chains, None if the whole
+                        table was written
+        """
+        if changed is None:
+            self.applied_chains = self._get_chain_rules(self._get_chains())
+        else:
+            for chain, rules in changed.items():
+                if rules is None:
+                    del self.applied_chains[chain]
+                else:
+                    self.applied_chains[chain] = rules
+        self.dirty_chains.clear()
+
+    def get_changed_chains(self):
+        """Return the chains that changed since the table was applied.
+
+        Chains removed and added again with the same rules, as the firewall
+        does on every port update, are not changed.
+
+        :returns: a dict of (name, wrap) -> list of rule strings, or None
+                  for a chain that was removed
+        """
+        rules = self._get_chain_rules(self.dirty_chains)
+        changed = {}
+        for chain in self.dirty_chains:
+            name, wrap = chain
+            if name in self._select_chain_set(wrap) or rules[chain]:
+                if rules[chain] != self.applied_chains.get(chain):
+                    changed[chain] = rules[chain]
+            elif chain in self.applied_chains:
+                changed[chain] = None
+        return changed
 
 
 class IptablesManager(object):
@@ -277,7 +364,7 @@ class IptablesManager(object):
 
     def __init__(self, _execute=None, state_less=False,
                  root_helper=None, use_ipv6=False, namespace=None,
-                 binary_name=binary_name):
+                 binary_name=binary_name, incremental=False):
         if _execute:
             self.execute = _execute
         else:
@@ -288,6 +375,7 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        self.incremental = incremental
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -352,9 +440,11 @@ class IptablesManager(object):
     def defer_apply_on(self):
         self.iptables_apply_deferred = True
 
-    def defer_apply_off(self):
+    def defer_apply_off(self, apply=True):
+        """Stop deferring, applying the rules unless apply is False."""
         self.iptables_apply_deferred = False
-        self._apply()
+        if apply:
+            self._apply()
 
     def apply(self):
         if self.iptables_apply_deferred:
@@ -381,12 +471,26 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        In incremental mode, once the rules have been applied, only the
+        wrapped chains that changed since are flushed and written again,
+        without reading the current rules. Their [packet:byte] counts are
+        reset.
+
         """
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
+            changes = self._get_incremental_changes(tables)
+            if changes is not None:
+                if changes:
+                    self._restore(cmd, ['-n'], tables,
+                                  self._generate_noflush_restore(changes))
+                for table_name, table in tables.iteritems():
+                    table.mark_applied(changes.get(table_name, {}))
+                continue
+
             args = ['%s-save' % (cmd,), '-c']
             if self.namespace:
                 args = ['ip', 'netns', 'exec', self.namespace] + args
@@ -396,36 +500,86 @@ class IptablesManager(object):
                 start, end = self._find_table(all_lines, table_name)
                 all_lines[start:end] = self._modify_rules(
                     all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                self.execute(args, process_input='\n'.join(all_lines),
-                             root_helper=self.root_helper)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_("IPTablesManager.apply failed to apply the "
-                                "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
+            self._restore(cmd, ['-c'], tables, all_lines)
+            for table in tables.values():
+                if self.incremental:
+                    table.mark_applied()
+                else:
+                    table.dirty_chains.clear()
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _get_incremental_changes(self, tables):
+        """Return the changed chains of each table, if they can be written
+        without a full iptables-save/iptables-restore cycle.
+
+        This is only the case for the wrapped chains, owned by the manager,
+        of tables that have been applied before.
+
+        :returns: a dict of table name -> changed chains, or None
+        """
+        if not self.incremental:
+            return
+        changes = {}
+        for table_name, table in tables.iteritems():
+            if (table.applied_chains is None or table.remove_rules or
+                    table.remove_chains):
+                return
+            changed = table.get_changed_chains()
+            if any(not wrap for name, wrap in changed):
+                return
+            if changed:
+                changes[table_name] = changed
+        return changes
+
+    def _generate_noflush_restore(self, changes):
+        lines = []
+        for table_name, changed in sorted(changes.items()):
+            chains = sorted('%s-%s' % (self.wrap_name, name)
+                            for name, wrap in changed)
+            lines.append('*%s' % table_name)
+            # Declaring a chain creates it, or flushes it if it exists
+            lines += [':%s - [0:0]' % chain for chain in chains]
+            for chain, rules in sorted(changed.items()):
+                lines += rules or []
+            lines += ['-X %s-%s' % (self.wrap_name, name)
+                      for (name, wrap), rules in sorted(changed.items())
+                      if rules is None]
+            lines.append('COMMIT')
+        return lines
+
+    def _restore(self, cmd, options, tables, all_lines):
+        args = ['%s-restore' % (cmd,)] + options
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines),
+                         root_helper=self.root_helper)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                # The rules in the kernel are unknown, rewrite all of them
+                # on the next apply
+                for table in tables.values():
+                    table.applied_chains = None
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(all_lines)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 all_lines[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_("IPTablesManager.apply failed to apply the "
+                            "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -19,6 +19,7 @@ import operator
 from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import ovsdb_native
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 from neutron.openstack.common import excutils
@@ -34,11 +35,27 @@ OPTS = [
     cfg.IntOpt('ovs_vsctl_timeout',
                default=DEFAULT_OVS_VSCTL_TIMEOUT,
                help=_('Timeout in seconds for ovs-vsctl commands')),
+    cfg.StrOpt('ovsdb_interface',
+               default='vsctl',
+               help=_("The interface for interacting with the OVSDB: "
+                      "'vsctl' forks ovs-vsctl for every request, 'native' "
+                      "keeps a connection to ovsdb-server and falls back "
+                      "to ovs-vsctl for requests it does not handle")),
+    cfg.StrOpt('ovsdb_connection',
+               default='tcp:127.0.0.1:6640',
+               help=_("The connection string for the native OVSDB "
+                      "interface, either tcp:IP:PORT or unix:PATH")),
 ]
 cfg.CONF.register_opts(OPTS)
 
 LOG = logging.getLogger(__name__)
 
+# Keywords prefixing each flow of a mixed 'ovs-ofctl add-flows' input.
+OFCTL_BUNDLE_ACTIONS = {'add': 'add', 'mod': 'modify', 'del': 'delete'}
+
+# Returned by BaseOVS._native() when the request has to go to ovs-vsctl.
+_FALLBACK = object()
+
 
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
@@ -60,6 +77,23 @@ class BaseOVS(object):
     def __init__(self, root_helper):
         self.root_helper = root_helper
         self.vsctl_timeout = cfg.CONF.ovs_vsctl_timeout
+        self.ovsdb = None
+        if cfg.CONF.ovsdb_interface == 'native':
+            self.ovsdb = ovsdb_native.get_connection(
+                cfg.CONF.ovsdb_connection, self.vsctl_timeout)
+
+    def _native(self, method, *args):
+        if self.ovsdb is None:
+            return _FALLBACK
+        try:
+            return getattr(self.ovsdb, method)(*args)
+        except ovsdb_native.OvsdbUnsupported as e:
+            LOG.debug(_("Using ovs-vsctl for %(method)s: %(error)s"),
+                      {'method': method, 'error': e})
+        except ovsdb_native.OvsdbError as e:
+            LOG.warn(_("Native OVSDB %(method)s failed, falling back to "
+                       "ovs-vsctl: %(error)s"), {'method': method, 'error': e})
+        return _FALLBACK
 
     def run_vsctl(self, args, check_error=False):
         full_args = ["ovs-vsctl", "--timeout=%d" % self.vsctl_timeout] + args
@@ -81,6 +115,9 @@ class BaseOVS(object):
         self.run_vsctl(["--", "--if-exists", "del-br", bridge_name])
 
     def bridge_exists(self, bridge_name):
+        exists = self._native('br_exists', bridge_name)
+        if exists is not _FALLBACK:
+            return exists
         try:
             self.run_vsctl(['br-exists', bridge_name], check_error=True)
         except RuntimeError as e:
@@ -91,6 +128,9 @@ class BaseOVS(object):
         return True
 
     def get_bridge_name_for_port_name(self, port_name):
+        bridge = self._native('port_to_br', port_name)
+        if bridge is not _FALLBACK:
+            return bridge
         try:
             return self.run_vsctl(['port-to-br', port_name], check_error=True)
         except RuntimeError as e:
@@ -106,6 +146,8 @@ class OVSBridge(BaseOVS):
     def __init__(self, br_name, root_helper):
         super(OVSBridge, self).__init__(root_helper)
         self.br_name = br_name
+        self.deferred_action_flows = None
+        self.use_bundle = False
 
     def set_controller(self, controller_names):
         vsctl_command = ['--', 'set-controller', self.br_name]
@@ -143,21 +185,26 @@ class OVSBridge(BaseOVS):
         self.create()
 
     def add_port(self, port_name):
-        self.run_vsctl(["--", "--may-exist", "add-port", self.br_name,
-                        port_name])
+        if self._native('add_port', self.br_name, port_name) is _FALLBACK:
+            self.run_vsctl(["--", "--may-exist", "add-port", self.br_name,
+                            port_name])
         return self.get_port_ofport(port_name)
 
     def delete_port(self, port_name):
-        self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
-                        port_name])
+        if self._native('del_port', self.br_name, port_name) is _FALLBACK:
+            self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
+                            port_name])
 
     def set_db_attribute(self, table_name, record, column, value):
-        args = ["set", table_name, record, "%s=%s" % (column, value)]
-        self.run_vsctl(args)
+        if self._native('db_set', table_name, record, column,
+                        str(value)) is _FALLBACK:
+            args = ["set", table_name, record, "%s=%s" % (column, value)]
+            self.run_vsctl(args)
 
     def clear_db_attribute(self, table_name, record, column):
-        args = ["clear", table_name, record, column]
-        self.run_vsctl(args)
+        if self._native('db_clear', table_name, record, column) is _FALLBACK:
+            args = ["clear", table_name, record, column]
+            self.run_vsctl(args)
 
     def run_ofctl(self, cmd, args, process_input=None):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
@@ -190,8 +237,59 @@ class OVSBridge(BaseOVS):
                                self.br_name, 'datapath_id').strip('"')
 
     def do_action_flows(self, action, kwargs_list):
+        if self.deferred_action_flows is not None:
+            self.deferred_action_flows.extend(
+                (action, kw) for kw in kwargs_list)
+            return True
         flow_strs = [_build_flow_expr_str(kw, action) for kw in kwargs_list]
-        self.run_ofctl('%s-flows' % action, ['-'], '\n'.join(flow_strs))
+        return self.run_ofctl('%s-flows' % action, ['-'],
+                              '\n'.join(flow_strs)) is not None
+
+    def do_bundled_action_flows(self, action_flow_tuples):
+        """Apply (action, flow) tuples in order with one ovs-ofctl call.
+
+        Mixing actions in one add-flows input and the --bundle option, which
+        applies all the flows atomically, require Open vSwitch 2.4 or newer.
+        """
+        if self.deferred_action_flows is not None:
+            self.deferred_action_flows.extend(action_flow_tuples)
+            return True
+        flow_strs = ['%s %s' % (OFCTL_BUNDLE_ACTIONS[action],
+                                _build_flow_expr_str(kw, action))
+                     for action, kw in action_flow_tuples]
+        return self.run_ofctl('add-flows', ['--bundle', '-'],
+                              '\n'.join(flow_strs)) is not None
+
+    def defer_apply_on(self, use_bundle=False):
+        """Queue the flow mods of this bridge until defer_apply_off().
+
+        Unlike DeferredOVSBridge, the flows are applied in the order they
+        were issued, and every user of the bridge is deferred.
+        """
+        if self.deferred_action_flows is None:
+            self.deferred_action_flows = []
+        self.use_bundle = use_bundle
+
+    def defer_apply_off(self):
+        """Apply the flow mods queued since defer_apply_on().
+
+        Returns False if ovs-ofctl failed to apply some of them.
+        """
+        action_flow_tuples = self.deferred_action_flows
+        self.deferred_action_flows = None
+        if not action_flow_tuples:
+            return True
+        if self.use_bundle:
+            return self.do_bundled_action_flows(action_flow_tuples)
+        grouped = itertools.groupby(action_flow_tuples,
+                                    key=operator.itemgetter(0))
+        itemgetter_1 = operator.itemgetter(1)
+        applied = True
+        for action, action_flow_list in grouped:
+            if not self.do_action_flows(action,
+                                        map(itemgetter_1, action_flow_list)):
+                applied = False
+        return applied
 
     def add_flow(self, **kwargs):
         self.do_action_flows('add', [kwargs])
@@ -218,21 +316,33 @@ class OVSBridge(BaseOVS):
                         tunnel_type=p_const.TYPE_GRE,
                         vxlan_udp_port=constants.VXLAN_UDP_PORT,
                         dont_fragment=True):
-        vsctl_command = ["--", "--may-exist", "add-port", self.br_name,
-                         port_name]
-        vsctl_command.extend(["--", "set", "Interface", port_name,
-                              "type=%s" % tunnel_type])
+        options = {'df_default': str(bool(dont_fragment)).lower(),
+                   'remote_ip': remote_ip,
+                   'local_ip': local_ip,
+                   'in_key': 'flow',
+                   'out_key': 'flow'}
         if tunnel_type == p_const.TYPE_VXLAN:
             # Only set the VXLAN UDP port if it's not the default
             if vxlan_udp_port != constants.VXLAN_UDP_PORT:
-                vsctl_command.append("options:dst_port=%s" % vxlan_udp_port)
-        vsctl_command.append(("options:df_default=%s" %
-                             bool(dont_fragment)).lower())
-        vsctl_command.extend(["options:remote_ip=%s" % remote_ip,
-                              "options:local_ip=%s" % local_ip,
-                              "options:in_key=flow",
-                              "options:out_key=flow"])
-        self.run_vsctl(vsctl_command)
+                options['dst_port'] = str(vxlan_udp_port)
+        interface = {'type': tunnel_type,
+                     'options': ['map', sorted(options.items())]}
+        if self._native('add_port', self.br_name, port_name,
+                        interface) is _FALLBACK:
+            vsctl_command = ["--", "--may-exist", "add-port", self.br_name,
+                             port_name]
+            vsctl_command.extend(["--", "set", "Interface", port_name,
+                                  "type=%s" % tunnel_type])
+            if 'dst_port' in options:
+                vsctl_command.append("options:dst_port=%s" %
+                                     options['dst_port'])
+            vsctl_command.append("options:df_default=%s" %
+                                 options['df_default'])
+            vsctl_command.extend(["options:remote_ip=%s" % remote_ip,
+                                  "options:local_ip=%s" % local_ip,
+                                  "options:in_key=flow",
+                                  "options:out_key=flow"])
+            self.run_vsctl(vsctl_command)
         ofport = self.get_port_ofport(port_name)
         if (tunnel_type == p_const.TYPE_VXLAN and
                 ofport == constants.INVALID_OFPORT):
@@ -242,22 +352,31 @@ class OVSBridge(BaseOVS):
         return ofport
 
     def add_patch_port(self, local_name, remote_name):
-        self.run_vsctl(["add-port", self.br_name, local_name,
-                        "--", "set", "Interface", local_name,
-                        "type=patch", "options:peer=%s" % remote_name])
+        interface = {'type': 'patch',
+                     'options': ['map', [['peer', remote_name]]]}
+        if self._native('add_port', self.br_name, local_name,
+                        interface) is _FALLBACK:
+            self.run_vsctl(["add-port", self.br_name, local_name,
+                            "--", "set", "Interface", local_name,
+                            "type=patch", "options:peer=%s" % remote_name])
         return self.get_port_ofport(local_name)
 
+    def _db_get(self, table, record, column, check_error):
+        output = self._native('db_get', table, record, column)
+        if output is _FALLBACK:
+            output = self.run_vsctl(["get", table, record, column],
+                                    check_error)
+        if output:
+            return output.rstrip("\n\r")
+
     def db_get_map(self, table, record, column, check_error=False):
-        output = self.run_vsctl(["get", table, record, column], check_error)
+        output = self._db_get(table, record, column, check_error)
         if output:
-            output_str = output.rstrip("\n\r")
-            return self.db_str_to_map(output_str)
+            return self.db_str_to_map(output)
         return {}
 
     def db_get_val(self, table, record, column, check_error=False):
-        output = self.run_vsctl(["get", table, record, column], check_error)
-        if output:
-            return output.rstrip("\n\r")
+        return self._db_get(table, record, column, check_error)
 
     def db_str_to_map(self, full_str):
         list = full_str.strip("{}").split(", ")
@@ -270,6 +389,9 @@ class OVSBridge(BaseOVS):
         return ret
 
     def get_port_name_list(self):
+        ports = self._native('list_ports', self.br_name)
+        if ports is not _FALLBACK:
+            return ports
         res = self.run_vsctl(["list-ports", self.br_name], check_error=True)
         if res:
             return res.strip().split("\n")
@@ -316,12 +438,8 @@ class OVSBridge(BaseOVS):
     def get_vif_port_set(self):
         port_names = self.get_port_name_list()
         edge_ports = set()
-        args = ['--format=json', '--', '--columns=name,external_ids,ofport',
-                'list', 'Interface']
-        result = self.run_vsctl(args, check_error=True)
-        if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
+        rows = self._list_rows('Interface', ['name', 'external_ids', 'ofport'])
+        for row in rows:
             name = row[0]
             if name not in port_names:
                 continue
@@ -367,12 +485,8 @@ class OVSBridge(BaseOVS):
 
         """
         port_names = self.get_port_name_list()
-        args = ['--format=json', '--', '--columns=name,tag', 'list', 'Port']
-        result = self.run_vsctl(args, check_error=True)
         port_tag_dict = {}
-        if not result:
-            return port_tag_dict
-        for name, tag in jsonutils.loads(result)['data']:
+        for name, tag in self._list_rows('Port', ['name', 'tag']):
             if name not in port_names:
                 continue
             # 'tag' can be [u'set', []] or an integer
@@ -381,6 +495,18 @@ class OVSBridge(BaseOVS):
             port_tag_dict[name] = tag
         return port_tag_dict
 
+    def _list_rows(self, table, columns):
+        """Return the rows of table in 'ovs-vsctl --format=json' layout."""
+        rows = self._native('get_rows', table, columns)
+        if rows is not _FALLBACK:
+            return rows
+        args = ['--format=json', '--', '--columns=%s' % ','.join(columns),
+                'list', table]
+        result = self.run_vsctl(args, check_error=True)
+        if not result:
+            return []
+        return jsonutils.loads(result)['data']
+
     def get_vif_port_by_id(self, port_id):
         args = ['--format=json', '--', '--columns=external_ids,name,ofport',
                 'find', 'Interface',
@@ -465,17 +591,20 @@ class DeferredOVSBridge(object):
     ALLOWED_PASSTHROUGHS = 'add_port', 'add_tunnel_port', 'delete_port'
 
     def __init__(self, br, full_ordered=False,
-                 order=('add', 'mod', 'del')):
+                 order=('add', 'mod', 'del'), use_bundle=False):
         '''Constructor.
 
         :param br: wrapped bridge
         :param full_ordered: Optional, disable flow reordering (slower)
         :param order: Optional, define in which order flow are applied
+        :param use_bundle: Optional, apply all the flows atomically with a
+                           single ovs-ofctl call (requires OVS 2.4)
         '''
 
         self.br = br
         self.full_ordered = full_ordered
         self.order = order
+        self.use_bundle = use_bundle
         if not self.full_ordered:
             self.weights = dict((y, x) for x, y in enumerate(self.order))
         self.action_flow_tuples = []
@@ -503,6 +632,10 @@ class DeferredOVSBridge(object):
         if not self.full_ordered:
             action_flow_tuples.sort(key=lambda af: self.weights[af[0]])
 
+        if self.use_bundle:
+            self.br.do_bundled_action_flows(action_flow_tuples)
+            return
+
         grouped = itertools.groupby(action_flow_tuples,
                                     key=operator.itemgetter(0))
         itemgetter_1 = operator.itemgetter(1)
@@ -0,0 +1,523 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Native OVSDB client speaking the RFC 7047 JSON-RPC protocol.
+
+A single long-lived connection monitors the tables ovs_lib reads so that
+lookups are served from a local cache, and writes are sent as one
+multi-operation transaction instead of forking ovs-vsctl for each of them.
+"""
+
+import contextlib
+import errno
+import json
+import re
+import socket
+import threading
+import time
+
+from neutron.common import exceptions
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OVS_DB = 'Open_vSwitch'
+
+# Columns mirrored in the local cache. Requests touching anything else raise
+# OvsdbUnsupported so that callers fall back to ovs-vsctl.
+MONITORED_TABLES = {
+    'Open_vSwitch': ['bridges', 'cur_cfg', 'next_cfg'],
+    'Bridge': ['name', 'ports', 'datapath_id', 'external_ids', 'fail_mode',
+               'protocols'],
+    'Port': ['name', 'interfaces', 'tag', 'external_ids'],
+    'Interface': ['name', 'ofport', 'type', 'options', 'external_ids'],
+}
+
+_BARE_STRING_RE = re.compile(r'^[A-Za-z_][A-Za-z_.\-]*$')
+
+
+class OvsdbError(exceptions.NeutronException):
+    message = _("OVSDB request failed: %(reason)s")
+
+
+class OvsdbUnsupported(OvsdbError):
+    message = _("OVSDB request is not handled natively: %(reason)s")
+
+
+def _base_type(base):
+    if isinstance(base, dict):
+        return base['type']
+    return base
+
+
+def _is_map(col_type):
+    return isinstance(col_type, dict) and 'value' in col_type
+
+
+def _is_set(col_type):
+    return (isinstance(col_type, dict) and not _is_map(col_type) and
+            col_type.get('max', 1) != 1)
+
+
+def _key_type(col_type):
+    if isinstance(col_type, dict):
+        return _base_type(col_type['key'])
+    return col_type
+
+
+def _atoms(datum):
+    if isinstance(datum, list) and datum[0] == 'set':
+        return datum[1]
+    return [datum]
+
+
+def _pairs(datum):
+    if isinstance(datum, list) and datum[0] == 'map':
+        return datum[1]
+    return []
+
+
+def _quote(value):
+    # Same rule as ovsdb_atom_to_string(), so results compare equal to what
+    # ovs-vsctl prints.
+    if _BARE_STRING_RE.match(value) and value not in ('true', 'false'):
+        return value
+    return jsonutils.dumps(value)
+
+
+def _format_atom(atom):
+    if isinstance(atom, list):
+        return atom[1]
+    if isinstance(atom, bool):
+        return 'true' if atom else 'false'
+    if isinstance(atom, basestring):
+        return _quote(atom)
+    return str(atom)
+
+
+def format_datum(datum, col_type):
+    """Render a wire format datum the way 'ovs-vsctl get' prints it."""
+    if _is_map(col_type):
+        return '{%s}' % ', '.join('%s=%s' % (_format_atom(k), _format_atom(v))
+                                  for k, v in _pairs(datum))
+    atoms = _atoms(datum)
+    if _is_set(col_type) or not atoms:
+        return '[%s]' % ', '.join(_format_atom(a) for a in atoms)
+    return _format_atom(atoms[0])
+
+
+def _split(value, separator):
+    items = []
+    current = ''
+    quoted = False
+    for char in value:
+        if char == '"' and not current.endswith('\\'):
+            quoted = not quoted
+        if char == separator and not quoted:
+            items.append(current.strip())
+            current = ''
+            continue
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def _parse_atom(value, atom_type):
+    if value.startswith('"'):
+        value = json.loads(value)
+    if atom_type == 'integer':
+        return int(value)
+    if atom_type == 'real':
+        return float(value)
+    if atom_type == 'boolean':
+        return value == 'true'
+    if atom_type == 'uuid':
+        return ['uuid', value]
+    return value
+
+
+def parse_datum(value, col_type):
+    """Convert an ovs-vsctl style value string into a wire format datum."""
+    value = value.strip()
+    if _is_map(col_type):
+        value_type = _base_type(col_type['value'])
+        pairs = []
+        for item in _split(value.strip('{}'), ','):
+            key, _sep, val = item.partition('=')
+            pairs.append([_parse_atom(key, _key_type(col_type)),
+                          _parse_atom(val, value_type)])
+        return ['map', pairs]
+    if value.startswith('['):
+        return ['set', [_parse_atom(item, _key_type(col_type))
+                        for item in _split(value.strip('[]'), ',')]]
+    return _parse_atom(value, _key_type(col_type))
+
+
+def _where_uuid(uuid):
+    return [['_uuid', '==', ['uuid', uuid]]]
+
+
+class OvsdbConnection(object):
+    """Persistent JSON-RPC session with a locally cached table view.
+
+    The session is synchronous: notifications pushed by ovsdb-server are
+    applied to the cache whenever a request is made, which keeps the reads
+    consistent with the writes issued through the same connection.
+    """
+
+    def __init__(self, connection, timeout):
+        self.connection = connection
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.schema = {}
+        self.tables = {}
+        self._names = {}
+        self._sock = None
+        self._buffer = ''
+        self._decoder = json.JSONDecoder()
+        self._next_id = 0
+
+    @contextlib.contextmanager
+    def _session(self):
+        with self.lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._poll()
+                yield
+            except (socket.error, ValueError) as e:
+                self._disconnect()
+                raise OvsdbError(reason=e)
+
+    def _connect(self):
+        proto, _sep, address = self.connection.partition(':')
+        if proto == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(address)
+        elif proto == 'tcp':
+            host, _sep, port = address.rpartition(':')
+            sock = socket.create_connection((host, int(port)), self.timeout)
+        else:
+            raise OvsdbError(reason=_("unsupported connection %s") %
+                             self.connection)
+        sock.settimeout(self.timeout)
+        self._sock = sock
+        self._buffer = ''
+        LOG.debug(_("Connected to ovsdb-server at %s"), self.connection)
+
+        schema = self._call('get_schema', [OVS_DB])['tables']
+        self.schema = dict(
+            (table, dict((column, schema[table]['columns'][column]['type'])
+                         for column in columns))
+            for table, columns in MONITORED_TABLES.iteritems())
+        self.tables = dict((table, {}) for table in MONITORED_TABLES)
+        self._names = dict((table, {}) for table in MONITORED_TABLES)
+        requests = dict((table, {'columns': columns})
+                        for table, columns in MONITORED_TABLES.iteritems())
+        self._apply_updates(self._call('monitor', [OVS_DB, None, requests]))
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except socket.error:
+                pass
+        self._sock = None
+        self.tables = {}
+        self._names = {}
+
+    def close(self):
+        with self.lock:
+            self._disconnect()
+
+    def _send(self, msg):
+        self._sock.sendall(jsonutils.dumps(msg))
+
+    def _decode(self):
+        self._buffer = self._buffer.lstrip()
+        if not self._buffer:
+            return
+        try:
+            msg, end = self._decoder.raw_decode(self._buffer)
+        except ValueError:
+            # Incomplete message, wait for more data.
+            return
+        self._buffer = self._buffer[end:]
+        return msg
+
+    def _read(self):
+        data = self._sock.recv(65536)
+        if not data:
+            raise socket.error(_("connection closed by ovsdb-server"))
+        self._buffer += data
+
+    def _recv(self):
+        while True:
+            msg = self._decode()
+            if msg is not None:
+                return msg
+            self._read()
+
+    def _poll(self):
+        """Apply the notifications already waiting on the socket."""
+        while True:
+            msg = self._decode()
+            if msg is None:
+                self._sock.settimeout(0)
+                try:
+                    self._read()
+                except socket.error as e:
+                    if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+                    return
+                finally:
+                    self._sock.settimeout(self.timeout)
+                continue
+            self._dispatch(msg)
+
+    def _dispatch(self, msg):
+        method = msg.get('method')
+        if method == 'update':
+            self._apply_updates(msg['params'][1])
+        elif method == 'echo':
+            self._send({'id': msg['id'], 'result': msg['params'],
+                        'error': None})
+
+    def _call(self, method, params):
+        self._next_id += 1
+        request_id = self._next_id
+        self._send({'id': request_id, 'method': method, 'params': params})
+        while True:
+            msg = self._recv()
+            if msg.get('method') is None and msg.get('id') == request_id:
+                if msg.get('error') is not None:
+                    raise OvsdbError(reason=msg['error'])
+                return msg['result']
+            self._dispatch(msg)
+
+    def _apply_updates(self, table_updates):
+        for table, rows in table_updates.iteritems():
+            cache = self.tables[table]
+            names = self._names[table]
+            for uuid, change in rows.iteritems():
+                old = cache.pop(uuid, None)
+                if old is not None and 'name' in old:
+                    names.pop(old['name'], None)
+                new = change.get('new')
+                if new is None:
+                    continue
+                cache[uuid] = new
+                if 'name' in new:
+                    names[new['name']] = uuid
+
+    def _root(self):
+        for uuid, row in self.tables['Open_vSwitch'].iteritems():
+            return uuid, row
+        raise OvsdbError(reason=_("no Open_vSwitch row"))
+
+    def _column_type(self, table, column):
+        try:
+            return self.schema[table][column]
+        except KeyError:
+            raise OvsdbUnsupported(reason='%s:%s' % (table, column))
+
+    def _lookup(self, table, record):
+        if table not in self.tables:
+            raise OvsdbUnsupported(reason=table)
+        if table == 'Open_vSwitch':
+            return self._root()[0]
+        uuid = self._names[table].get(record)
+        if uuid is None and record in self.tables[table]:
+            uuid = record
+        return uuid
+
+    def _transact(self, operations):
+        root_uuid = self._root()[0]
+        # Bump next_cfg like ovs-vsctl does so we can wait for
+        # ovs-vswitchd to apply the change, e.g. to assign an ofport.
+        operations = list(operations) + [
+            {'op': 'mutate', 'table': 'Open_vSwitch',
+             'where': _where_uuid(root_uuid),
+             'mutations': [['next_cfg', '+=', 1]]},
+            {'op': 'select', 'table': 'Open_vSwitch',
+             'where': _where_uuid(root_uuid), 'columns': ['next_cfg']}]
+        results = self._call('transact', [OVS_DB] + operations)
+        for result in results:
+            if result and 'error' in result:
+                raise OvsdbError(reason=result)
+        self._wait_for_cfg(results[len(operations) - 1]['rows'][0]['next_cfg'])
+        return results
+
+    def _wait_for_cfg(self, next_cfg):
+        deadline = time.time() + self.timeout
+        try:
+            while self._root()[1].get('cur_cfg', 0) < next_cfg:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise socket.timeout()
+                self._sock.settimeout(remaining)
+                self._dispatch(self._recv())
+        except socket.timeout:
+            LOG.warn(_("Timed out waiting for ovs-vswitchd to apply "
+                       "configuration %s"), next_cfg)
+        finally:
+            if self._sock is not None:
+                self._sock.settimeout(self.timeout)
+
+    def get_rows(self, table, columns):
+        """Return the rows of table like 'ovs-vsctl --format=json list'."""
+        with self._session():
+            for column in columns:
+                self._column_type(table, column)
+            return [[row.get(column, ['set', []]) for column in columns]
+                    for row in self.tables[table].itervalues()]
+
+    def db_get(self, table, record, column):
+        column, _sep, key = column.partition(':')
+        with self._session():
+            col_type = self._column_type(table, column)
+            uuid = self._lookup(table, record)
+            if uuid is None:
+                return
+            datum = self.tables[table][uuid].get(column, ['set', []])
+            if key:
+                for k, v in _pairs(datum):
+                    if k == key:
+                        return _format_atom(v)
+                return
+            return format_datum(datum, col_type)
+
+    def db_set(self, table, record, column, value):
+        column, _sep, key = column.partition(':')
+        with self._session():
+            col_type = self._column_type(table, column)
+            uuid = self._lookup(table, record)
+            if uuid is None:
+                raise OvsdbError(reason=_("no row %(record)s in %(table)s") %
+                                 {'record': record, 'table': table})
+            if key:
+                value = _parse_atom(value, _base_type(col_type['value']))
+                op = {'op': 'mutate', 'table': table,
+                      'where': _where_uuid(uuid),
+                      'mutations': [[column, 'delete', ['set', [key]]],
+                                    [column, 'insert',
+                                     ['map', [[key, value]]]]]}
+            else:
+                op = {'op': 'update', 'table': table,
+                      'where': _where_uuid(uuid),
+                      'row': {column: parse_datum(value, col_type)}}
+            self._transact([op])
+
+    def db_clear(self, table, record, column):
+        with self._session():
+            col_type = self._column_type(table, column)
+            uuid = self._lookup(table, record)
+            if uuid is None:
+                raise OvsdbError(reason=_("no row %(record)s in %(table)s") %
+                                 {'record': record, 'table': table})
+            empty = ['map', []] if _is_map(col_type) else ['set', []]
+            self._transact([{'op': 'update', 'table': table,
+                             'where': _where_uuid(uuid),
+                             'row': {column: empty}}])
+
+    def br_exists(self, bridge):
+        with self._session():
+            return bridge in self._names['Bridge']
+
+    def list_ports(self, bridge):
+        with self._session():
+            uuid = self._lookup('Bridge', bridge)
+            if uuid is None:
+                raise OvsdbError(reason=_("no bridge named %s") % bridge)
+            ports = self.tables['Port']
+            names = (ports[port[1]]['name'] for port in
+                     _atoms(self.tables['Bridge'][uuid]['ports'])
+                     if port[1] in ports)
+            return sorted(name for name in names if name != bridge)
+
+    def port_to_br(self, port):
+        with self._session():
+            port_uuid = self._names['Port'].get(port)
+            if port_uuid is None:
+                return
+            for row in self.tables['Bridge'].itervalues():
+                if ['uuid', port_uuid] in _atoms(row['ports']):
+                    return row['name']
+
+    def add_port(self, bridge, port, interface=None):
+        """Add port to bridge, updating its interface if it exists."""
+        interface = interface or {}
+        with self._session():
+            br_uuid = self._lookup('Bridge', bridge)
+            if br_uuid is None:
+                raise OvsdbError(reason=_("no bridge named %s") % bridge)
+            port_uuid = self._names['Port'].get(port)
+            if port_uuid is None:
+                row = {'name': port}
+                row.update(interface)
+                operations = [
+                    {'op': 'insert', 'table': 'Interface', 'row': row,
+                     'uuid-name': 'new_iface'},
+                    {'op': 'insert', 'table': 'Port',
+                     'row': {'name': port,
+                             'interfaces': ['named-uuid', 'new_iface']},
+                     'uuid-name': 'new_port'},
+                    {'op': 'mutate', 'table': 'Bridge',
+                     'where': _where_uuid(br_uuid),
+                     'mutations': [['ports', 'insert',
+                                    ['set', [['named-uuid', 'new_port']]]]]}]
+            elif ['uuid', port_uuid] not in _atoms(
+                    self.tables['Bridge'][br_uuid]['ports']):
+                raise OvsdbError(reason=_("port %(port)s is not on "
+                                          "%(bridge)s") %
+                                 {'port': port, 'bridge': bridge})
+            elif interface and port in self._names['Interface']:
+                operations = [
+                    {'op': 'update', 'table': 'Interface',
+                     'where': _where_uuid(self._names['Interface'][port]),
+                     'row': interface}]
+            else:
+                return
+            self._transact(operations)
+
+    def del_port(self, bridge, port):
+        with self._session():
+            port_uuid = self._names['Port'].get(port)
+            if port_uuid is None:
+                return
+            br_uuid = self._lookup('Bridge', bridge)
+            if br_uuid is None or ['uuid', port_uuid] not in _atoms(
+                    self.tables['Bridge'][br_uuid]['ports']):
+                raise OvsdbError(reason=_("port %(port)s is not on "
+                                          "%(bridge)s") %
+                                 {'port': port, 'bridge': bridge})
+            # Port and Interface rows are garbage collected by ovsdb-server
+            # once no bridge references them.
+            self._transact([{'op': 'mutate', 'table': 'Bridge',
+                             'where': _where_uuid(br_uuid),
+                             'mutations': [['ports', 'delete',
+                                            ['set', [['uuid', port_uuid]]]]]}])
+
+
+_connections = {}
+
+
+def get_connection(connection, timeout):
+    """Return the connection shared by every bridge of this process."""
+    if connection not in _connections:
+        _connections[connection] = OvsdbConnection(connection, timeout)
+    return _connections[connection]
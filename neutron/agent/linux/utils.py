@@ -22,9 +22,12 @@ import shutil
 import socket
 import struct
 import tempfile
+import threading
 
 from eventlet.green import subprocess
 from eventlet import greenthread
+from oslo.config import cfg
+from oslo.rootwrap import client
 
 from neutron.common import constants
 from neutron.common import utils
@@ -59,19 +62,59 @@ def create_process(cmd, root_helper=None, addl_env=None):
     return obj, cmd
 
 
+class RootwrapDaemonHelper(object):
+    """Holds the rootwrap daemon client shared by the whole process."""
+
+    _client = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls):
+        try:
+            daemon_cmd = cfg.CONF.AGENT.root_helper_daemon
+        except cfg.NoSuchOptError:
+            return
+        if not daemon_cmd:
+            return
+        with cls._lock:
+            if cls._client is None:
+                cls._client = client.Client(shlex.split(daemon_cmd))
+            return cls._client
+
+
+def execute_rootwrap_daemon(daemon_client, cmd, process_input=None,
+                            addl_env=None):
+    """Run cmd through the rootwrap daemon.
+
+    Returns a ((returncode, stdout, stderr), cmd) tuple where cmd is the
+    command actually run, like create_process does.
+    """
+    if addl_env:
+        cmd = ['env'] + ['%s=%s' % pair for pair in addl_env.items()] + cmd
+    cmd = map(str, cmd)
+    LOG.debug(_("Running command (rootwrap daemon): %s"), cmd)
+    return daemon_client.execute(cmd, stdin=process_input), cmd
+
+
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False):
     try:
-        obj, cmd = create_process(cmd, root_helper=root_helper,
-                                  addl_env=addl_env)
-        _stdout, _stderr = (process_input and
-                            obj.communicate(process_input) or
-                            obj.communicate())
-        obj.stdin.close()
+        daemon_client = root_helper and RootwrapDaemonHelper.get_client()
+        if daemon_client:
+            (returncode, _stdout, _stderr), cmd = execute_rootwrap_daemon(
+                daemon_client, cmd, process_input, addl_env)
+        else:
+            obj, cmd = create_process(cmd, root_helper=root_helper,
+                                      addl_env=addl_env)
+            _stdout, _stderr = (process_input and
+                                obj.communicate(process_input) or
+                                obj.communicate())
+            obj.stdin.close()
+            returncode = obj.returncode
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
-        if obj.returncode:
+        if returncode:
             LOG.error(m)
             if check_exit_code:
                 raise RuntimeError(m)
@@ -19,6 +19,7 @@ import hmac
 import os
 import socket
 import sys
+import time
 
 import eventlet
 eventlet.monkey_patch()
@@ -38,6 +39,7 @@ from neutron.common import utils
 from neutron import context
 from neutron.openstack.common.cache import cache
 from neutron.openstack.common import excutils
+from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import service
@@ -46,6 +48,119 @@ from neutron import wsgi
 LOG = logging.getLogger(__name__)
 
 
+class PortIndex(object):
+    """Ports of the networks served by the proxy, by fixed IP address.
+
+    All the ports of the networks looked up are fetched by a single query
+    and used for ttl seconds. When an address is not found, the networks are
+    fetched again as it most likely belongs to an instance which just
+    booted. The addresses still not found are not looked up again for
+    negative_ttl seconds.
+
+    An address may have moved to another instance since its network was
+    fetched, so the ports found in a fetch older than trusted_age seconds
+    are checked with a lookup of the address before being returned.
+    """
+
+    trusted_age = 2
+
+    def __init__(self, ttl, negative_ttl):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # network id -> (time of the fetch, {ip address: [ports]})
+        self._networks = {}
+        # (ip address, network ids) -> expiry of the miss
+        self._misses = {}
+
+    def get_ports(self, remote_address, networks, fetch_ports,
+                  lookup_ports):
+        """Return the ports of the networks which have the address.
+
+        :param fetch_ports: called with a list of network ids, returns all
+                            the ports of these networks
+        :param lookup_ports: called with the address and the network ids,
+                             returns the ports of these networks which have
+                             the address
+        """
+        now = time.time()
+        miss = (remote_address, tuple(networks))
+        if self._misses.get(miss, 0) > now:
+            return []
+        self._fetch([network_id for network_id in networks
+                     if self._fetched_at(network_id) <= now - self.ttl],
+                    fetch_ports, now)
+        ports = self._lookup(remote_address, networks)
+        if ports and any(self._fetched_at(port['network_id']) <=
+                         now - self.trusted_age for port in ports):
+            return self._verify(remote_address, networks, ports,
+                                lookup_ports)
+        if not ports:
+            # The networks fetched since the request started are skipped
+            self._fetch(networks, fetch_ports, now)
+            ports = self._lookup(remote_address, networks)
+        if not ports:
+            LOG.debug(_("No port with IP address %(address)s on networks "
+                        "%(networks)s"),
+                      {'address': remote_address, 'networks': networks})
+            for key, expiry in self._misses.items():
+                if expiry <= now:
+                    del self._misses[key]
+            self._misses[miss] = now + self.negative_ttl
+        return ports
+
+    def _verify(self, remote_address, networks, ports, lookup_ports):
+        """Return the current ports with the address, as it may have moved.
+
+        The networks are fetched again on their next use if the address
+        moved.
+        """
+        current = lookup_ports(remote_address, networks)
+        if (sorted((p['network_id'], p['device_id']) for p in current) !=
+                sorted((p['network_id'], p['device_id']) for p in ports)):
+            LOG.debug(_("The ports with IP address %(address)s changed on "
+                        "networks %(networks)s"),
+                      {'address': remote_address, 'networks': networks})
+            with lockutils.lock('metadata-port-index'):
+                for network_id in networks:
+                    self._networks.pop(network_id, None)
+        return current
+
+    def _fetched_at(self, network_id):
+        return self._networks.get(network_id, (0, None))[0]
+
+    def _lookup(self, remote_address, networks):
+        ports = []
+        for network_id in networks:
+            addresses = self._networks.get(network_id, (0, {}))[1]
+            ports += addresses.get(remote_address, [])
+        return ports
+
+    def _fetch(self, networks, fetch_ports, since):
+        if not networks:
+            return
+        # The concurrent requests for the same networks wait for a single
+        # fetch
+        with lockutils.lock('metadata-port-index'):
+            networks = [network_id for network_id in networks
+                        if self._fetched_at(network_id) < since]
+            if not networks:
+                return
+            index = dict((network_id, {}) for network_id in networks)
+            for port in fetch_ports(networks):
+                addresses = index[port['network_id']]
+                for fixed_ip in port['fixed_ips']:
+                    addresses.setdefault(fixed_ip['ip_address'],
+                                         []).append(port)
+            fetched_at = time.time()
+            for network_id, (fetched, _addresses) in self._networks.items():
+                if fetched <= fetched_at - self.ttl:
+                    # No longer looked up
+                    del self._networks[network_id]
+            for network_id, addresses in index.iteritems():
+                self._networks[network_id] = (fetched_at, addresses)
+            LOG.debug(_("Fetched the ports of networks %s"), networks)
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -93,7 +208,18 @@ class MetadataProxyHandler(object):
                    help=_("Client certificate for nova metadata api server.")),
         cfg.StrOpt('nova_client_priv_key',
                    default='',
-                   help=_("Private key of client certificate."))
+                   help=_("Private key of client certificate.")),
+        cfg.IntOpt('port_index_ttl', default=0,
+                   help=_("Number of seconds during which the ports of a "
+                          "network, fetched at once, are used to find the "
+                          "instance making a request. The ports found in a "
+                          "fetch older than 2 seconds are checked with a "
+                          "lookup of the address. 0 looks up the ports "
+                          "with the address of each request.")),
+        cfg.IntOpt('port_index_negative_ttl', default=2,
+                   help=_("Number of seconds during which an address which "
+                          "is not found in the ports of the networks is not "
+                          "looked up again.")),
     ]
 
     def __init__(self, conf):
@@ -103,6 +229,11 @@ class MetadataProxyHandler(object):
             self._cache = cache.get_cache(self.conf.cache_url)
         else:
             self._cache = False
+        if self.conf.port_index_ttl:
+            self._port_index = PortIndex(self.conf.port_index_ttl,
+                                         self.conf.port_index_negative_ttl)
+        else:
+            self._port_index = None
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -147,6 +278,14 @@ class MetadataProxyHandler(object):
             device_owner=n_const.DEVICE_OWNER_ROUTER_INTF)['ports']
         return tuple(p['network_id'] for p in internal_ports)
 
+    def _get_network_ports(self, networks):
+        """Get the ports of the given networks with a single query."""
+        qclient = self._get_neutron_client()
+        return qclient.list_ports(
+            network_id=list(networks),
+            fields=['network_id', 'device_id', 'tenant_id',
+                    'fixed_ips'])['ports']
+
     @utils.cache_method_results
     def _get_ports_for_remote_address(self, remote_address, networks):
         """Get list of ports that has given ip address and are part of
@@ -156,6 +295,11 @@ class MetadataProxyHandler(object):
                          searched for
 
         """
+        return self._lookup_ports_for_remote_address(remote_address,
+                                                     networks)
+
+    def _lookup_ports_for_remote_address(self, remote_address, networks):
+        """Uncached _get_ports_for_remote_address."""
         qclient = self._get_neutron_client()
         all_ports = qclient.list_ports(
             fixed_ips=['ip_address=%s' % remote_address])['ports']
@@ -179,6 +323,10 @@ class MetadataProxyHandler(object):
             raise TypeError(_("Either one of parameter network_id or router_id"
                               " must be passed to _get_ports method."))
 
+        if self._port_index:
+            return self._port_index.get_ports(
+                remote_address, networks, self._get_network_ports,
+                self._lookup_ports_for_remote_address)
         return self._get_ports_for_remote_address(remote_address, networks)
 
     def _get_instance_and_tenant_id(self, req):
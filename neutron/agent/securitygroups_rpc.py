@@ -14,14 +14,25 @@
 #    under the License.
 #
 
+import eventlet
+import netaddr
 from oslo.config import cfg
 
+from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# Version of the server side security group RPC
+# history
+#   1.1 Support security_group_rules_for_devices
+#   1.2 Support security_group_info_for_devices
+SG_SERVER_RPC_VERSION = "1.2"
+
+DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
+                       'egress': 'dest_ip_prefix'}
 
 security_group_opts = [
     cfg.StrOpt(
@@ -33,9 +44,25 @@ security_group_opts = [
         help=_(
             'Controls whether the neutron security group API is enabled '
             'in the server. It should be false when using no security '
-            'groups or using the nova security group API.'))
+            'groups or using the nova security group API.')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_(
+            'Use ipset to match the members of remote security groups. '
+            'Each remote group becomes one ipset used by a single iptables '
+            'rule, and membership changes only update the ipset.')),
+    cfg.BoolOpt(
+        'incremental_iptables',
+        default=False,
+        help=_(
+            'Once the firewall rules have been applied, only write the '
+            'iptables chains changed since with iptables-restore --noflush, '
+            'instead of reading and rewriting all the rules. The packet '
+            'counts of the chains written are reset.'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
+cfg.CONF.import_opt('sg_member_update_interval', 'neutron.common.config')
 
 
 #This is backward compatibility check for Havana
@@ -59,6 +86,40 @@ def is_firewall_enabled():
     return cfg.CONF.SECURITYGROUP.enable_security_group
 
 
+def convert_security_group_info(sg_info):
+    """Return the devices of security_group_info_for_devices with rules.
+
+    The rules of the security groups of each device are added to its
+    provider rules, and the remote group rules are converted to one rule
+    per member IP address, like security_group_rules_for_devices does.
+    """
+    devices = sg_info['devices']
+    for device in devices.values():
+        rules = []
+        source_groups = []
+        for sg_id in device.get('security_groups', []):
+            for rule in sg_info['security_groups'].get(sg_id, []):
+                remote_group_id = rule.get('remote_group_id')
+                if not remote_group_id:
+                    rules.append(dict(rule))
+                    continue
+                source_groups.append(remote_group_id)
+                direction_ip_prefix = DIRECTION_IP_PREFIX[rule['direction']]
+                for ip in sg_info['sg_member_ips'].get(remote_group_id, []):
+                    if ip in device.get('fixed_ips', []):
+                        continue
+                    ip_network = netaddr.IPNetwork(ip)
+                    if rule['ethertype'] != 'IPv%s' % ip_network.version:
+                        continue
+                    ip_rule = dict(rule)
+                    ip_rule[direction_ip_prefix] = str(ip_network.cidr)
+                    rules.append(ip_rule)
+        device['security_group_rules'] = (
+            rules + device.get('security_group_rules', []))
+        device['security_group_source_groups'] = source_groups
+    return devices
+
+
 def _disable_extension(extension, aliases):
     if extension in aliases:
         aliases.remove(extension)
@@ -82,6 +143,14 @@ class SecurityGroupServerRpcApiMixin(object):
                                        devices=devices),
                          version=SG_RPC_VERSION)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_SERVER_RPC_VERSION)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -131,6 +200,9 @@ class SecurityGroupAgentRpcMixin(object):
     """A mix-in that enable SecurityGroup agent
     support in agent implementations.
     """
+    # Set to False when the server doesn't support
+    # security_group_info_for_devices
+    use_security_group_info_rpc = True
 
     def init_firewall(self, defer_refresh_firewall=False):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
@@ -154,12 +226,28 @@ class SecurityGroupAgentRpcMixin(object):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_security_group_rules_for_devices(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
 
+    def _get_security_group_rules_for_devices(self, device_ids):
+        if self.use_security_group_info_rpc:
+            try:
+                sg_info = self.plugin_rpc.security_group_info_for_devices(
+                    self.context, list(device_ids))
+            except n_rpc.RemoteError as e:
+                if e.exc_type not in ('NoSuchMethod', 'UnsupportedVersion'):
+                    raise
+                LOG.info(_("The server doesn't support "
+                           "security_group_info_for_devices, using "
+                           "security_group_rules_for_devices"))
+                self.use_security_group_info_rpc = False
+            else:
+                return convert_security_group_info(sg_info)
+        return self.plugin_rpc.security_group_rules_for_devices(
+            self.context, list(device_ids))
+
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
                    "rule updated %r"), security_groups)
@@ -217,8 +305,7 @@ class SecurityGroupAgentRpcMixin(object):
             if not device_ids:
                 LOG.info(_("No ports here to refresh firewall"))
                 return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._get_security_group_rules_for_devices(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 LOG.debug(_("Update port filter for %s"), device['device'])
@@ -266,6 +353,8 @@ class SecurityGroupAgentRpcMixin(object):
 
 
 class SecurityGroupAgentRpcApiMixin(object):
+    # Security groups with member updates waiting to be notified
+    _pending_sg_member_updates = None
 
     def _get_security_group_topic(self):
         return topics.get_topic_name(self.topic,
@@ -283,9 +372,35 @@ class SecurityGroupAgentRpcApiMixin(object):
                          topic=self._get_security_group_topic())
 
     def security_groups_member_updated(self, context, security_groups):
-        """Notify member updated security groups."""
+        """Notify member updated security groups.
+
+        When sg_member_update_interval is set, the first update starts a
+        short-lived thread which waits for that interval and then notifies
+        all the security groups updated in the meantime at once.
+        """
         if not security_groups:
             return
+        interval = cfg.CONF.sg_member_update_interval
+        if not interval:
+            self._notify_security_groups_member_updated(context,
+                                                        security_groups)
+            return
+        if self._pending_sg_member_updates is not None:
+            self._pending_sg_member_updates.update(security_groups)
+            return
+        self._pending_sg_member_updates = set(security_groups)
+
+        def last_out_sends():
+            eventlet.sleep(interval)
+            pending = self._pending_sg_member_updates
+            self._pending_sg_member_updates = None
+            self._notify_security_groups_member_updated(context,
+                                                        list(pending))
+
+        eventlet.spawn_n(last_out_sends)
+
+    def _notify_security_groups_member_updated(self, context,
+                                               security_groups):
         self.fanout_cast(context,
                          self.make_msg('security_groups_member_updated',
                                        security_groups=security_groups),
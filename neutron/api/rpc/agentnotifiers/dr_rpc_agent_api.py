@@ -27,7 +27,8 @@ class DynamicRoutingAgentNotifyAPI(n_rpc.RpcProxy):
         super(DynamicRoutingAgentNotifyAPI, self).__init__(
               topic=topic, default_version=self.BASE_RPC_API_VERSION)
 
-    def _notification_host(self, context, method, payload, host):
+    def _notification_host(self, context, method, payload, host,
+                           version=None):
         """Notify the agent that is hosting the peer."""
         LOG.debug(_('Nofity agent at %(host)s the message '
                     '%(method)s'), {'host': host,
@@ -35,7 +36,17 @@ class DynamicRoutingAgentNotifyAPI(n_rpc.RpcProxy):
         self.cast(
             context, self.make_msg(method,
                                    payload=payload),
-            topic='%s.%s' % (topics.DR_AGENT, host))
+            topic='%s.%s' % (topics.DR_AGENT, host), version=version)
+
+    def _notification_fanout(self, context, method, payload, version=None):
+        """Fanout the message to all the DR agents."""
+        LOG.debug(_('Fanout notify agents at %(topic)s the message '
+                    '%(method)s'), {'topic': topics.DR_AGENT,
+                                    'method': method})
+        self.fanout_cast(
+            context, self.make_msg(method,
+                                   payload=payload),
+            topic=topics.DR_AGENT, version=version)
 
     def add_routingpeer(self, context, payload, host):
         self._notification_host(context, 'add_routingpeer', payload, host)
@@ -45,3 +56,23 @@ class DynamicRoutingAgentNotifyAPI(n_rpc.RpcProxy):
                                 'remove_routingpeer',
                                 routingpeer_id,
                                 host)
+
+    def routinginstance_rescheduled(self, context, routinginstance_id,
+                                    host):
+        """Tell an agent a routing instance moved to or from it."""
+        self._notification_host(context, 'routinginstance_rescheduled',
+                                routinginstance_id, host, version='1.3')
+
+    def advertise_routes_changed(self, context, routinginstance_id,
+                                 generation, added, removed):
+        """Push a delta of the prefixes advertised by a routing instance.
+
+        Only the agents hosting the routing instance apply it; the rest
+        drop it on the floor.
+        """
+        payload = {'routinginstance_id': routinginstance_id,
+                   'generation': generation,
+                   'added': added,
+                   'removed': removed}
+        self._notification_fanout(context, 'advertise_routes_changed',
+                                  payload, version='1.2')
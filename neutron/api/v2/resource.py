@@ -20,6 +20,7 @@ Utility methods for working with WSGI servers redux
 import sys
 
 import netaddr
+from oslo.config import cfg
 import six
 import webob.dec
 import webob.exc
@@ -136,6 +137,12 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
+        if (status == 200 and hasattr(serializer, 'serialize_iter') and
+                _is_large_collection(result)):
+            # NOTE: the body is sent by chunks while it is serialized
+            return webob.Response(request=request, status=status,
+                                  content_type=content_type,
+                                  app_iter=serializer.serialize_iter(result))
         body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
@@ -148,6 +155,15 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
     return resource
 
 
+def _is_large_collection(result):
+    """Tell whether result holds enough items to be streamed."""
+    threshold = cfg.CONF.stream_list_threshold
+    if threshold < 0 or not isinstance(result, dict):
+        return False
+    return any(isinstance(value, list) and len(value) >= threshold
+               for value in result.itervalues())
+
+
 def translate(translatable, locale):
     """Translates the object to the given locale.
 
@@ -63,12 +63,35 @@ core_opts = [
                help=_("The maximum number of items returned in a single "
                       "response, value was 'infinite' or negative integer "
                       "means no limit")),
+    cfg.IntOpt('stream_list_threshold', default=1000,
+               help=_("List responses of at least this number of items are "
+                      "serialized and sent by chunks, instead of as a "
+                      "whole. A negative value disables it.")),
     cfg.IntOpt('max_dns_nameservers', default=5,
                help=_("Maximum number of DNS nameservers")),
     cfg.IntOpt('max_subnet_host_routes', default=20,
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ipam_driver',
+               default='neutron.ipam.driver.AvailabilityRangeIpamDriver',
+               help=_("The driver used to allocate fixed IPs from the "
+                      "allocation pools of the subnets")),
+    cfg.IntOpt('ip_allocation_retries', default=16,
+               help=_("How many free addresses the interval IPAM drivers "
+                      "try to reserve on a subnet before reloading its free "
+                      "addresses")),
+    cfg.BoolOpt('security_group_info_cache', default=False,
+                help=_("Cache the rules and member IPs of the security "
+                       "groups returned to the agents. The cache is only "
+                       "invalidated by the changes made by its own process, "
+                       "so it is ignored, with an error, when api_workers "
+                       "or rpc_workers is set")),
+    cfg.IntOpt('sg_member_update_interval', default=0,
+               help=_("Number of seconds during which the security group "
+                      "member updates are merged into a single "
+                      "notification to the agents. 0 notifies every "
+                      "update right away")),
     cfg.IntOpt('dhcp_lease_duration', default=86400,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration (in seconds). Use -1 to tell "
@@ -92,6 +92,10 @@ class PortNotFoundOnNetwork(NotFound):
                 "on network %(net_id)s")
 
 
+class MarkerNotFound(NotFound):
+    message = _("Marker %(marker)s could not be found")
+
+
 class PolicyFileNotFound(NotFound):
     message = _("Policy configuration policy.json could not be found")
 
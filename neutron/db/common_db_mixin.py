@@ -15,6 +15,7 @@
 
 import weakref
 
+from sqlalchemy import orm
 from sqlalchemy import sql
 
 from neutron.common import exceptions as n_exc
@@ -155,25 +156,62 @@ class CommonDbMixin(object):
 
     def _get_collection_query(self, context, model, filters=None,
                               sorts=None, limit=None, marker_obj=None,
-                              page_reverse=False):
+                              page_reverse=False, marker=None):
         collection = self._model_query(context, model)
         collection = self._apply_filters_to_query(collection, model, filters)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
         collection = sqlalchemyutils.paginate_query(collection, model, limit,
                                                     sorts,
-                                                    marker_obj=marker_obj)
+                                                    marker_obj=marker_obj,
+                                                    marker=marker)
         return collection
 
+    def _get_projected_items(self, query, model, fields, column_fields):
+        """Read the requested fields of a collection from its columns.
+
+        column_fields are the fields which dict_func copies straight from the
+        columns of the same name. When only such fields are requested, only
+        their columns are selected, so that neither the relationships of the
+        model are loaded nor the dict extend functions called. None is
+        returned when other fields are requested.
+        """
+        if not fields or not column_fields:
+            return None
+        fields = set(fields)
+        if not fields.issubset(column_fields):
+            return None
+        primary_key = [column.key
+                       for column in orm.class_mapper(model).primary_key]
+        names = primary_key + [name for name in fields
+                               if name not in primary_key]
+        query = query.with_entities(*[getattr(model, name) for name in names])
+        items = []
+        seen = set()
+        for row in query:
+            # Like the ORM does for whole objects, drop the rows repeated by
+            # the joins of the query
+            key = tuple(row[:len(primary_key)])
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append(dict((name, value) for name, value in zip(names, row)
+                              if name in fields))
+        return items
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
-                        page_reverse=False):
+                        page_reverse=False, column_fields=None,
+                        marker=None):
         query = self._get_collection_query(context, model, filters=filters,
                                            sorts=sorts,
                                            limit=limit,
                                            marker_obj=marker_obj,
-                                           page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query]
+                                           page_reverse=page_reverse,
+                                           marker=marker)
+        items = self._get_projected_items(query, model, fields, column_fields)
+        if items is None:
+            items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
@@ -35,6 +35,7 @@ from neutron.extensions import l3
 from neutron import manager
 from neutron import neutron_plugin_base_v2
 from neutron.openstack.common import excutils
+from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import uuidutils
 from neutron.plugins.common import constants as service_constants
@@ -51,6 +52,19 @@ LOG = logging.getLogger(__name__)
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = [constants.DEVICE_OWNER_DHCP]
 
+# The attributes of the core resources which are copied straight from the
+# columns of the same name. Listing only these attributes selects only their
+# columns, see CommonDbMixin._get_projected_items.
+NETWORK_COLUMN_FIELDS = frozenset(['id', 'name', 'tenant_id', 'admin_state_up',
+                                   'status', 'shared'])
+SUBNET_COLUMN_FIELDS = frozenset(['id', 'name', 'tenant_id', 'network_id',
+                                  'ip_version', 'cidr', 'gateway_ip',
+                                  'enable_dhcp', 'ipv6_ra_mode',
+                                  'ipv6_address_mode', 'shared'])
+PORT_COLUMN_FIELDS = frozenset(['id', 'name', 'network_id', 'tenant_id',
+                                'mac_address', 'admin_state_up', 'status',
+                                'device_id', 'device_owner'])
+
 
 class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         common_db_mixin.CommonDbMixin):
@@ -70,6 +84,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     __native_pagination_support = True
     __native_sorting_support = True
 
+    _ipam_driver = None
+
     def __init__(self):
         db.configure_db()
         if cfg.CONF.notify_nova_on_port_status_changes:
@@ -84,6 +100,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             event.listen(models_v2.Port.status, 'set',
                          self.nova_notifier.record_port_status_changed)
 
+    @property
+    def ipam_driver(self):
+        if self._ipam_driver is None:
+            self._ipam_driver = importutils.import_object(
+                cfg.CONF.ipam_driver, self)
+            LOG.info(_('Loaded ipam_driver: %s'), cfg.CONF.ipam_driver)
+        return self._ipam_driver
+
     @classmethod
     def register_dict_extend_funcs(cls, resource, funcs):
         cur_funcs = cls._dict_extend_functions.get(resource, [])
@@ -435,7 +459,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         for fixed in fixed_ips:
             if 'ip_address' in fixed:
                 # Remove the IP address from the allocation pool
-                NeutronDbPluginV2._allocate_specific_ip(
+                self.ipam_driver.allocate_specific_ip(
                     context, fixed['subnet_id'], fixed['ip_address'])
                 ips.append({'ip_address': fixed['ip_address'],
                             'subnet_id': fixed['subnet_id']})
@@ -444,7 +468,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             else:
                 subnets = [self._get_subnet(context, fixed['subnet_id'])]
                 # IP address allocation
-                result = self._generate_ip(context, subnets)
+                result = self.ipam_driver.generate_ip(context, subnets)
                 ips.append({'ip_address': result['ip_address'],
                             'subnet_id': result['subnet_id']})
         return ips
@@ -474,10 +498,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         to_add = self._test_fixed_ips_for_port(context, network_id, new_ips)
         for ip in original_ips:
             LOG.debug(_("Port update. Hold %s"), ip)
-            NeutronDbPluginV2._delete_ip_allocation(context,
-                                                    network_id,
-                                                    ip['subnet_id'],
-                                                    ip['ip_address'])
+            self.ipam_driver.release_ip(context, network_id,
+                                        ip['subnet_id'], ip['ip_address'])
 
         if to_add:
             LOG.debug(_("Port update. Adding %s"), to_add)
@@ -529,7 +551,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             version_subnets = [v4, v6]
             for subnets in version_subnets:
                 if subnets:
-                    result = NeutronDbPluginV2._generate_ip(context, subnets)
+                    result = self.ipam_driver.generate_ip(context, subnets)
                     ips.append({'ip_address': result['ip_address'],
                                 'subnet_id': result['subnet_id']})
         return ips
@@ -894,14 +916,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     def get_networks(self, context, filters=None, fields=None,
                      sorts=None, limit=None, marker=None,
                      page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'network', limit, marker)
         return self._get_collection(context, models_v2.Network,
                                     self._make_network_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts,
                                     limit=limit,
-                                    marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+                                    marker=marker,
+                                    page_reverse=page_reverse,
+                                    column_fields=NETWORK_COLUMN_FIELDS)
 
     def get_networks_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Network,
@@ -1219,14 +1241,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     def get_subnets(self, context, filters=None, fields=None,
                     sorts=None, limit=None, marker=None,
                     page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'subnet', limit, marker)
         return self._get_collection(context, models_v2.Subnet,
                                     self._make_subnet_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts,
                                     limit=limit,
-                                    marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+                                    marker=marker,
+                                    page_reverse=page_reverse,
+                                    column_fields=SUBNET_COLUMN_FIELDS)
 
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
@@ -1295,13 +1317,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                'network_id': network_id,
                                'subnet_id': subnet_id,
                                'port_id': port_id})
-                    allocated = models_v2.IPAllocation(
-                        network_id=network_id,
-                        port_id=port_id,
-                        ip_address=ip_address,
-                        subnet_id=subnet_id,
-                    )
-                    context.session.add(allocated)
+                    self.ipam_driver.store_ip_allocation(
+                        context, network_id, subnet_id, port_id, ip_address)
 
         return self._make_port_dict(port, process_extensions=False)
 
@@ -1339,10 +1356,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
                 # Update ips if necessary
                 for ip in added_ips:
-                    allocated = models_v2.IPAllocation(
-                        network_id=port['network_id'], port_id=port.id,
-                        ip_address=ip['ip_address'], subnet_id=ip['subnet_id'])
-                    context.session.add(allocated)
+                    self.ipam_driver.store_ip_allocation(
+                        context, port['network_id'], ip['subnet_id'],
+                        port.id, ip['ip_address'])
             # Remove all attributes in p which are not in the port DB model
             # and then update the port
             port.update(self._filter_non_model_columns(p, models_v2.Port))
@@ -1385,7 +1401,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._make_port_dict(port, fields)
 
     def _get_ports_query(self, context, filters=None, sorts=None, limit=None,
-                         marker_obj=None, page_reverse=False):
+                         marker_obj=None, page_reverse=False, marker=None):
         Port = models_v2.Port
         IPAllocation = models_v2.IPAllocation
 
@@ -1408,18 +1424,21 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
         query = sqlalchemyutils.paginate_query(query, Port, limit,
-                                               sorts, marker_obj)
+                                               sorts, marker_obj=marker_obj,
+                                               marker=marker)
         return query
 
     def get_ports(self, context, filters=None, fields=None,
                   sorts=None, limit=None, marker=None,
                   page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'port', limit, marker)
         query = self._get_ports_query(context, filters=filters,
                                       sorts=sorts, limit=limit,
-                                      marker_obj=marker_obj,
+                                      marker=marker,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+        items = self._get_projected_items(query, models_v2.Port, fields,
+                                          PORT_COLUMN_FIELDS)
+        if items is None:
+            items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
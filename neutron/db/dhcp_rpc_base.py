@@ -13,6 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import operator
+
 from oslo.config import cfg
 from oslo.db import exception as db_exc
 
@@ -23,6 +26,7 @@ from neutron.common import utils
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.openstack.common import excutils
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
@@ -105,6 +109,43 @@ class DhcpRpcCallbackMixin(object):
 
         return networks
 
+    def get_active_networks_changes(self, context, **kwargs):
+        """Return the info of the active networks the agent is missing.
+
+        The revision of a network is a digest of its info. Only the networks
+        whose revision differs from the one given by the agent are returned
+        in full:
+
+        {'networks': [info of the new and changed networks, with their
+                      'revision'],
+         'unchanged': [ids of the other active networks]}
+
+        :params revisions: dict of network id -> revision known to the agent
+        """
+        revisions = kwargs.get('revisions') or {}
+        changes = {'networks': [], 'unchanged': []}
+        for network in self.get_active_networks_info(context, **kwargs):
+            revision = self._get_network_revision(network)
+            if revisions.get(network['id']) == revision:
+                changes['unchanged'].append(network['id'])
+            else:
+                network['revision'] = revision
+                changes['networks'].append(network)
+        LOG.debug(_('Active networks for %(host)s: %(changed)d changed, '
+                    '%(unchanged)d unchanged'),
+                  {'host': kwargs.get('host'),
+                   'changed': len(changes['networks']),
+                   'unchanged': len(changes['unchanged'])})
+        return changes
+
+    @staticmethod
+    def _get_network_revision(network):
+        by_id = operator.itemgetter('id')
+        info = dict(network,
+                    subnets=sorted(network['subnets'], key=by_id),
+                    ports=sorted(network['ports'], key=by_id))
+        return hashlib.sha1(jsonutils.dumps(info, sort_keys=True)).hexdigest()
+
     def get_network_info(self, context, **kwargs):
         """Retrieve and return a extended information about a network."""
         network_id = kwargs.get('network_id')
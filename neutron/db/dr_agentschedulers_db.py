@@ -16,6 +16,7 @@ import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
 from sqlalchemy.orm import joinedload
+from sqlalchemy import sql
 
 from neutron.api.rpc.agentnotifiers import dr_rpc_agent_api as dr_rpc
 from neutron.common import constants
@@ -40,6 +41,14 @@ DR_AGENT_SCHEDULER_OPTS = [
                       'peers to dynamic routing agent')),
     cfg.BoolOpt('dynamic_routing_auto_schedule', default=True,
                 help=_('Allow auto scheduling of peers to DR agent.')),
+    cfg.IntOpt('dynamic_routing_rebalance_interval', default=0,
+               help=_('Seconds between two rebalances of the routing peers '
+                      'and instances across the DR agents. 0 disables the '
+                      'periodic rebalance.')),
+    cfg.IntOpt('dynamic_routing_rebalance_threshold', default=10,
+               help=_('Difference of load between the most and the least '
+                      'loaded DR agents above which routing peers are '
+                      'moved.')),
 ]
 
 cfg.CONF.register_opts(DR_AGENT_SCHEDULER_OPTS)
@@ -90,6 +99,45 @@ class DynamicRoutingAgentSchedulerDbMixin(
             return self.dr_scheduler.auto_schedule_routinginstances(
                 context, host)
 
+    def schedule_routingpeer(self, context, routingpeer_id):
+        if not (self.dr_scheduler and
+                cfg.CONF.dynamic_routing_auto_schedule):
+            return
+        agent = self.dr_scheduler.schedule_routingpeer(context,
+                                                       routingpeer_id)
+        if agent:
+            routingpeer = self._get_routingpeer(context, routingpeer_id)
+            self.dr_rpc_notifier.add_routingpeer(
+                context, self._make_routingpeer_dict(routingpeer), agent.host)
+
+    def schedule_routinginstance(self, context, routinginstance_id):
+        # The agents pick their routing instance up the next time they
+        # check its generation, so there is nobody to notify.
+        if self.dr_scheduler and cfg.CONF.dynamic_routing_auto_schedule:
+            self.dr_scheduler.schedule_routinginstance(context,
+                                                       routinginstance_id)
+
+    def rebalance_dr_agents(self, context):
+        """Move bindings off dead or overloaded DR agents."""
+        if not self.dr_scheduler:
+            return []
+        moves = self.dr_scheduler.rebalance(context)
+        for moved in moves:
+            from_agent = self._get_agent(context, moved['from_agent_id'])
+            to_agent = self._get_agent(context, moved['to_agent_id'])
+            if moved['resource'] == 'routinginstance':
+                for host in (from_agent.host, to_agent.host):
+                    self.dr_rpc_notifier.routinginstance_rescheduled(
+                        context, moved['id'], host)
+                continue
+            routingpeer = self._get_routingpeer(context, moved['id'])
+            self.dr_rpc_notifier.remove_routingpeer(context, moved['id'],
+                                                    from_agent.host)
+            self.dr_rpc_notifier.add_routingpeer(
+                context, self._make_routingpeer_dict(routingpeer),
+                to_agent.host)
+        return moves
+
     def list_peers_on_dr_agent(self, context, agent_id):
         LOG.debug(_("list_peers_on_dr_agent() called"))
         query = context.session.query(RoutingPeerAgentBinding.routingpeer_id)
@@ -257,3 +305,29 @@ class DynamicRoutingAgentSchedulerDbMixin(
         query = query.filter(
             RoutingInstanceAgentBinding.agent_id == agent.id)
         return [item[0] for item in query]
+
+    def list_advertise_routes_on_dr_agent(self, context, host):
+        """Return the prefixes advertised by the DR agent on a host.
+
+        The prefixes of every advertising routing instance hosted by the
+        agent are fetched with a single query.
+
+        :returns: a dictionary of the sorted list of prefixes of each
+            routing instance, keyed by the routing instance ID.
+        """
+        query = context.session.query(
+            RoutingInstanceAgentBinding.routinginstance_id)
+        query = query.join(
+            agents_db.Agent,
+            agents_db.Agent.id == RoutingInstanceAgentBinding.agent_id)
+        query = query.join(
+            dr_db.RoutingInstance,
+            dr_db.RoutingInstance.id ==
+            RoutingInstanceAgentBinding.routinginstance_id)
+        query = query.filter(
+            agents_db.Agent.agent_type ==
+            constants.AGENT_TYPE_DYNAMIC_ROUTING,
+            agents_db.Agent.host == host,
+            agents_db.Agent.admin_state_up == sql.true(),
+            dr_db.RoutingInstance.advertise == sql.true())
+        return self.get_advertise_prefixes(context, query.subquery())
@@ -12,10 +12,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 import sqlalchemy as sa
+from sqlalchemy import event
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
+from sqlalchemy import sql
 
-from neutron.common import utils
 from neutron.db import db_base_plugin_v2 as base_db
 from neutron.db import model_base
 from neutron.db import models_v2
@@ -45,6 +46,10 @@ class RoutingInstance(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     nexthop = sa.Column(sa.String(64))
     advertise = sa.Column(sa.Boolean)
     discover = sa.Column(sa.Boolean)
+    # Bumped every time the set of advertised prefixes changes, so the DR
+    # agents can apply deltas in order and detect the ones they missed.
+    generation = sa.Column(sa.Integer, nullable=False, default=0,
+                           server_default='0')
 
 
 class RoutingInstanceNetBinding(model_base.BASEV2, models_v2.HasId):
@@ -74,6 +79,24 @@ class AdvertiseRoute(model_base.BASEV2):
                                                            cascade='delete'))
 
 
+@event.listens_for(models_v2.Subnet, 'after_insert')
+@event.listens_for(models_v2.Subnet, 'after_delete')
+def _subnet_changed(mapper, connection, subnet):
+    # The subnets of the associated networks are advertised, so their
+    # creation and deletion bump the generation of the advertising routing
+    # instances in the same transaction. The agents notice it when they
+    # poll the generation and fetch a new snapshot.
+    bindings = RoutingInstanceNetBinding.__table__
+    instances = RoutingInstance.__table__
+    routinginstance_ids = sa.select([bindings.c.routinginstance_id]).where(
+        bindings.c.network_id == subnet.network_id)
+    connection.execute(
+        instances.update().
+        where(instances.c.id.in_(routinginstance_ids)).
+        where(instances.c.advertise == sql.true()).
+        values(generation=instances.c.generation + 1))
+
+
 class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
                             base_db.NeutronDbPluginV2):
 
@@ -158,16 +181,25 @@ class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
         data = routinginstance['routinginstance']
         with context.session.begin(subtransactions=True):
             routinginstance_db = self._get_routinginstance(context, id)
+            prefixes = self._get_advertised_prefixes(context,
+                                                     routinginstance_db)
             if 'advertise_routes' in data:
                 self._update_advertise_routes(
                     context, id, data['advertise_routes'])
                 data.pop('advertise_routes')
+                context.session.expire(routinginstance_db,
+                                       ['advertise_routes'])
             routes = self._get_advertise_routes_by_routinginstance(
                 context, id)
             routinginstance_db.update(data)
+            delta = self._advertised_prefixes_changed(
+                context, routinginstance_db, prefixes)
             ri_dict = self._make_routinginstance_dict(routinginstance_db)
             ri_dict['advertise_routes'] = routes
-            return ri_dict
+
+        if delta:
+            self._notify_advertise_routes_changed(context, id, *delta)
+        return ri_dict
 
     def _get_advertise_routes_by_routinginstance(self, context,
                                                  routinginstance_id):
@@ -175,34 +207,136 @@ class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
         query = query.filter_by(routinginstance_id=routinginstance_id)
         return self._make_advertise_route_list(query)
 
-    def _get_routes_dict_by_instance_id(self, context,
-                                        routinginstance_id):
-        query = context.session.query(AdvertiseRoute)
-        query = query.filter_by(routinginstance_id=routinginstance_id)
-        routes = []
-        routes_dict = {}
-        for advertise_route in query:
-            routes.append({'advertise_route':
-                           advertise_route['advertise_route']})
-            routes_dict[advertise_route['advertise_route']] = advertise_route
-        return routes, routes_dict
-
     def _update_advertise_routes(self, context, routinginstance_id,
                                  advertise_routes):
-        old_routes, routes_dict = self._get_routes_dict_by_instance_id(
-            context, routinginstance_id)
-        new_routes = [{'advertise_route': route} for route in advertise_routes]
-        added, removed = utils.diff_list_of_dict(old_routes, new_routes)
+        query = context.session.query(AdvertiseRoute.advertise_route)
+        query = query.filter_by(routinginstance_id=routinginstance_id)
+        old_routes = set(item[0] for item in query)
+        new_routes = set(advertise_routes)
+        added = sorted(new_routes - old_routes)
+        removed = sorted(old_routes - new_routes)
+
         LOG.debug(_('Added routes are %s'), added)
-        for route in added:
-            advertise_route = AdvertiseRoute(
-                advertise_route=route['advertise_route'],
-                routinginstance_id=routinginstance_id)
-            context.session.add(advertise_route)
+        if added:
+            context.session.execute(
+                AdvertiseRoute.__table__.insert(),
+                [{'advertise_route': route,
+                  'routinginstance_id': routinginstance_id}
+                 for route in added])
 
         LOG.debug(_('Removed routes are %s'), removed)
-        for route in removed:
-            context.session.delete(routes_dict[route['advertise_route']])
+        if removed:
+            query = context.session.query(AdvertiseRoute)
+            query = query.filter(
+                AdvertiseRoute.routinginstance_id == routinginstance_id,
+                AdvertiseRoute.advertise_route.in_(removed))
+            query.delete(synchronize_session=False)
+        return added, removed
+
+    def _bump_routinginstance_generation(self, context, routinginstance_id):
+        """Increase the generation of a routing instance and return it.
+
+        The increment is done by the database so concurrent updates of the
+        same routing instance never hand out the same generation twice.
+        """
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(RoutingInstance)
+            query = query.filter_by(id=routinginstance_id)
+            query.update({'generation': RoutingInstance.generation + 1},
+                         synchronize_session=False)
+            query = context.session.query(RoutingInstance.generation)
+            return query.filter_by(id=routinginstance_id).scalar()
+
+    def _get_advertised_prefixes(self, context, routinginstance_db):
+        """Return the set of prefixes a routing instance advertises.
+
+        A routing instance which does not advertise has none.
+        """
+        if not routinginstance_db['advertise']:
+            return set()
+        prefixes = self.get_advertise_prefixes(context,
+                                               [routinginstance_db['id']])
+        return set(prefixes.get(routinginstance_db['id'], []))
+
+    def _advertised_prefixes_changed(self, context, routinginstance_db,
+                                     old_prefixes):
+        """Bump the generation if the advertised prefixes have changed.
+
+        The delta is computed from the prefixes advertised before and after
+        the change, so a prefix advertised for several reasons, e.g. the
+        subnet of a network which is also an advertise route, is only
+        removed when none of them remains.
+
+        :returns: a tuple of the new generation, the added and the removed
+            prefixes or None if the advertised prefixes have not changed.
+        """
+        new_prefixes = self._get_advertised_prefixes(context,
+                                                     routinginstance_db)
+        added = sorted(new_prefixes - old_prefixes)
+        removed = sorted(old_prefixes - new_prefixes)
+        if not added and not removed:
+            return None
+        generation = self._bump_routinginstance_generation(
+            context, routinginstance_db['id'])
+        return generation, added, removed
+
+    def get_advertise_prefixes(self, context, routinginstance_ids):
+        """Return the prefixes advertised by many routing instances at once.
+
+        Subnets of the associated networks and advertise routes are fetched
+        with a single query whatever the number of routing instances.
+
+        :param routinginstance_ids: a list of routing instance IDs or a
+            subquery selecting them.
+        :returns: a dictionary of the sorted list of prefixes of each
+            routing instance, keyed by the routing instance ID.
+        """
+        if isinstance(routinginstance_ids, list) and not routinginstance_ids:
+            return {}
+        subnets = context.session.query(
+            RoutingInstanceNetBinding.routinginstance_id,
+            models_v2.Subnet.cidr)
+        subnets = subnets.join(
+            models_v2.Subnet,
+            models_v2.Subnet.network_id ==
+            RoutingInstanceNetBinding.network_id)
+        subnets = subnets.filter(
+            RoutingInstanceNetBinding.routinginstance_id.in_(
+                routinginstance_ids))
+        routes = context.session.query(AdvertiseRoute.routinginstance_id,
+                                       AdvertiseRoute.advertise_route)
+        routes = routes.filter(
+            AdvertiseRoute.routinginstance_id.in_(routinginstance_ids))
+
+        prefixes = {}
+        for routinginstance_id, prefix in subnets.union(routes):
+            prefixes.setdefault(routinginstance_id, set()).add(prefix)
+        return dict((routinginstance_id, sorted(ri_prefixes))
+                    for routinginstance_id, ri_prefixes in prefixes.items())
+
+    def _notify_advertise_routes_changed(self, context, routinginstance_id,
+                                         generation, added, removed):
+        """Hook called once the advertised prefixes have changed.
+
+        Plugins that have agents to keep in sync override it to push the
+        delta; the base implementation does nothing.
+        """
+        pass
+
+    def get_advertise_routes_snapshot(self, context, routinginstance_id):
+        """Return every prefix advertised by a routing instance.
+
+        :returns: a dictionary with the routing instance ID, its current
+            generation and the list of advertised prefixes.
+        """
+        with context.session.begin(subtransactions=True):
+            routinginstance_db = self._get_routinginstance(
+                context, routinginstance_id)
+            prefixes = self._get_advertised_prefixes(context,
+                                                     routinginstance_db)
+            return {'routinginstance_id': routinginstance_id,
+                    'generation': routinginstance_db['generation'],
+                    'prefixes': sorted(prefixes)}
 
     def add_network_to_routinginstance(self, context, routinginstance_id,
                                        network_id):
@@ -211,6 +345,7 @@ class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
             routinginstance = self._get_routinginstance(
                     context,
                     routinginstance_id)
+            prefixes = self._get_advertised_prefixes(context, routinginstance)
             query = context.session.query(RoutingInstanceNetBinding)
             query = query.filter(
                     RoutingInstanceNetBinding.routinginstance_id ==
@@ -229,17 +364,93 @@ class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
             binding.routinginstance_id = routinginstance.id
             binding.network_id = network_id
             context.session.add(binding)
+            delta = self._advertised_prefixes_changed(
+                context, routinginstance, prefixes)
             LOG.debug(_('Network %(network_id)s is associated to '
                         'routing instance %(routinginstance_id)s'),
                       {'routinginstance_id': routinginstance.id,
                        'network_id': network_id})
 
+        if delta:
+            self._notify_advertise_routes_changed(
+                context, routinginstance_id, *delta)
+
+    def add_networks_to_routinginstance(self, context, routinginstance_id,
+                                        network_ids):
+        """Associate many networks to a routing instance at once.
+
+        Networks already associated are skipped.
+
+        :returns: the IDs of the networks newly associated.
+        """
+        network_ids = set(network_ids)
+        with context.session.begin(subtransactions=True):
+            routinginstance = self._get_routinginstance(context,
+                                                        routinginstance_id)
+            prefixes = self._get_advertised_prefixes(context, routinginstance)
+            query = context.session.query(RoutingInstanceNetBinding.network_id)
+            query = query.filter(
+                RoutingInstanceNetBinding.routinginstance_id ==
+                routinginstance_id,
+                RoutingInstanceNetBinding.network_id.in_(network_ids))
+            added = sorted(network_ids - set(item[0] for item in query))
+            if not added:
+                return []
+            context.session.execute(
+                RoutingInstanceNetBinding.__table__.insert(),
+                [{'id': uuidutils.generate_uuid(),
+                  'routinginstance_id': routinginstance_id,
+                  'network_id': network_id} for network_id in added])
+            delta = self._advertised_prefixes_changed(
+                context, routinginstance, prefixes)
+            LOG.debug(_('Networks %(network_ids)s are associated to '
+                        'routing instance %(routinginstance_id)s'),
+                      {'routinginstance_id': routinginstance_id,
+                       'network_ids': added})
+
+        if delta:
+            self._notify_advertise_routes_changed(
+                context, routinginstance_id, *delta)
+        return added
+
+    def remove_networks_from_routinginstance(self, context,
+                                             routinginstance_id, network_ids):
+        """Disassociate many networks from a routing instance at once.
+
+        Networks not associated are skipped.
+
+        :returns: the IDs of the networks disassociated.
+        """
+        network_ids = set(network_ids)
+        with context.session.begin(subtransactions=True):
+            routinginstance = self._get_routinginstance(context,
+                                                        routinginstance_id)
+            prefixes = self._get_advertised_prefixes(context, routinginstance)
+            query = context.session.query(RoutingInstanceNetBinding)
+            query = query.filter(
+                RoutingInstanceNetBinding.routinginstance_id ==
+                routinginstance_id,
+                RoutingInstanceNetBinding.network_id.in_(network_ids))
+            removed = sorted(binding.network_id for binding in query)
+            if not removed:
+                return []
+            query.delete(synchronize_session='fetch')
+            delta = self._advertised_prefixes_changed(
+                context, routinginstance, prefixes)
+
+        if delta:
+            self._notify_advertise_routes_changed(
+                context, routinginstance_id, *delta)
+        return removed
+
     def remove_network_from_routinginstance(self, context, routinginstance_id,
                                             network_id):
 
         with context.session.begin(subtransactions=True):
             routinginstance_db = self._get_routinginstance(
                 context, routinginstance_id)
+            prefixes = self._get_advertised_prefixes(context,
+                                                     routinginstance_db)
             query = context.session.query(RoutingInstanceNetBinding)
             query = query.filter(
                     RoutingInstanceNetBinding.routinginstance_id ==
@@ -251,6 +462,12 @@ class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
                 raise dr.RoutingInstanceNetNotHosted(ri_id=routinginstance_id,
                                                      network_id=network_id)
             context.session.delete(binding)
+            delta = self._advertised_prefixes_changed(
+                context, routinginstance_db, prefixes)
+
+        if delta:
+            self._notify_advertise_routes_changed(
+                context, routinginstance_id, *delta)
 
     def get_routinginstances(self, context, filters=None, fields=None):
         LOG.debug(_("get_routinginstances() called"))
@@ -262,16 +479,14 @@ class DynamicRoutingDbMixin(dr.DynamicRoutingPluginBase,
 
     def list_networks_on_routinginstance(self, context, routinginstance_id):
         LOG.debug(_("list_networks_on_routinginstance() called"))
-        query = context.session.query(RoutingInstanceNetBinding.network_id)
+        query = self._model_query(context, models_v2.Network)
+        query = query.join(
+            RoutingInstanceNetBinding,
+            RoutingInstanceNetBinding.network_id == models_v2.Network.id)
         query = query.filter(RoutingInstanceNetBinding.routinginstance_id ==
-                routinginstance_id)
-
-        network_ids = [item[0] for item in query]
-        if network_ids:
-            return {'networks':
-                    self.get_networks(context, filters={'id': network_ids})}
-        else:
-            return {'networks': []}
+                             routinginstance_id)
+        return {'networks': [self._make_network_dict(network)
+                             for network in query]}
 
     def _get_routingpeer(self, context, id):
         try:
@@ -50,6 +50,9 @@ CORE_ROUTER_ATTRS = ('id', 'name', 'tenant_id', 'admin_state_up', 'status')
 class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     """Represents a v2 neutron router."""
 
+    __table_args__ = (sa.Index('ix_routers_tenant_id_id', 'tenant_id', 'id'),
+                      model_base.BASEV2.__table_args__)
+
     name = sa.Column(sa.String(255))
     status = sa.Column(sa.String(16))
     admin_state_up = sa.Column(sa.Boolean)
@@ -64,6 +67,10 @@ class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     may not be associated with an internal port/ip address/router.
     """
 
+    __table_args__ = (sa.Index('ix_floatingips_tenant_id_id',
+                               'tenant_id', 'id'),
+                      model_base.BASEV2.__table_args__)
+
     floating_ip_address = sa.Column(sa.String(64), nullable=False)
     floating_network_id = sa.Column(sa.String(36), nullable=False)
     floating_port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'),
@@ -350,13 +357,12 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
     def get_routers(self, context, filters=None, fields=None,
                     sorts=None, limit=None, marker=None,
                     page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'router', limit, marker)
         return self._get_collection(context, Router,
                                     self._make_router_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts,
                                     limit=limit,
-                                    marker_obj=marker_obj,
+                                    marker=marker,
                                     page_reverse=page_reverse)
 
     def get_routers_count(self, context, filters=None):
@@ -810,8 +816,6 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
     def get_floatingips(self, context, filters=None, fields=None,
                         sorts=None, limit=None, marker=None,
                         page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'floatingip', limit,
-                                          marker)
         if filters is not None:
             for key, val in API_TO_DB_COLUMN_MAP.iteritems():
                 if key in filters:
@@ -822,7 +826,7 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
                                     filters=filters, fields=fields,
                                     sorts=sorts,
                                     limit=limit,
-                                    marker_obj=marker_obj,
+                                    marker=marker,
                                     page_reverse=page_reverse)
 
     def delete_disassociated_floatingips(self, context, network_id):
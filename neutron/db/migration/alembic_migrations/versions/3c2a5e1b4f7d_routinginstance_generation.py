@@ -0,0 +1,50 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add generation to routing instances
+
+Revision ID: 3c2a5e1b4f7d
+Revises: 15be73214821
+Create Date: 2014-08-12 10:21:43.318271
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c2a5e1b4f7d'
+down_revision = '15be73214821'
+
+# Change to ['*'] if this migration applies to all plugins
+migration_for_plugins = ['*']
+
+from alembic import op
+import sqlalchemy as sa
+
+from neutron.db import migration
+
+
+def upgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    op.add_column('routinginstances',
+                  sa.Column('generation', sa.Integer, nullable=False,
+                            server_default='0'))
+
+
+def downgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    op.drop_column('routinginstances', 'generation')
@@ -0,0 +1,95 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add tenant_id, id indexes for the pagination
+
+Revision ID: 4f8a1c2d9e3b
+Revises: 3c2a5e1b4f7d
+Create Date: 2014-08-20 14:02:11.508227
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4f8a1c2d9e3b'
+down_revision = '3c2a5e1b4f7d'
+
+# Change to ['*'] if this migration applies to all plugins
+migration_for_plugins = ['*']
+
+# The plugins of 128e042a2b68, which has the routers
+L3_PLUGINS = [
+    'neutron.plugins.hyperv.hyperv_neutron_plugin.HyperVNeutronPlugin',
+    'neutron.plugins.linuxbridge.lb_neutron_plugin.LinuxBridgePluginV2',
+    'neutron.plugins.metaplugin.meta_neutron_plugin.MetaPluginV2',
+    'neutron.plugins.ml2.plugin.Ml2Plugin',
+    'neutron.plugins.nec.nec_plugin.NECPluginV2',
+    'neutron.plugins.nicira.NeutronPlugin.NvpPluginV2',
+    'neutron.plugins.nicira.NeutronServicePlugin.NvpAdvancedPlugin',
+    'neutron.plugins.openvswitch.ovs_neutron_plugin.OVSNeutronPluginV2',
+    'neutron.plugins.ryu.ryu_neutron_plugin.RyuNeutronPluginV2',
+    'neutron.plugins.vmware.plugin.NsxPlugin',
+    'neutron.plugins.vmware.plugin.NsxServicePlugin',
+    'neutron.plugins.embrane.plugins.embrane_ovs_plugin.EmbraneOvsPlugin',
+    'neutron.plugins.ibm.sdnve_neutron_plugin.SdnvePluginV2',
+    'neutron.plugins.oneconvergence.plugin.OneConvergencePluginV2',
+    'neutron.plugins.cisco.network_plugin.PluginV2',
+]
+
+# The plugins of 3cb5d900c5de, 49f5e553f61f, 40b0aff0302e and f44ab9871cd6,
+# which create the security group tables
+SG_PLUGINS = [
+    'neutron.plugins.linuxbridge.lb_neutron_plugin.LinuxBridgePluginV2',
+    'neutron.plugins.nicira.NeutronPlugin.NvpPluginV2',
+    'neutron.plugins.nicira.NeutronServicePlugin.NvpAdvancedPlugin',
+    'neutron.plugins.openvswitch.ovs_neutron_plugin.OVSNeutronPluginV2',
+    'neutron.plugins.nec.nec_plugin.NECPluginV2',
+    'neutron.plugins.ryu.ryu_neutron_plugin.RyuNeutronPluginV2',
+    'neutron.plugins.vmware.plugin.NsxPlugin',
+    'neutron.plugins.vmware.plugin.NsxServicePlugin',
+    'neutron.plugins.oneconvergence.plugin.OneConvergencePluginV2',
+    'neutron.plugins.ml2.plugin.Ml2Plugin',
+    'neutron.plugins.mlnx.mlnx_plugin.MellanoxEswitchPlugin',
+    'neutron.plugins.bigswitch.plugin.NeutronRestProxyV2',
+]
+
+from alembic import op
+
+from neutron.db import migration
+
+CORE_TABLES = ['ports', 'networks', 'subnets']
+L3_TABLES = ['routers', 'floatingips']
+SG_TABLES = ['securitygrouprules']
+
+
+def _get_tables(active_plugins):
+    tables = []
+    if migration.should_run(active_plugins, migration_for_plugins):
+        tables += CORE_TABLES
+    if migration.should_run(active_plugins, L3_PLUGINS):
+        tables += L3_TABLES
+    if migration.should_run(active_plugins, SG_PLUGINS):
+        tables += SG_TABLES
+    return tables
+
+
+def upgrade(active_plugins=None, options=None):
+    for table in _get_tables(active_plugins):
+        op.create_index('ix_%s_tenant_id_id' % table, table,
+                        ['tenant_id', 'id'])
+
+
+def downgrade(active_plugins=None, options=None):
+    for table in _get_tables(active_plugins):
+        op.drop_index('ix_%s_tenant_id_id' % table, table)
@@ -119,6 +119,9 @@ class SubnetRoute(model_base.BASEV2, Route):
 class Port(model_base.BASEV2, HasId, HasTenant):
     """Represents a port on a Neutron v2 network."""
 
+    __table_args__ = (sa.Index('ix_ports_tenant_id_id', 'tenant_id', 'id'),
+                      model_base.BASEV2.__table_args__)
+
     name = sa.Column(sa.String(255))
     network_id = sa.Column(sa.String(36), sa.ForeignKey("networks.id"),
                            nullable=False)
@@ -165,6 +168,9 @@ class Subnet(model_base.BASEV2, HasId, HasTenant):
     are used for the IP allocation.
     """
 
+    __table_args__ = (sa.Index('ix_subnets_tenant_id_id', 'tenant_id', 'id'),
+                      model_base.BASEV2.__table_args__)
+
     name = sa.Column(sa.String(255))
     network_id = sa.Column(sa.String(36), sa.ForeignKey('networks.id'))
     ip_version = sa.Column(sa.Integer, nullable=False)
@@ -195,6 +201,9 @@ class Subnet(model_base.BASEV2, HasId, HasTenant):
 class Network(model_base.BASEV2, HasId, HasTenant):
     """Represents a v2 neutron network."""
 
+    __table_args__ = (sa.Index('ix_networks_tenant_id_id', 'tenant_id', 'id'),
+                      model_base.BASEV2.__table_args__)
+
     name = sa.Column(sa.String(255))
     ports = orm.relationship(Port, backref='networks')
     subnets = orm.relationship(Subnet, backref='networks',
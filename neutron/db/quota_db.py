@@ -13,11 +13,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+from oslo.config import cfg
+from oslo.db import exception as db_exc
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import orm
+from sqlalchemy import sql
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+from neutron import quota
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -31,6 +41,150 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represent the number of items of a resource used by a tenant.
+
+    The usage of a tracked resource is updated in the transactions
+    creating and deleting its items. It is counted again when it is dirty
+    or older than the resync interval.
+
+    The items created or deleted by a transaction are only recorded when
+    they are flushed, and the usages are updated when the transaction
+    commits. The usage rows are thus locked once the transaction holds all
+    its other locks, e.g. those of the IP availability ranges, and only
+    until it commits, so that the creates of a tenant do not wait for each
+    other nor deadlock on them.
+    """
+    resource = sa.Column(sa.String(255), primary_key=True)
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False)
+    synced_at = sa.Column(sa.DateTime, nullable=False)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represent items of a resource being created for a tenant."""
+    __table_args__ = (
+        sa.Index('ix_reservations_tenant_id_resource',
+                 'tenant_id', 'resource'),
+        model_base.BASEV2.__table_args__
+    )
+    tenant_id = sa.Column(sa.String(255), nullable=False)
+    resource = sa.Column(sa.String(255), nullable=False)
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
+# Keys of the session info holding the changes of the tracked usages not
+# yet applied, and the reservations made with the session
+_USAGE_DELTAS = 'quota_usage_deltas'
+_DIRTY_RESOURCES = 'quota_dirty_resources'
+_RESERVATIONS = 'quota_reservations'
+
+
+def _is_tracking_enabled():
+    return (cfg.CONF.QUOTAS.track_quota_usage and
+            isinstance(quota.QUOTAS.get_driver(), DbQuotaDriver))
+
+
+def _record_usage_delta(mapper, target, delta):
+    resource = quota.QUOTAS.get_tracked_resource(mapper.local_table.name)
+    if (resource is None or target.tenant_id is None or
+            not _is_tracking_enabled()):
+        return
+    deltas = orm.object_session(target).info.setdefault(_USAGE_DELTAS, {})
+    key = (resource.name, target.tenant_id)
+    deltas[key] = deltas.get(key, 0) + delta
+
+
+@event.listens_for(model_base.BASEV2, 'after_insert', propagate=True)
+def _increment_usage(mapper, connection, target):
+    _record_usage_delta(mapper, target, 1)
+
+
+@event.listens_for(model_base.BASEV2, 'after_delete', propagate=True)
+def _decrement_usage(mapper, connection, target):
+    _record_usage_delta(mapper, target, -1)
+
+
+def _mark_usages_dirty(session, resource_name):
+    usages = QuotaUsage.__table__
+    session.execute(
+        usages.update().
+        where(usages.c.resource == resource_name).
+        values(dirty=True))
+
+
+@event.listens_for(orm.Session, 'after_bulk_delete')
+def _bulk_delete_usages(delete_context):
+    # The deleted rows and their tenants are unknown here, so all the
+    # usages of the resource are counted again on their next check.
+    resource = quota.QUOTAS.get_tracked_resource(
+        delete_context.primary_table.name)
+    if resource is None or not _is_tracking_enabled():
+        return
+    session = delete_context.session
+    if session.transaction is None:
+        # Deleted in its own transaction, which has committed already
+        _mark_usages_dirty(session, resource.name)
+        return
+    session.info.setdefault(_DIRTY_RESOURCES, set()).add(resource.name)
+
+
+@event.listens_for(orm.Session, 'before_commit')
+def _apply_usage_deltas(session):
+    """Update the tracked usages with the items of the transaction.
+
+    The usage rows are updated in the order of their keys, and before the
+    reservations, so that the committing transactions lock them in the
+    same order. The reservations made with the session for the created
+    items are released in the same transaction, so that the items are
+    never counted both in the usage and in a reservation.
+    """
+    if session.transaction.nested:
+        return
+    session.flush()
+    dirty_resource_names = session.info.pop(_DIRTY_RESOURCES, set())
+    deltas = session.info.pop(_USAGE_DELTAS, {})
+    usages = QuotaUsage.__table__
+    resource_names = dirty_resource_names.union(
+        resource_name for resource_name, _tenant_id in deltas)
+    for resource_name in sorted(resource_names):
+        if resource_name in dirty_resource_names:
+            _mark_usages_dirty(session, resource_name)
+        for (name, tenant_id), delta in sorted(deltas.items()):
+            if name == resource_name and delta:
+                session.execute(
+                    usages.update().
+                    where(usages.c.resource == resource_name).
+                    where(usages.c.tenant_id == tenant_id).
+                    values(in_use=usages.c.in_use + delta))
+
+    reservations = Reservation.__table__
+    reservation_ids = session.info.get(_RESERVATIONS, {})
+    for key, delta in sorted(deltas.items()):
+        reservation_id = reservation_ids.get(key)
+        if reservation_id is None or delta <= 0:
+            continue
+        session.execute(
+            reservations.update().
+            where(reservations.c.id == reservation_id).
+            values(delta=reservations.c.delta - delta))
+        session.execute(
+            reservations.delete().
+            where(reservations.c.id == reservation_id).
+            where(reservations.c.delta <= 0))
+
+
+@event.listens_for(orm.Session, 'after_soft_rollback')
+def _discard_usage_deltas(session, previous_transaction):
+    # Only whole transactions are discarded, as the tracked resources are
+    # not created in savepoints
+    if not previous_transaction.nested:
+        session.info.pop(_USAGE_DELTAS, None)
+        session.info.pop(_DIRTY_RESOURCES, None)
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -177,3 +331,112 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+    def _get_usage(self, context, tenant_id, resource, count):
+        """Return the number of items of a resource used by a tenant.
+
+        The usage of a tracked resource is read, and locked until the end
+        of the transaction, from its row which is counted again when
+        missing, dirty or too old. Other resources are always counted.
+        """
+        if not isinstance(resource, quota.TrackedResource):
+            return count()
+
+        now = timeutils.utcnow()
+        # The usage is updated without the ORM, so a row already loaded
+        # by the session is read again
+        usage_qry = (context.session.query(QuotaUsage).
+                     filter_by(tenant_id=tenant_id, resource=resource.name).
+                     with_lockmode('update').populate_existing())
+        usage = usage_qry.first()
+        if usage is None:
+            usage = QuotaUsage(tenant_id=tenant_id, resource=resource.name,
+                               in_use=count(), dirty=False, synced_at=now)
+            try:
+                with context.session.begin_nested():
+                    context.session.add(usage)
+                return usage.in_use
+            except db_exc.DBDuplicateEntry:
+                # Inserted by a concurrent reservation, which has committed
+                # since, as the insert waited for it
+                usage = usage_qry.one()
+
+        interval = cfg.CONF.QUOTAS.quota_usage_resync_interval
+        if usage.dirty or (interval >= 0 and usage.synced_at +
+                           datetime.timedelta(seconds=interval) <= now):
+            usage.update({'in_use': count(), 'dirty': False,
+                          'synced_at': now})
+        return max(usage.in_use, 0)
+
+    def make_reservation(self, context, tenant_id, resources, resource,
+                         delta, count):
+        """Reserve delta more items of a resource for a tenant.
+
+        The usage of the tenant is the tracked or counted usage plus the
+        deltas of the pending reservations. Expired reservations, left by
+        creates which neither committed nor cancelled them, are removed.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve the resources for.
+        :param resources: A dictionary of the registered resources.
+        :param resource: The resource to reserve.
+        :param delta: The number of items to reserve.
+        :param count: A callable which returns the count of the resource.
+        :return: The id of the reservation or None if the quota of the
+                 resource is unlimited.
+        """
+        quotas = self._get_quotas(context, tenant_id, resources,
+                                  [resource.name])
+        limit = quotas[resource.name]
+        if limit < 0:
+            return
+
+        now = timeutils.utcnow()
+        with context.session.begin(subtransactions=True):
+            in_use = self._get_usage(context, tenant_id, resource, count)
+            reservations = context.session.query(Reservation).filter_by(
+                tenant_id=tenant_id, resource=resource.name)
+            # The reservations are also released without the ORM, so the
+            # ones loaded by the session are not synchronized
+            reservations.filter(Reservation.expiration <= now).delete(
+                synchronize_session=False)
+            reserved = reservations.with_entities(
+                sql.func.sum(Reservation.delta)).scalar() or 0
+            if in_use + reserved + delta > limit:
+                raise exceptions.OverQuota(overs=[resource.name])
+
+            expiration = now + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.quota_reservation_expiration)
+            reservation = Reservation(id=uuidutils.generate_uuid(),
+                                      tenant_id=tenant_id,
+                                      resource=resource.name,
+                                      delta=delta,
+                                      expiration=expiration)
+            context.session.add(reservation)
+        reservation_ids = context.session.info.setdefault(_RESERVATIONS, {})
+        reservation_ids[(resource.name, tenant_id)] = reservation.id
+        return reservation.id
+
+    @staticmethod
+    def _delete_reservation(context, reservation_id):
+        reservation_ids = context.session.info.get(_RESERVATIONS, {})
+        for key, value in reservation_ids.items():
+            if value == reservation_id:
+                del reservation_ids[key]
+        with context.session.begin(subtransactions=True):
+            context.session.query(Reservation).filter_by(
+                id=reservation_id).delete(synchronize_session=False)
+
+    def commit_reservation(self, context, reservation_id):
+        """Release a reservation once its resources are created.
+
+        The reservation of tracked resources was already released, and
+        their usage updated, by the transactions creating the items made
+        with the same session. Only the items not created are released
+        here.
+        """
+        self._delete_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Release a reservation whose resources were not created."""
+        self._delete_reservation(context, reservation_id)
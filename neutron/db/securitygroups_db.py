@@ -63,6 +63,10 @@ class SecurityGroupRule(model_base.BASEV2, models_v2.HasId,
                         models_v2.HasTenant):
     """Represents a v2 neutron security group rule."""
 
+    __table_args__ = (sa.Index('ix_securitygrouprules_tenant_id_id',
+                               'tenant_id', 'id'),
+                      model_base.BASEV2.__table_args__)
+
     security_group_id = sa.Column(sa.String(36),
                                   sa.ForeignKey("securitygroups.id",
                                                 ondelete="CASCADE"),
@@ -148,14 +152,12 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
         # GETS. TODO(arosen)  context handling can probably be improved here.
         if not default_sg and context.tenant_id:
             self._ensure_default_security_group(context, context.tenant_id)
-        marker_obj = self._get_marker_obj(context, 'security_group', limit,
-                                          marker)
         return self._get_collection(context,
                                     SecurityGroup,
                                     self._make_security_group_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts,
-                                    limit=limit, marker_obj=marker_obj,
+                                    limit=limit, marker=marker,
                                     page_reverse=page_reverse)
 
     def get_security_groups_count(self, context, filters=None):
@@ -434,14 +436,12 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
     def get_security_group_rules(self, context, filters=None, fields=None,
                                  sorts=None, limit=None, marker=None,
                                  page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'security_group_rule',
-                                          limit, marker)
         return self._get_collection(context,
                                     SecurityGroupRule,
                                     self._make_security_group_rule_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts,
-                                    limit=limit, marker_obj=marker_obj,
+                                    limit=limit, marker=marker,
                                     page_reverse=page_reverse)
 
     def get_security_group_rules_count(self, context, filters=None):
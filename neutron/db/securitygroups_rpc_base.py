@@ -14,6 +14,7 @@
 #    under the License.
 
 import netaddr
+from oslo.config import cfg
 from sqlalchemy.orm import exc
 
 from neutron.common import constants as q_const
@@ -26,6 +27,10 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.import_opt('security_group_info_cache', 'neutron.common.config')
+cfg.CONF.import_opt('api_workers', 'neutron.service')
+cfg.CONF.import_opt('rpc_workers', 'neutron.service')
+
 
 IP_MASK = {q_const.IPv4: 32,
            q_const.IPv6: 128}
@@ -35,6 +40,57 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 
 
+class SecurityGroupInfoCache(object):
+    """Rules and member IPs of the security groups, by group id.
+
+    Used by security_group_info_for_devices when security_group_info_cache
+    is set. The entries are invalidated by SecurityGroupServerRpcMixin when
+    the rules or the members of a group change.
+    """
+
+    def __init__(self):
+        self.rules = {}
+        self.member_ips = {}
+        self._refused = False
+
+    def enabled(self):
+        """Return whether the cache may be used.
+
+        The entries are only invalidated by the changes made in this
+        process, so the cache is refused when the API or the RPC is served
+        by worker processes.
+        """
+        if not cfg.CONF.security_group_info_cache:
+            return False
+        if cfg.CONF.api_workers > 0 or cfg.CONF.rpc_workers > 0:
+            if not self._refused:
+                LOG.error(_("security_group_info_cache ignored because "
+                            "api_workers or rpc_workers is set, the cache "
+                            "of a worker would not see the security group "
+                            "changes made by the other workers"))
+                self._refused = True
+            return False
+        return True
+
+    def invalidate_rules(self, sg_ids=None):
+        """Forget the rules of the groups, or of all the groups."""
+        self._invalidate(self.rules, sg_ids)
+
+    def invalidate_member_ips(self, sg_ids=None):
+        """Forget the member IPs of the groups, or of all the groups."""
+        self._invalidate(self.member_ips, sg_ids)
+
+    def _invalidate(self, entries, sg_ids):
+        if sg_ids is None:
+            entries.clear()
+            return
+        for sg_id in sg_ids:
+            entries.pop(sg_id, None)
+
+
+SG_INFO_CACHE = SecurityGroupInfoCache()
+
+
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def create_security_group_rule(self, context, security_group_rule):
@@ -42,6 +98,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        SG_INFO_CACHE.invalidate_rules(sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -51,6 +108,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        SG_INFO_CACHE.invalidate_rules(sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -58,9 +116,18 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        SG_INFO_CACHE.invalidate_rules([rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
+    def delete_security_group(self, context, id):
+        super(SecurityGroupServerRpcMixin,
+              self).delete_security_group(context, id)
+        # The rules of other groups using the group as remote group are
+        # deleted too
+        SG_INFO_CACHE.invalidate_rules()
+        SG_INFO_CACHE.invalidate_member_ips([id])
+
     def update_security_group_on_port(self, context, id, port,
                                       original_port, updated_port):
         """Update security groups on port.
@@ -83,6 +150,9 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 context,
                 updated_port,
                 port_updates[ext_sg.SECURITYGROUPS])
+            SG_INFO_CACHE.invalidate_member_ips(
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(updated_port[ext_sg.SECURITYGROUPS]))
             need_notify = True
         else:
             updated_port[ext_sg.SECURITYGROUPS] = (
@@ -103,6 +173,11 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
             need_notify = True
+        if need_notify or (original_port.get('allowed_address_pairs') !=
+                           updated_port.get('allowed_address_pairs')):
+            SG_INFO_CACHE.invalidate_member_ips(
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(updated_port.get(ext_sg.SECURITYGROUPS) or []))
         return need_notify
 
     def notify_security_groups_member_updated(self, context, port):
@@ -125,6 +200,8 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                    for fixed_ip in port['fixed_ips']):
                 self.notifier.security_groups_provider_updated(context)
         else:
+            SG_INFO_CACHE.invalidate_member_ips(
+                port.get(ext_sg.SECURITYGROUPS) or [])
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
@@ -143,8 +220,27 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :params devices: list of devices
         :returns: port correspond to the devices with security group rules
         """
-        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(kwargs.get('devices'))
+        return self._security_group_rules_for_ports(context, ports)
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return the security groups of each port and their members.
+
+        Unlike security_group_rules_for_devices, the rules and the member
+        IPs of a security group are returned once for all the ports, and the
+        remote group rules are not converted:
+
+        {'devices': {port id: port, with its provider rules in
+                     security_group_rules},
+         'security_groups': {security group id: [rules]},
+         'sg_member_ips': {remote group id: [member IP addresses]}}
 
+        :params devices: list of devices
+        """
+        ports = self._get_ports_for_devices(kwargs.get('devices'))
+        return self._security_group_info_for_ports(context, ports)
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -153,7 +249,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -170,6 +266,35 @@ class SecurityGroupServerRpcCallbackMixin(object):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _select_sg_ids_for_ports(self, context, ports):
+        if not ports:
+            return []
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+        query = context.session.query(sg_binding_port, sg_binding_sgid)
+        return query.filter(sg_binding_port.in_(ports.keys())).all()
+
+    def _select_rules_for_security_groups(self, context, sg_ids):
+        rules_by_group = dict((sg_id, []) for sg_id in sg_ids)
+        if not sg_ids:
+            return rules_by_group
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(
+            sg_db.SecurityGroupRule.security_group_id.in_(sg_ids))
+        for rule_in_db in query:
+            rules_by_group[rule_in_db['security_group_id']].append(
+                self._make_rule_dict_for_agent(rule_in_db))
+        return rules_by_group
+
+    def _get_cached(self, entries, sg_ids, load):
+        """Return the entries of sg_ids, loading the ones not cached."""
+        if not SG_INFO_CACHE.enabled():
+            return load(sg_ids)
+        missing = [sg_id for sg_id in sg_ids if sg_id not in entries]
+        if missing:
+            entries.update(load(missing))
+        return dict((sg_id, entries[sg_id]) for sg_id in sg_ids)
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
         if not remote_group_ids:
@@ -354,25 +479,52 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_ra_rule(port, ips_ra)
             self._add_ingress_dhcp_rule(port, ips_dhcp)
 
+    def _make_rule_dict_for_agent(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
+
     def _security_group_rules_for_ports(self, context, ports):
         rules_in_db = self._select_rules_for_ports(context, ports)
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            port['security_group_rules'].append(
+                self._make_rule_dict_for_agent(rule_in_db))
         self._apply_provider_rule(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _security_group_info_for_ports(self, context, ports):
+        for port in ports.values():
+            port['security_groups'] = []
+        for port_id, sg_id in self._select_sg_ids_for_ports(context, ports):
+            ports[port_id]['security_groups'].append(sg_id)
+        sg_ids = set(sg_id for port in ports.values()
+                     for sg_id in port['security_groups'])
+        security_groups = self._get_cached(
+            SG_INFO_CACHE.rules, sg_ids,
+            lambda ids: self._select_rules_for_security_groups(
+                context, list(ids)))
+        remote_group_ids = set(rule['remote_group_id']
+                               for rules in security_groups.values()
+                               for rule in rules
+                               if rule.get('remote_group_id'))
+        member_ips = self._get_cached(
+            SG_INFO_CACHE.member_ips, remote_group_ids,
+            lambda ids: self._select_ips_for_remote_group(context, list(ids)))
+        self._apply_provider_rule(context, ports)
+        return {'devices': ports,
+                'security_groups': security_groups,
+                'sg_member_ips': member_ips}
@@ -24,7 +24,7 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 
 
-def paginate_query(query, model, limit, sorts, marker_obj=None):
+def paginate_query(query, model, limit, sorts, marker_obj=None, marker=None):
     """Returns a query with sorting / pagination criteria added.
 
     Pagination works by requiring a unique sort key, specified by sorts.
@@ -41,16 +41,21 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
     We also have to cope with different sort directions.
 
     Typically, the id of the last row is used as the client-facing pagination
-    marker, then the actual marker object must be fetched from the db and
-    passed in to us as marker.
+    marker. It can be passed in as marker, only the sort key columns of the
+    marker row are then read, or the actual marker object can be fetched from
+    the db and passed in to us as marker_obj. The first sort key is also
+    bounded on its own, so that the database seeks the page in an index
+    starting with it.
 
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
     :param limit: maximum number of items to return
     :param sorts: array of attributes and direction by which results should
                  be sorted
-    :param marker: the last item of the previous page; we returns the next
-                    results after this value.
+    :param marker_obj: the last item of the previous page; we returns the
+                       next results after this value.
+    :param marker: the id of the last item of the previous page, used
+                   instead of marker_obj.
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
     """
@@ -83,7 +88,11 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
     # Add pagination
     if marker_obj:
         marker_values = [getattr(marker_obj, sort[0]) for sort in sorts]
-
+    elif marker and limit:
+        marker_values = _get_marker_values(query, model, sorts, marker)
+    else:
+        marker_values = None
+    if marker_values:
         # Build up an array of sort criteria as in the docstring
         criteria_list = []
         for i, sort in enumerate(sorts):
@@ -99,9 +108,33 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
             criteria_list.append(criteria)
 
         f = sqlalchemy.sql.or_(*criteria_list)
+        # Redundant with the criteria of several sort keys, but lets the
+        # database seek the first row of the page in an index instead of
+        # scanning the ones before
+        first_attr = getattr(model, sorts[0][0])
+        if len(sorts) > 1 and marker_values[0] is not None:
+            if sorts[0][1]:
+                f = sqlalchemy.sql.and_(first_attr >= marker_values[0], f)
+            else:
+                f = sqlalchemy.sql.and_(first_attr <= marker_values[0], f)
         query = query.filter(f)
 
     if limit:
         query = query.limit(limit)
 
     return query
+
+
+def _get_marker_values(query, model, sorts, marker):
+    """Return the values of the sort keys of the row whose id is marker.
+
+    Only the sort key columns are read. The marker row is looked up with the
+    filters of query, e.g. it must belong to the tenant of a non admin
+    request.
+    """
+    keys = [sort_key for sort_key, _sort_direction in sorts]
+    row = (query.with_entities(*[getattr(model, key) for key in keys]).
+           filter(model.id == marker).order_by(None).first())
+    if row is None:
+        raise n_exc.MarkerNotFound(marker=marker)
+    return list(row)
@@ -0,0 +1,78 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+
+import six
+
+from neutron.db import models_v2
+
+
+@six.add_metaclass(abc.ABCMeta)
+class IpamDriver(object):
+    """Manages the free addresses of the subnets for NeutronDbPluginV2.
+
+    The IPAllocation rows are the authoritative record of the addresses in
+    use. A driver keeps track of which addresses are still free, and must
+    never hand out an address that has an IPAllocation row. All the methods
+    run inside the plugin transaction.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    @abc.abstractmethod
+    def generate_ip(self, context, subnets):
+        """Pick a free address from one of the subnets.
+
+        :returns: a dict with the 'ip_address' and 'subnet_id' keys
+        :raises: IpAddressGenerationFailure if all the subnets are full
+        """
+        pass
+
+    @abc.abstractmethod
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Mark an address requested by the user as no longer free."""
+        pass
+
+    @abc.abstractmethod
+    def release_ip(self, context, network_id, subnet_id, ip_address):
+        """Delete the IPAllocation of an address and mark it free."""
+        pass
+
+    def store_ip_allocation(self, context, network_id, subnet_id, port_id,
+                            ip_address):
+        """Record that an address is allocated to a port."""
+        context.session.add(models_v2.IPAllocation(
+            network_id=network_id, port_id=port_id, ip_address=ip_address,
+            subnet_id=subnet_id))
+
+
+class AvailabilityRangeIpamDriver(IpamDriver):
+    """Tracks the free addresses in the IPAvailabilityRange table.
+
+    The first range row of the subnet is locked by every allocation.
+    Released addresses are only reused once the ranges are exhausted and
+    rebuilt from the IPAllocation table.
+    """
+
+    def generate_ip(self, context, subnets):
+        return self.plugin._generate_ip(context, subnets)
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        self.plugin._allocate_specific_ip(context, subnet_id, ip_address)
+
+    def release_ip(self, context, network_id, subnet_id, ip_address):
+        self.plugin._delete_ip_allocation(context, network_id, subnet_id,
+                                          ip_address)
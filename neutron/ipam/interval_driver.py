@@ -0,0 +1,278 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import random
+import weakref
+
+import netaddr
+from oslo.config import cfg
+from oslo.db import exception as db_exc
+from sqlalchemy import event
+from sqlalchemy import orm
+
+from neutron.common import exceptions as n_exc
+from neutron.db import models_v2
+from neutron.ipam import driver
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class IpRangeSet(object):
+    """Set of integer addresses stored as sorted, disjoint ranges.
+
+    A pool with a few scattered allocations takes a few ranges whatever its
+    size, and lookups are binary searches.
+    """
+
+    def __init__(self):
+        self._firsts = []
+        self._lasts = []
+        self.size = 0
+
+    @classmethod
+    def from_pools(cls, pools, allocated):
+        """Build the set of the pool addresses that are not allocated.
+
+        :param pools: (first, last) integer ranges, not overlapping
+        :param allocated: integer addresses
+        """
+        free = cls()
+        allocated = sorted(allocated)
+        for first, last in sorted(pools):
+            index = bisect.bisect_left(allocated, first)
+            while index < len(allocated) and allocated[index] <= last:
+                ip = allocated[index]
+                if ip > first:
+                    free._append(first, ip - 1)
+                first = max(first, ip + 1)
+                index += 1
+            if first <= last:
+                free._append(first, last)
+        return free
+
+    def _append(self, first, last):
+        self._firsts.append(first)
+        self._lasts.append(last)
+        self.size += last - first + 1
+
+    def _find(self, ip):
+        index = bisect.bisect_right(self._firsts, ip) - 1
+        if index >= 0 and ip <= self._lasts[index]:
+            return index
+
+    def __contains__(self, ip):
+        return self._find(ip) is not None
+
+    def ranges(self):
+        return zip(self._firsts, self._lasts)
+
+    def discard(self, ip):
+        """Remove an address, returning whether it was in the set."""
+        index = self._find(ip)
+        if index is None:
+            return False
+        first, last = self._firsts[index], self._lasts[index]
+        if first == last:
+            del self._firsts[index]
+            del self._lasts[index]
+        elif ip == first:
+            self._firsts[index] = ip + 1
+        elif ip == last:
+            self._lasts[index] = ip - 1
+        else:
+            self._lasts[index] = ip - 1
+            self._firsts.insert(index + 1, ip + 1)
+            self._lasts.insert(index + 1, last)
+        self.size -= 1
+        return True
+
+    def pop(self):
+        """Remove and return the lowest address, None if the set is empty."""
+        if not self._firsts:
+            return None
+        ip = self._firsts[0]
+        self.discard(ip)
+        return ip
+
+    def pop_random(self):
+        """Remove and return a random address, None if the set is empty."""
+        if not self.size:
+            return None
+        offset = random.randrange(self.size)
+        for first, last in self.ranges():
+            if offset <= last - first:
+                break
+            offset -= last - first + 1
+        ip = first + offset
+        self.discard(ip)
+        return ip
+
+
+_drivers = weakref.WeakSet()
+
+
+@event.listens_for(models_v2.Subnet, 'after_delete')
+def _evict_subnet(mapper, connection, subnet):
+    for ipam_driver in _drivers:
+        ipam_driver._subnets.pop(subnet.id, None)
+
+
+@event.listens_for(orm.Session, 'after_bulk_delete')
+def _evict_deleted_subnets(delete_context):
+    if delete_context.primary_table is models_v2.Subnet.__table__:
+        for ipam_driver in _drivers:
+            ipam_driver._evict_deleted(delete_context.session)
+
+
+class IntervalIpamDriver(driver.IpamDriver):
+    """Keeps the free addresses of each subnet in memory.
+
+    The free addresses of a subnet are loaded from the IPAllocationPool and
+    IPAllocation tables when the subnet is first used, so allocating does
+    not lock any row. The lowest free address is reserved by inserting its
+    IPAllocation row in a savepoint. Other server processes allocate from
+    their own copy, so when the primary key rejects the row the driver
+    tries the next address. Released addresses are found again when the
+    subnet looks exhausted and is reloaded.
+
+    The IPAvailabilityRange rows are not maintained, so they are stale for
+    AvailabilityRangeIpamDriver once this driver allocated from a subnet.
+    """
+
+    def __init__(self, plugin):
+        super(IntervalIpamDriver, self).__init__(plugin)
+        # subnet id -> (allocation pools, IpRangeSet of the free addresses)
+        self._subnets = {}
+        _drivers.add(self)
+
+    def _get_pools(self, context, subnet_id):
+        pool_qry = context.session.query(models_v2.IPAllocationPool.first_ip,
+                                         models_v2.IPAllocationPool.last_ip)
+        return sorted((int(netaddr.IPAddress(first_ip)),
+                       int(netaddr.IPAddress(last_ip)))
+                      for first_ip, last_ip in
+                      pool_qry.filter_by(subnet_id=subnet_id))
+
+    def _evict_deleted(self, session):
+        """Forget the subnets which are no longer in the database."""
+        if not self._subnets:
+            return
+        subnet_qry = session.query(models_v2.Subnet.id)
+        existing = set(subnet_id for (subnet_id,) in subnet_qry.filter(
+            models_v2.Subnet.id.in_(list(self._subnets))))
+        for subnet_id in set(self._subnets) - existing:
+            del self._subnets[subnet_id]
+
+    def _load_subnet(self, context, subnet_id, pools):
+        LOG.debug(_("Loading the free addresses of subnet %s"), subnet_id)
+        # The subnets deleted by other server processes are only noticed
+        # here.
+        self._evict_deleted(context.session)
+        ip_qry = context.session.query(models_v2.IPAllocation.ip_address)
+        allocated = [int(netaddr.IPAddress(ip_address)) for (ip_address,) in
+                     ip_qry.filter_by(subnet_id=subnet_id)]
+        free = IpRangeSet.from_pools(pools, allocated)
+        self._subnets[subnet_id] = (pools, free)
+        return free
+
+    def _get_free(self, context, subnet_id, reload=False):
+        pools = self._get_pools(context, subnet_id)
+        cached = self._subnets.get(subnet_id)
+        if reload or not cached or cached[0] != pools:
+            return self._load_subnet(context, subnet_id, pools)
+        return cached[1]
+
+    def _pop_free(self, free):
+        return free.pop()
+
+    def _pick_ip(self, context, subnet, reload):
+        free = self._get_free(context, subnet['id'], reload)
+        for attempt in range(cfg.CONF.ip_allocation_retries):
+            ip = self._pop_free(free)
+            if ip is None:
+                break
+            ip_address = str(netaddr.IPAddress(ip))
+            try:
+                with context.session.begin_nested():
+                    context.session.add(models_v2.IPAllocation(
+                        network_id=subnet['network_id'],
+                        subnet_id=subnet['id'],
+                        ip_address=ip_address))
+            except db_exc.DBDuplicateEntry:
+                # Allocated by another server process since the subnet was
+                # loaded
+                LOG.debug(_("IP %(ip_address)s on subnet %(subnet_id)s "
+                            "already allocated, retrying"),
+                          {'ip_address': ip_address,
+                           'subnet_id': subnet['id']})
+                continue
+            LOG.debug(_("Allocated IP %(ip_address)s on subnet "
+                        "%(subnet_id)s"),
+                      {'ip_address': ip_address,
+                       'subnet_id': subnet['id']})
+            return ip_address
+        else:
+            LOG.debug(_("No free IP found on subnet %(subnet_id)s after "
+                        "%(attempts)s attempts"),
+                      {'subnet_id': subnet['id'],
+                       'attempts': cfg.CONF.ip_allocation_retries})
+            return
+        LOG.debug(_("All IPs from subnet %(subnet_id)s (%(cidr)s) allocated"),
+                  {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+
+    def generate_ip(self, context, subnets):
+        for reload in (False, True):
+            for subnet in subnets:
+                ip_address = self._pick_ip(context, subnet, reload)
+                if ip_address:
+                    return {'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
+        raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        cached = self._subnets.get(subnet_id)
+        if cached:
+            cached[1].discard(int(netaddr.IPAddress(ip_address)))
+
+    def release_ip(self, context, network_id, subnet_id, ip_address):
+        # Like with the availability ranges, released addresses are only
+        # reused once the subnet is exhausted and reloaded, so that they
+        # are not handed out again right away.
+        self.plugin._delete_ip_allocation(context, network_id, subnet_id,
+                                          ip_address)
+
+    def store_ip_allocation(self, context, network_id, subnet_id, port_id,
+                            ip_address):
+        allocation = context.session.query(models_v2.IPAllocation).get(
+            (ip_address, subnet_id, network_id))
+        if allocation is not None and allocation.port_id is None:
+            # Reserved by _pick_ip
+            allocation.port_id = port_id
+            return
+        super(IntervalIpamDriver, self).store_ip_allocation(
+            context, network_id, subnet_id, port_id, ip_address)
+
+
+class OptimisticIpamDriver(IntervalIpamDriver):
+    """Reserves a random free address instead of the lowest one.
+
+    Concurrent requests from different server processes pick different
+    addresses with high probability, so they rarely wait for each other on
+    the IPAllocation primary key or have to try another address.
+    """
+
+    def _pop_free(self, free):
+        return free.pop_random()
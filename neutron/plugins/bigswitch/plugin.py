@@ -117,7 +117,10 @@ class RestProxyCallbacks(n_rpc.RpcCallback,
                          sg_rpc_base.SecurityGroupServerRpcCallbackMixin,
                          dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.1 Support Security Group RPC
+    #   1.2 Support security_group_info_for_devices
+    RPC_API_VERSION = '1.2'
 
     def get_port_from_device(self, device):
         port_id = re.sub(r"^tap", "", device)
@@ -64,8 +64,10 @@ class N1kvRpcCallbacks(n_rpc.RpcCallback,
 
     """Class to handle agent RPC calls."""
 
-    # Set RPC API version to 1.1 by default.
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.1 Support the 1.1 DHCP and L3 agent RPC
+    #   1.2 Support get_active_networks_changes
+    RPC_API_VERSION = '1.2'
 
 
 class N1kvNeutronPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
@@ -781,7 +781,9 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
         # stores received port_updates for processing by the main loop
         self.updated_devices = set()
         self.setup_rpc(interface_mappings.values())
-        self.init_firewall()
+        # Security group updates are applied by the next daemon_loop
+        # iteration, together with the device changes
+        self.init_firewall(defer_refresh_firewall=True)
 
     def _report_state(self):
         try:
@@ -842,10 +844,8 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
         resync_a = False
         resync_b = False
 
-        self.prepare_devices_filter(device_info.get('added'))
-
-        if device_info.get('updated'):
-            self.refresh_firewall()
+        self.setup_port_filters(device_info.get('added', set()),
+                                device_info.get('updated', set()))
 
         # Updated devices are processed the same as new ones, as their
         # admin_state_up may have changed. The set union prevents duplicating
@@ -994,7 +994,8 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                 LOG.info(_("Agent out of sync with plugin!"))
                 sync = False
 
-            if self._device_info_has_changes(device_info):
+            if (self._device_info_has_changes(device_info) or
+                    self.firewall_refresh_needed()):
                 LOG.debug(_("Agent loop found changes! %s"), device_info)
                 try:
                     sync = self.process_network_devices(device_info)
@@ -176,7 +176,11 @@ def _check_resource_exists(func, id, name, raise_exc=False):
 
 class MidoRpcCallbacks(n_rpc.RpcCallback,
                        dhcp_rpc_base.DhcpRpcCallbackMixin):
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.1 Support get_active_networks_info, create_dhcp_port and
+    #       update_dhcp_port
+    #   1.2 Support get_active_networks_changes
+    RPC_API_VERSION = '1.2'
 
 
 class MidonetPluginException(n_exc.NeutronException):
@@ -60,6 +60,10 @@ class DeviceListRetrievalError(exceptions.NeutronException):
                 "because of error: %(error)s")
 
 
+class FlowsApplyError(exceptions.NeutronException):
+    message = _("Unable to apply the flows of devices: %(devices)s")
+
+
 # A class to represent a VIF (i.e., a port that has 'iface-id' and 'vif-mac'
 # attributes set).
 class LocalVLANMapping:
@@ -140,7 +144,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                  ovsdb_monitor_respawn_interval=(
                      constants.DEFAULT_OVSDBMON_RESPAWN),
                  arp_responder=False,
-                 use_veth_interconnection=False):
+                 use_veth_interconnection=False,
+                 use_ofctl_bundle=False):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -163,9 +168,12 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                supported.
         :param use_veth_interconnection: use veths instead of patch ports to
                interconnect the integration bridge to physical bridges.
+        :param use_ofctl_bundle: Optional, apply the flows queued during a
+               loop iteration with one atomic ovs-ofctl call per bridge.
         '''
         super(OVSNeutronAgent, self).__init__()
         self.use_veth_interconnection = use_veth_interconnection
+        self.use_ofctl_bundle = use_ofctl_bundle
         self.veth_mtu = veth_mtu
         self.root_helper = root_helper
         self.available_local_vlans = set(moves.xrange(q_const.MIN_VLAN_TAG,
@@ -247,6 +255,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                               root_helper)
         # Initialize iteration counter
         self.iter_num = 0
+        self.flows_deferred = False
         self.run_daemon_loop = True
 
     def _report_state(self):
@@ -1078,6 +1087,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
 
     def treat_devices_added_or_updated(self, devices, ovs_restarted):
         skipped_devices = []
+        devices_up = []
+        devices_down = []
         try:
             devices_details_list = self.plugin_rpc.get_devices_details_list(
                 self.context,
@@ -1109,24 +1120,35 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                     details['fixed_ips'],
                                     details['device_owner'],
                                     ovs_restarted)
-                # update plugin about port status
-                # FIXME(salv-orlando): Failures while updating device status
-                # must be handled appropriately. Otherwise this might prevent
-                # neutron server from sending network-vif-* events to the nova
-                # API server, thus possibly preventing instance spawn.
                 if details.get('admin_state_up'):
-                    LOG.debug(_("Setting status for %s to UP"), device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
-                    LOG.debug(_("Setting status for %s to DOWN"), device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
-                LOG.info(_("Configuration for device %s completed."), device)
+                    devices_down.append(device)
             else:
                 LOG.warn(_("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+
+        # The devices are only reported up once their flows are programmed,
+        # not at the end of the rpc_loop iteration.
+        if not self.flush_deferred_flows():
+            raise FlowsApplyError(devices=devices_up + devices_down)
+
+        # update plugin about port status
+        # FIXME(salv-orlando): Failures while updating device status
+        # must be handled appropriately. Otherwise this might prevent
+        # neutron server from sending network-vif-* events to the nova
+        # API server, thus possibly preventing instance spawn.
+        for device in devices_up:
+            LOG.debug(_("Setting status for %s to UP"), device)
+            self.plugin_rpc.update_device_up(
+                self.context, device, self.agent_id, cfg.CONF.host)
+            LOG.info(_("Configuration for device %s completed."), device)
+        for device in devices_down:
+            LOG.debug(_("Setting status for %s to DOWN"), device)
+            self.plugin_rpc.update_device_down(
+                self.context, device, self.agent_id, cfg.CONF.host)
+            LOG.info(_("Configuration for device %s completed."), device)
         return skipped_devices
 
     def treat_ancillary_devices_added(self, devices):
@@ -1233,6 +1255,12 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                 "failure while retrieving port details "
                                 "from server"), self.iter_num)
                 resync_a = True
+            except FlowsApplyError:
+                # The devices were not reported up, wire them again.
+                LOG.exception(_("process_network_ports - iteration:%d - "
+                                "failure while applying the flows"),
+                              self.iter_num)
+                resync_a = True
         if 'removed' in port_info:
             start = time.time()
             resync_b = self.treat_devices_removed(port_info['removed'])
@@ -1323,6 +1351,39 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 port_info.get('removed') or
                 port_info.get('updated'))
 
+    def _flow_bridges(self):
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        return bridges
+
+    def defer_apply_on(self):
+        '''Queue the flow mods of the agent bridges.
+
+        Port binding, tunnel setup and FDB updates received meanwhile all
+        add up so that each bridge is programmed once by defer_apply_off.
+        '''
+        for br in self._flow_bridges():
+            br.defer_apply_on(use_bundle=self.use_ofctl_bundle)
+        self.flows_deferred = True
+
+    def defer_apply_off(self):
+        '''Apply the queued flow mods, return False if some failed.'''
+        self.flows_deferred = False
+        applied = True
+        for br in self._flow_bridges():
+            if not br.defer_apply_off():
+                applied = False
+        return applied
+
+    def flush_deferred_flows(self):
+        '''Apply the flow mods queued so far and keep deferring the next.'''
+        if not self.flows_deferred:
+            return True
+        applied = self.defer_apply_off()
+        self.defer_apply_on()
+        return applied
+
     def check_ovs_restart(self):
         # Check for the canary flow
         canary_flow = self.int_br.dump_flows_for_table(constants.CANARY_TABLE)
@@ -1365,6 +1426,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                                     self.patch_int_ofport,
                                                     self.patch_tun_ofport)
                 self.dvr_agent.setup_dvr_flows_on_integ_tun_br()
+            self.defer_apply_on()
             # Notify the plugin of tunnel IP
             if self.enable_tunneling and tunnel_sync:
                 LOG.info(_("Agent tunnel out of sync with plugin!"))
@@ -1444,6 +1506,11 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                     # Put the ports back in self.updated_port
                     self.updated_ports |= updated_ports_copy
                     sync = True
+            if not self.defer_apply_off():
+                LOG.error(_("Agent rpc_loop - iteration:%d - failed "
+                            "applying the flows, scheduling a resync"),
+                          self.iter_num)
+                sync = True
 
             # sleep till end of polling interval
             elapsed = (time.time() - start)
@@ -1500,6 +1567,7 @@ def create_agent_config_map(config):
         l2_population=config.AGENT.l2_population,
         arp_responder=config.AGENT.arp_responder,
         use_veth_interconnection=config.OVS.use_veth_interconnection,
+        use_ofctl_bundle=config.AGENT.use_ofctl_bundle,
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
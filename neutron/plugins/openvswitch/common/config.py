@@ -88,6 +88,11 @@ agent_opts = [
                        "outgoing IP packet carrying GRE/VXLAN tunnel")),
     cfg.BoolOpt('enable_distributed_routing', default=False,
                 help=_("Make the l2 agent run in DVR mode ")),
+    cfg.BoolOpt('use_ofctl_bundle', default=False,
+                help=_("Apply the flows of each bridge changed during an "
+                       "agent loop iteration atomically with a single "
+                       "ovs-ofctl call. Requires Open vSwitch 2.4 or "
+                       "newer")),
 ]
 
 
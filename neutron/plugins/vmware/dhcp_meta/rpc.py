@@ -43,7 +43,11 @@ METADATA_DHCP_ROUTE = '169.254.169.254/32'
 class NSXRpcCallbacks(n_rpc.RpcCallback,
                       dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.1 Support get_active_networks_info, create_dhcp_port and
+    #       update_dhcp_port
+    #   1.2 Support get_active_networks_changes
+    RPC_API_VERSION = '1.2'
 
 
 def handle_network_dhcp_access(plugin, context, network, action):
@@ -349,6 +349,81 @@ def check(context, action, target, plugin=None, might_not_exist=False):
     return policy.check(*(_prepare_check(context, action, target)))
 
 
+def _compile_rule(rule, creds):
+    """Evaluate the checks of a rule which depend only on the credentials.
+
+    :returns: True or False if the result of the rule does not depend on the
+        target, e.g. for an admin, else a function of the target returning
+        whether the rule matches it.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return True
+    elif isinstance(rule, policy.FalseCheck):
+        return False
+    elif isinstance(rule, policy.RoleCheck):
+        return bool(rule(None, creds))
+    elif isinstance(rule, policy.RuleCheck):
+        try:
+            return _compile_rule(policy._rules[rule.match], creds)
+        except KeyError:
+            return False
+    elif isinstance(rule, policy.NotCheck):
+        matches = _compile_rule(rule.rule, creds)
+        if isinstance(matches, bool):
+            return not matches
+        return lambda target: not matches(target)
+    elif isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        # An and with a False or an or with a True is constant
+        constant = isinstance(rule, policy.OrCheck)
+        functions = []
+        for sub_rule in rule.rules:
+            matches = _compile_rule(sub_rule, creds)
+            if matches is constant:
+                return constant
+            elif not isinstance(matches, bool):
+                functions.append(matches)
+        if not functions:
+            return not constant
+        elif len(functions) == 1:
+            return functions[0]
+        elif constant:
+            return lambda target: any(f(target) for f in functions)
+        return lambda target: all(f(target) for f in functions)
+    elif isinstance(rule, OwnerCheck):
+        if rule.kind not in creds:
+            return False
+        owner = unicode(creds[rule.kind])
+
+        def check_owner(target):
+            if rule.target_field in target:
+                return rule.match % target == owner
+            # The owner of the parent resource is fetched
+            return rule(target, creds)
+        return check_owner
+    return lambda target: rule(target, creds)
+
+
+def filter_authorized(context, action, targets):
+    """Return the targets on which the action is valid in this context.
+
+    This is equivalent to calling check() on each target, but the
+    credentials are computed once. For the actions reading a resource, the
+    rule is also compiled once against them, so that only the checks
+    depending on the target, usually the ownership checks, are evaluated
+    for each target.
+    """
+    credentials = context.to_dict()
+    resource, is_write = get_resource_and_action(action)
+    if is_write:
+        return [target for target in targets
+                if policy.check(_build_match_rule(action, target), target,
+                                credentials)]
+    matches = _compile_rule(_build_match_rule(action, {}), credentials)
+    if isinstance(matches, bool):
+        return list(targets) if matches else []
+    return [target for target in targets if matches(target)]
+
+
 def enforce(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
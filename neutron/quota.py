@@ -20,6 +20,7 @@ from oslo.config import cfg
 import webob
 
 from neutron.common import exceptions
+from neutron.db import models_v2
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 
@@ -52,6 +53,20 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.BoolOpt('track_quota_usage',
+                default=True,
+                help=_('Keep the usages of the tracked resources in the '
+                       'database instead of counting them on every create. '
+                       'Only used by the database quota driver.')),
+    cfg.IntOpt('quota_usage_resync_interval',
+               default=3600,
+               help=_('Number of seconds after which a tracked usage is '
+                      'counted again to correct any drift. A negative '
+                      'value means never.')),
+    cfg.IntOpt('quota_reservation_expiration',
+               default=120,
+               help=_('Number of seconds a quota reservation holds the '
+                      'resources of a create in progress.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -205,6 +220,30 @@ class CountableResource(BaseResource):
         self.count = count
 
 
+class TrackedResource(CountableResource):
+    """Describe a resource whose usage is tracked in the database."""
+
+    def __init__(self, name, model_class, flag=None):
+        """Initializes a TrackedResource.
+
+        The usage of a tracked resource is updated in the transaction
+        creating or deleting an instance of its model class, so that the
+        quota driver does not have to count the resources on each create.
+        The count function is still used to initialize and resynchronize
+        the usage.
+
+        :param name: The name of the resource, i.e., "network".
+        :param model_class: The model class of the resource.
+        :param flag: The name of the flag or configuration option
+                     which specifies the default value of the quota
+                     for this resource.
+        """
+
+        super(TrackedResource, self).__init__(name, _count_resource,
+                                              flag=flag)
+        self.model_class = model_class
+
+
 class QuotaEngine(object):
     """Represent the set of recognized quotas."""
 
@@ -212,6 +251,7 @@ class QuotaEngine(object):
         """Initialize a Quota object."""
 
         self._resources = {}
+        self._tracked_resources = {}
         self._driver = None
         self._driver_class = quota_driver_class
 
@@ -240,6 +280,9 @@ class QuotaEngine(object):
             LOG.warn(_('%s is already registered.'), resource.name)
             return
         self._resources[resource.name] = resource
+        if isinstance(resource, TrackedResource):
+            table_name = resource.model_class.__tablename__
+            self._tracked_resources[table_name] = resource
 
     def register_resource_by_name(self, resourcename):
         """Register a resource by name."""
@@ -297,6 +340,60 @@ class QuotaEngine(object):
         return self.get_driver().limit_check(context, tenant_id,
                                              self._resources, values)
 
+    def make_reservation(self, context, tenant_id, resource, delta,
+                         plugin, collection):
+        """Reserve delta more items of a resource for a tenant.
+
+        The reservation holds the items until they are created, so that
+        the concurrent creates of the tenant see them. It must then be
+        committed or cancelled.
+
+        This method will raise a QuotaResourceUnknown exception if the
+        resource is unknown, and an OverQuota exception if the tenant
+        does not have enough quota left.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve the resources for.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of items to create.
+        :param plugin: The plugin used to count the resource.
+        :param collection: The collection name of the resource.
+        :return: The id of the reservation or None if the driver does
+                 not make reservations or the resource is not tracked.
+        """
+
+        res = self._resources.get(resource)
+        if not res:
+            raise exceptions.QuotaResourceUnknown(unknown=[resource])
+
+        def count():
+            return res.count(context, plugin, collection, tenant_id)
+
+        driver = self.get_driver()
+        # The items created by an admin without a tenant, and the resources
+        # whose creates don't release their reservation, are only counted
+        if (cfg.CONF.QUOTAS.track_quota_usage and tenant_id is not None and
+                isinstance(res, TrackedResource) and
+                hasattr(driver, 'make_reservation')):
+            return driver.make_reservation(context, tenant_id,
+                                           self._resources, res, delta,
+                                           count)
+        self.limit_check(context, tenant_id, **{resource: count() + delta})
+
+    def commit_reservation(self, context, reservation_id):
+        """Release a reservation once its resources are created."""
+        if reservation_id is not None:
+            self.get_driver().commit_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Release a reservation whose resources were not created."""
+        if reservation_id is not None:
+            self.get_driver().cancel_reservation(context, reservation_id)
+
+    def get_tracked_resource(self, table_name):
+        """Return the tracked resource stored in a table, if any."""
+        return self._tracked_resources.get(table_name)
+
     @property
     def resources(self):
         return self._resources
@@ -321,11 +418,24 @@ def _count_resource(context, plugin, resources, tenant_id):
         return len(obj_list) if obj_list else 0
 
 
+TRACKED_MODELS = {
+    'network': models_v2.Network,
+    'subnet': models_v2.Subnet,
+    'port': models_v2.Port,
+}
+
+
 def register_resources_from_config():
     resources = []
     for resource_item in cfg.CONF.QUOTAS.quota_items:
-        resources.append(CountableResource(resource_item, _count_resource,
-                                           'quota_' + resource_item))
+        model_class = TRACKED_MODELS.get(resource_item)
+        if model_class:
+            resources.append(TrackedResource(resource_item, model_class,
+                                             'quota_' + resource_item))
+        else:
+            resources.append(CountableResource(resource_item,
+                                               _count_resource,
+                                               'quota_' + resource_item))
     QUOTAS.register_resources(resources)
 
 
@@ -11,6 +11,8 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+from oslo.config import cfg
+from sqlalchemy import func
 from sqlalchemy.orm import exc
 from sqlalchemy import sql
 
@@ -18,6 +20,7 @@ from neutron.common import constants
 from neutron.db import agents_db
 from neutron.db import dr_agentschedulers_db as dr_as_db
 from neutron.db import dr_db
+from neutron.db import models_v2
 
 from neutron.openstack.common import log as logging
 
@@ -25,6 +28,40 @@ LOG = logging.getLogger(__name__)
 
 
 class DynamicRoutingScheduler(object):
+    """Schedule routing peers and instances to the agents asking for them.
+
+    Nothing is scheduled until a DR agent synchronizes, and then every
+    routing peer and the first routing instance not hosted yet go to it.
+    """
+
+    def schedule_routingpeer(self, context, routingpeer_id):
+        """Schedule a new routing peer.
+
+        :returns: the agent the routing peer is bound to, if any.
+        """
+        return None
+
+    def schedule_routinginstance(self, context, routinginstance_id):
+        """Schedule a new routing instance.
+
+        :returns: the agent the routing instance is bound to, if any.
+        """
+        return None
+
+    def rebalance(self, context):
+        """Move bindings off dead or overloaded DR agents.
+
+        :returns: a list of dictionaries of the moved bindings like below:
+            [
+              {
+               'resource': 'routingpeer',
+               'id': '9539ea6c-c773-49b7-957b-70c47d947ff4',
+               'from_agent_id': '2ec4a6f8-cbd8-4c0b-9b1e-6a5b0e7c27d1',
+               'to_agent_id': 'b1f7a4c6-2b4a-4e59-9a67-0d5c6e1f3a92'
+              },
+            ]
+        """
+        return []
 
     def auto_schedule_routingpeers(self, context, host):
         """Schedule non-hosted routing peers to a DR agent.
@@ -117,7 +154,7 @@ class DynamicRoutingScheduler(object):
         with context.session.begin(subtransactions=True):
             query = context.session.query(
                 dr_as_db.RoutingInstanceAgentBinding)
-            query.filter(
+            query = query.filter(
                 dr_as_db.RoutingInstanceAgentBinding.agent_id == agent_id)
             try:
                 query.one()
@@ -135,3 +172,181 @@ class DynamicRoutingScheduler(object):
                         'to DR agent %(agent_id)s'),
                       {'routinginstance_id': routinginstance_id,
                        'agent_id': agent_id})
+
+
+class LeastLoadedDynamicRoutingScheduler(DynamicRoutingScheduler):
+    """Bind routing peers and instances to the least loaded DR agents.
+
+    The load of an agent is the number of routing peers it hosts plus, for
+    its routing instance, one plus the number of advertised prefixes.
+    """
+
+    def schedule_routingpeer(self, context, routingpeer_id):
+        with context.session.begin(subtransactions=True):
+            load = self._get_agents_load(context,
+                                         self._get_active_agents(context))
+            if not load:
+                LOG.debug(_('No active DR agent to schedule routing peer '
+                            '%s'), routingpeer_id)
+                return None
+            agent = min(load, key=lambda agent: load[agent])
+            self._bind_peer(context, routingpeer_id, agent.id)
+            return agent
+
+    def schedule_routinginstance(self, context, routinginstance_id):
+        with context.session.begin(subtransactions=True):
+            agents = self._get_active_agents(context)
+            hosting_ids = self._get_agent_ids_hosting_instances(context)
+            load = self._get_agents_load(
+                context,
+                [agent for agent in agents if agent.id not in hosting_ids])
+            if not load:
+                LOG.debug(_('No free DR agent to schedule routing instance '
+                            '%s'), routinginstance_id)
+                return None
+            agent = min(load, key=lambda agent: load[agent])
+            self._bind_instance(context, routinginstance_id, agent.id)
+            return agent
+
+    def rebalance(self, context):
+        moves = []
+        with context.session.begin(subtransactions=True):
+            agents = self._get_active_agents(context)
+            if not agents:
+                return moves
+            load = dict((agent.id, count) for agent, count in
+                        self._get_agents_load(context, agents).items())
+            prefixes = self._get_prefix_count_by_instance(context)
+
+            def move(resource, binding, agent_id, weight=1):
+                moves.append({'resource': resource,
+                              'id': getattr(binding, resource + '_id'),
+                              'from_agent_id': binding.agent_id,
+                              'to_agent_id': agent_id})
+                if binding.agent_id in load:
+                    load[binding.agent_id] -= weight
+                load[agent_id] += weight
+                binding.agent_id = agent_id
+
+            peer_agents = self._get_routingpeer_agent_ids(context)
+            for binding in self._get_orphan_bindings(
+                    context, dr_as_db.RoutingPeerAgentBinding, load):
+                candidates = [agent_id for agent_id in load
+                              if agent_id not in
+                              peer_agents[binding.routingpeer_id]]
+                if candidates:
+                    agent_id = min(candidates, key=load.get)
+                    peer_agents[binding.routingpeer_id].add(agent_id)
+                    move('routingpeer', binding, agent_id)
+
+            hosting_ids = self._get_agent_ids_hosting_instances(context)
+            for binding in self._get_orphan_bindings(
+                    context, dr_as_db.RoutingInstanceAgentBinding, load):
+                candidates = [agent_id for agent_id in load
+                              if agent_id not in hosting_ids]
+                if candidates:
+                    agent_id = min(candidates, key=load.get)
+                    hosting_ids.add(agent_id)
+                    move('routinginstance', binding, agent_id,
+                         1 + prefixes.get(binding.routinginstance_id, 0))
+
+            # Routing instances can not be split, so evening out the load
+            # is done by moving routing peers only. Moving a peer between
+            # agents whose load differ by one would just swap them.
+            threshold = max(cfg.CONF.dynamic_routing_rebalance_threshold, 1)
+            while True:
+                busiest = max(load, key=load.get)
+                idlest = min(load, key=load.get)
+                if load[busiest] - load[idlest] <= threshold:
+                    break
+                query = context.session.query(
+                    dr_as_db.RoutingPeerAgentBinding)
+                query = query.filter(
+                    dr_as_db.RoutingPeerAgentBinding.agent_id == busiest)
+                binding = next((binding for binding in query
+                                if idlest not in
+                                peer_agents[binding.routingpeer_id]), None)
+                if not binding:
+                    break
+                peer_agents[binding.routingpeer_id].discard(busiest)
+                peer_agents[binding.routingpeer_id].add(idlest)
+                move('routingpeer', binding, idlest)
+
+        for moved in moves:
+            LOG.debug(_('%(resource)s %(id)s moved from DR agent '
+                        '%(from_agent_id)s to %(to_agent_id)s'), moved)
+        return moves
+
+    def _get_active_agents(self, context):
+        query = context.session.query(agents_db.Agent)
+        query = query.filter(agents_db.Agent.agent_type ==
+                             constants.AGENT_TYPE_DYNAMIC_ROUTING,
+                             agents_db.Agent.admin_state_up == sql.true())
+        return [agent for agent in query
+                if not agents_db.AgentDbMixin.is_agent_down(
+                    agent.heartbeat_timestamp)]
+
+    def _get_agent_ids_hosting_instances(self, context):
+        query = context.session.query(
+            dr_as_db.RoutingInstanceAgentBinding.agent_id)
+        return set(item[0] for item in query)
+
+    def _get_routingpeer_agent_ids(self, context):
+        query = context.session.query(
+            dr_as_db.RoutingPeerAgentBinding.routingpeer_id,
+            dr_as_db.RoutingPeerAgentBinding.agent_id)
+        peer_agents = {}
+        for routingpeer_id, agent_id in query:
+            peer_agents.setdefault(routingpeer_id, set()).add(agent_id)
+        return peer_agents
+
+    def _get_orphan_bindings(self, context, model, active_agent_ids):
+        query = context.session.query(model)
+        return query.filter(~model.agent_id.in_(list(active_agent_ids))).all()
+
+    def _get_prefix_count_by_instance(self, context):
+        """Return the number of advertised prefixes per routing instance."""
+        prefixes = {}
+        query = context.session.query(
+            dr_db.AdvertiseRoute.routinginstance_id,
+            func.count(dr_db.AdvertiseRoute.advertise_route))
+        query = query.group_by(dr_db.AdvertiseRoute.routinginstance_id)
+        for routinginstance_id, count in query:
+            prefixes[routinginstance_id] = count
+        query = context.session.query(
+            dr_db.RoutingInstanceNetBinding.routinginstance_id,
+            func.count(models_v2.Subnet.id))
+        query = query.join(
+            models_v2.Subnet,
+            models_v2.Subnet.network_id ==
+            dr_db.RoutingInstanceNetBinding.network_id)
+        query = query.group_by(
+            dr_db.RoutingInstanceNetBinding.routinginstance_id)
+        for routinginstance_id, count in query:
+            prefixes[routinginstance_id] = (
+                prefixes.get(routinginstance_id, 0) + count)
+        return prefixes
+
+    def _get_agents_load(self, context, agents):
+        """Return a dictionary of the load of each of the given agents."""
+        load = dict((agent.id, 0) for agent in agents)
+        if not load:
+            return {}
+        query = context.session.query(
+            dr_as_db.RoutingPeerAgentBinding.agent_id,
+            func.count(dr_as_db.RoutingPeerAgentBinding.routingpeer_id))
+        query = query.filter(
+            dr_as_db.RoutingPeerAgentBinding.agent_id.in_(list(load)))
+        query = query.group_by(dr_as_db.RoutingPeerAgentBinding.agent_id)
+        for agent_id, count in query:
+            load[agent_id] += count
+
+        prefixes = self._get_prefix_count_by_instance(context)
+        query = context.session.query(
+            dr_as_db.RoutingInstanceAgentBinding.agent_id,
+            dr_as_db.RoutingInstanceAgentBinding.routinginstance_id)
+        query = query.filter(
+            dr_as_db.RoutingInstanceAgentBinding.agent_id.in_(list(load)))
+        for agent_id, routinginstance_id in query:
+            load[agent_id] += 1 + prefixes.get(routinginstance_id, 0)
+        return dict((agent, load[agent.id]) for agent in agents)
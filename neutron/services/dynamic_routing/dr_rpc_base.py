@@ -57,57 +57,127 @@ class DynamicRoutingRpcCallbackMixin(object):
             if cfg.CONF.dynamic_routing_auto_schedule:
                 dr_plugin.auto_schedule_routinginstances(context, host)
 
+        prefixes = dr_plugin.list_advertise_routes_on_dr_agent(context, host)
+        return sorted(set(prefix for ri_prefixes in prefixes.values()
+                          for prefix in ri_prefixes))
+
+    def _get_routinginstance_id_on_host(self, context, host):
+        dr_plugin = manager.NeutronManager.get_service_plugins()[
+            plugin_constants.DYNAMIC_ROUTING]
+        if not dr_plugin:
+            LOG.error(_('No plugin for Dynamic Routing registered! Will reply '
+                        'to dr agent with empty advertise routes.'))
+            return None, None
+        elif utils.is_extension_supported(
+                dr_plugin, constants.DR_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.dynamic_routing_auto_schedule:
+                dr_plugin.auto_schedule_routinginstances(context, host)
+
+        # An agent hosts a single routing instance at most.
         ri_ids = dr_plugin.list_active_sync_routinginstances_on_dr_agent(
             context, host)
-        filters = {'routinginstance_id': [ri_ids],
-                   'advertise': [True]}
-        routinginstances = dr_plugin.get_routinginstances(context,
-                                                          filters=filters)
-        subnets = []
+        return dr_plugin, ri_ids[0] if ri_ids else None
 
-        if routinginstances:
-            routinginstance = routinginstances[0]
-            networks = dr_plugin.list_networks_on_routinginstance(
-                context, routinginstances['id'])['networks']
-            for network in networks:
-                subnets.extend(
-                    dr_plugin._get_subnets_by_network(context, network['id']))
+    def get_advertise_routes_generation(self, context, **kwargs):
+        """Return the generation of the routing instance hosted by an agent.
 
-            advertise_routes = routinginstance['advertise_routes']
-            subnets.extend([advertise_route['advertise_route']
-                           for advertise_route in advertise_routes])
-        return subnets
+        This is cheap enough to be polled periodically, so the agents only
+        have to fetch a full snapshot when they detect they missed a delta.
+        """
+        host = kwargs.get('host')
+        dr_plugin, ri_id = self._get_routinginstance_id_on_host(context,
+                                                                host)
+        if not ri_id:
+            return {'routinginstance_id': None, 'generation': None}
+        routinginstance = dr_plugin._get_routinginstance(context, ri_id)
+        return {'routinginstance_id': ri_id,
+                'generation': routinginstance['generation']}
+
+    def get_advertise_routes_snapshot(self, context, **kwargs):
+        """Return every prefix the agent has to advertise.
+
+        The generation returned along with the prefixes is the one the
+        following deltas pushed to the agent are applied on top of.
+        """
+        host = kwargs.get('host')
+        dr_plugin, ri_id = self._get_routinginstance_id_on_host(context,
+                                                                host)
+        if not ri_id:
+            return {'routinginstance_id': None, 'generation': None,
+                    'prefixes': []}
+        return dr_plugin.get_advertise_routes_snapshot(context, ri_id)
 
     def sync_discoverroutes(self, context, **kwargs):
+        """Apply a batch of routes learned by a DR agent.
+
+        The routes are merged into the routes of every router attached to
+        the networks of the discovering routing instance with a single
+        update per router, whatever the size of the batch. Only the routes
+        with the destination and the nexthop of a withdrawn or replaced
+        route are removed, so the extra routes defined by the users are
+        kept.
+        """
         host = kwargs.get('host')
+        routes = kwargs.get('routes', [])
         dr_plugin = manager.NeutronManager.get_service_plugins()[
             plugin_constants.DYNAMIC_ROUTING]
         if not dr_plugin:
-            LOG.error(_('No plugin for Dynamic Routing registered! Will reply '
-                        'to dr agent with empty routingpeer dictionary.'))
-            return {}
-        elif utils.is_extension_supported(
-                dr_plugin, constants.DR_AGENT_SCHEDULER):
-            if cfg.CONF.dynamic_routing_auto_schedule:
-                dr_plugin.auto_schedule_routinginstances(context, host)
+            LOG.error(_('No plugin for Dynamic Routing registered! Will '
+                        'ignore the routes discovered by the dr agent.'))
+            return
+        l3_plugin = manager.NeutronManager.get_service_plugins().get(
+            plugin_constants.L3_ROUTER_NAT)
+        if not l3_plugin:
+            LOG.error(_('No L3 router plugin registered! Will ignore the '
+                        'routes discovered by the dr agent.'))
+            return
 
         ri_ids = dr_plugin.list_active_sync_routinginstances_on_dr_agent(
             context, host)
-        filters = {'routinginstance_id': [ri_ids],
+        filters = {'id': ri_ids,
                    'discover': [True]}
         routinginstances = dr_plugin.get_routinginstances(context,
                                                           filters=filters)
-        routers = []
-        if routinginstances:
-            routinginstance = routinginstances[0]
-            network_ids = dr_plugin.list_networks_on_routinginstance(
-                context, routinginstance['id'])['networks']
-            filter_ports = {'network_id': network_ids}
-            port_router_ids = self.get_ports(context,
-                                      filters=filter_ports,
-                                      fields=['device_id'])
-            filter_routers = {'id': port_router_ids}
-            routers = dr_plugin.get_routers(context, filters=filter_routers)
-            for router in routers:
-                dr_plugin.update_router(context, router['id'],
-                                        **kwargs['routes'])
+        if not routinginstances or not routes:
+            return
+
+        withdrawn = set()
+        learned = {}
+        for route in routes:
+            destination = route['destination']
+            if route['withdraw']:
+                learned.pop(destination, None)
+                withdrawn.add((destination, route['nexthop']))
+            else:
+                learned[destination] = route['nexthop']
+                if route.get('replaces'):
+                    withdrawn.add((destination, route['replaces']))
+
+        networks = dr_plugin.list_networks_on_routinginstance(
+            context, routinginstances[0]['id'])['networks']
+        if not networks:
+            return
+        ports = dr_plugin.get_ports(
+            context,
+            filters={'network_id': [network['id'] for network in networks],
+                     'device_owner': [constants.DEVICE_OWNER_ROUTER_INTF]},
+            fields=['device_id'])
+        router_ids = list(set(port['device_id'] for port in ports))
+        if not router_ids:
+            return
+        for router in l3_plugin.get_routers(context,
+                                            filters={'id': router_ids}):
+            new_routes = [route for route in router.get('routes', [])
+                          if (route['destination'], route['nexthop']) not in
+                          withdrawn and
+                          learned.get(route['destination']) !=
+                          route['nexthop']]
+            new_routes.extend({'destination': destination,
+                               'nexthop': nexthop}
+                              for destination, nexthop in learned.items())
+            try:
+                l3_plugin.update_router(context, router['id'],
+                                        {'router': {'routes': new_routes}})
+            except Exception:
+                LOG.exception(_('Failed updating the routes of router '
+                                '%s'), router['id'])
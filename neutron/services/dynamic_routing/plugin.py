@@ -12,23 +12,34 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 # @author: Jaume Devesa, devvesa@gmail.com, Midokura SARL
+import os
+
 from oslo.config import cfg
 
 from neutron.api.rpc.agentnotifiers import dr_rpc_agent_api as dr_rpc
 from neutron.common import constants as q_const
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
+from neutron import context as n_context
 from neutron.db import dr_agentschedulers_db as dr_as_db
 from neutron.db import dr_db
 from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.services.dynamic_routing import dr_rpc_base
 
+LOG = logging.getLogger(__name__)
+
 
 class DynamicRoutingPluginRpcCallbacks(
     n_rpc.RpcCallback,
     dr_rpc_base.DynamicRoutingRpcCallbackMixin):
 
-    RPC_API_VERSION = "1.0"
+    # history
+    #   1.1 Added get_advertise_routes_generation and
+    #       get_advertise_routes_snapshot
+    #   1.2 sync_discoverroutes takes a batch of routes
+    RPC_API_VERSION = "1.2"
 
 
 class DynamicRoutingPlugin(dr_db.DynamicRoutingDbMixin,
@@ -42,6 +53,35 @@ class DynamicRoutingPlugin(dr_db.DynamicRoutingDbMixin,
             cfg.CONF.dynamic_routing_scheduler_driver)
         self._setup_rpc()
         super(DynamicRoutingPlugin, self).__init__()
+        interval = cfg.CONF.dynamic_routing_rebalance_interval
+        if interval:
+            self._rebalance_pid = os.getpid()
+            self.rebalance_loop = loopingcall.FixedIntervalLoopingCall(
+                self._periodic_rebalance)
+            self.rebalance_loop.start(interval=interval)
+
+    def _periodic_rebalance(self):
+        # The API and RPC workers are forked once the plugin is loaded and
+        # inherit the loop, only the process which started it rebalances.
+        if os.getpid() != self._rebalance_pid:
+            raise loopingcall.LoopingCallDone()
+        try:
+            self.rebalance_dr_agents(n_context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Failed rebalancing the DR agents"))
+
+    def create_routingpeer(self, context, routingpeer):
+        routingpeer = super(DynamicRoutingPlugin, self).create_routingpeer(
+            context, routingpeer)
+        self.schedule_routingpeer(context, routingpeer['id'])
+        return routingpeer
+
+    def create_routinginstance(self, context, routinginstance):
+        routinginstance = super(
+            DynamicRoutingPlugin, self).create_routinginstance(
+                context, routinginstance)
+        self.schedule_routinginstance(context, routinginstance['id'])
+        return routinginstance
 
     def _setup_rpc(self):
         self.topic = topics.DRAGENT
@@ -54,6 +94,11 @@ class DynamicRoutingPlugin(dr_db.DynamicRoutingDbMixin,
                                   fanout=False)
         self.conn.consume_in_threads()
 
+    def _notify_advertise_routes_changed(self, context, routinginstance_id,
+                                         generation, added, removed):
+        self.dr_rpc_notifier.advertise_routes_changed(
+            context, routinginstance_id, generation, added, removed)
+
     def get_plugin_description(self):
         return ("Dynamic Routing Service Plugin provides endpoints to "
                 "manage routing protocols and dynamically advertise and "
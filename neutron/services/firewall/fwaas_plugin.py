@@ -153,6 +153,12 @@ class FirewallPlugin(firewall_db.Firewall_db_mixin):
     """
     supported_extension_aliases = ["fwaas"]
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         """Do the initialization for the firewall service plugin here."""
         qdbapi.register_models()
@@ -0,0 +1,42 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.agent.linux.bgp import base
+
+
+class FakeBGPDriver(base.LinuxBGPDriver):
+    """In-memory BGP speaker recording what would be sent to the peers."""
+
+    def __init__(self, as_number, router_id,
+                 best_path_change_handler=None):
+        super(FakeBGPDriver, self).__init__(as_number, router_id,
+                                            best_path_change_handler)
+        self.peers = {}
+        self.batches = []
+
+    def add_peer(self, peer_id, peer_as, password=None):
+        self.peers[peer_id] = {'peer_as': peer_as, 'password': password}
+
+    def del_peer(self, peer_id):
+        del self.peers[peer_id]
+
+    def advertise_routes(self, prefixes):
+        prefixes = self._coalesce_routes(prefixes)
+        self.batches.append(('advertise', prefixes))
+        self.advertised_routes.update(prefixes)
+
+    def withdraw_routes(self, prefixes):
+        prefixes = self._coalesce_routes(prefixes, advertise=False)
+        self.batches.append(('withdraw', prefixes))
+        self.advertised_routes.difference_update(prefixes)
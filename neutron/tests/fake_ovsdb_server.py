@@ -0,0 +1,319 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import socket
+import tempfile
+import threading
+
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import uuidutils
+
+_SET = {'key': 'uuid', 'min': 0, 'max': 'unlimited'}
+_MAP = {'key': 'string', 'value': 'string', 'min': 0, 'max': 'unlimited'}
+_OPTIONAL_INT = {'key': 'integer', 'min': 0, 'max': 1}
+
+SCHEMA = {
+    'name': 'Open_vSwitch',
+    'tables': {
+        'Open_vSwitch': {'columns': {'bridges': {'type': _SET},
+                                     'cur_cfg': {'type': 'integer'},
+                                     'next_cfg': {'type': 'integer'}}},
+        'Bridge': {'columns': {'name': {'type': 'string'},
+                               'ports': {'type': _SET},
+                               'datapath_id': {'type': {'key': 'string',
+                                                        'min': 0,
+                                                        'max': 1}},
+                               'external_ids': {'type': _MAP},
+                               'fail_mode': {'type': {'key': 'string',
+                                                      'min': 0, 'max': 1}},
+                               'protocols': {'type': {
+                                   'key': 'string', 'min': 0,
+                                   'max': 'unlimited'}}}},
+        'Port': {'columns': {'name': {'type': 'string'},
+                             'interfaces': {'type': {'key': 'uuid',
+                                                     'min': 1,
+                                                     'max': 'unlimited'}},
+                             'tag': {'type': _OPTIONAL_INT},
+                             'external_ids': {'type': _MAP}}},
+        'Interface': {'columns': {'name': {'type': 'string'},
+                                  'ofport': {'type': _OPTIONAL_INT},
+                                  'type': {'type': 'string'},
+                                  'options': {'type': _MAP},
+                                  'external_ids': {'type': _MAP}}},
+    },
+}
+
+
+def _atoms(datum):
+    if isinstance(datum, list) and datum[0] == 'set':
+        return datum[1]
+    return [datum]
+
+
+class FakeOvsdbServer(object):
+    """Minimal in-memory ovsdb-server listening on a unix socket.
+
+    It understands the requests issued by ovsdb_native and also plays
+    ovs-vswitchd: every commit assigns ofports to new interfaces, catches
+    cur_cfg up with next_cfg and drops unreferenced ports and interfaces.
+    """
+
+    def __init__(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'db.sock')
+        self.connection = 'unix:%s' % self.path
+        self.lock = threading.Lock()
+        self.clients = []
+        self.monitors = {}
+        self.requests = []
+        self._next_ofport = 1
+        self.db = dict((table, {}) for table in SCHEMA['tables'])
+        self.db['Open_vSwitch'][uuidutils.generate_uuid()] = {
+            'bridges': ['set', []], 'cur_cfg': 0, 'next_cfg': 0}
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen(5)
+
+    def start(self):
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        # Wake up the serving threads and let them close their own sockets.
+        for sock in [self._sock] + self.clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def add_bridge(self, name, port_count=0):
+        """Populate a bridge with port_count VIF ports."""
+        with self.lock:
+            ports = []
+            for i in range(port_count):
+                port_name = 'tap%s' % i
+                iface = self._insert('Interface', {
+                    'name': port_name, 'ofport': self._ofport(),
+                    'type': '', 'options': ['map', []],
+                    'external_ids': ['map', [
+                        ['iface-id', 'port-%s' % i],
+                        ['attached-mac', 'fa:16:3e:00:%02x:%02x' %
+                         (i // 256 % 256, i % 256)]]]})
+                ports.append(['uuid', self._insert('Port', {
+                    'name': port_name, 'interfaces': ['uuid', iface],
+                    'tag': ['set', []], 'external_ids': ['map', []]})])
+            bridge = self._insert('Bridge', {
+                'name': name, 'ports': ['set', ports],
+                'datapath_id': '0000%012x' % len(self.db['Bridge']),
+                'external_ids': ['map', []], 'fail_mode': ['set', []],
+                'protocols': ['set', []]})
+            root = self.db['Open_vSwitch'].values()[0]
+            root['bridges'] = ['set', _atoms(root['bridges']) +
+                               [['uuid', bridge]]]
+
+    def _ofport(self):
+        self._next_ofport += 1
+        return self._next_ofport - 1
+
+    def _insert(self, table, row):
+        uuid = uuidutils.generate_uuid()
+        self.db[table][uuid] = row
+        return uuid
+
+    def _serve(self):
+        while True:
+            try:
+                client, _addr = self._sock.accept()
+            except (EnvironmentError, EOFError):
+                self._sock.close()
+                return
+            self.clients.append(client)
+            thread = threading.Thread(target=self._handle, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, client):
+        decoder = json.JSONDecoder()
+        buf = ''
+        while True:
+            try:
+                data = client.recv(65536)
+            except (EnvironmentError, EOFError):
+                data = None
+            if not data:
+                self.monitors.pop(client, None)
+                client.close()
+                return
+            buf += data
+            while buf.strip():
+                try:
+                    msg, end = decoder.raw_decode(buf.lstrip())
+                except ValueError:
+                    break
+                buf = buf.lstrip()[end:]
+                with self.lock:
+                    self.requests.append(msg['method'])
+                    result = getattr(self, '_rpc_%s' % msg['method'])(
+                        client, msg['params'])
+                    client.sendall(jsonutils.dumps(
+                        {'id': msg['id'], 'result': result, 'error': None}))
+
+    def _rpc_echo(self, client, params):
+        return params
+
+    def _rpc_get_schema(self, client, params):
+        return SCHEMA
+
+    def _rpc_monitor(self, client, params):
+        self.monitors[client] = params[2]
+        return self._updates(params[2], dict(
+            (table, dict((uuid, (None, row)) for uuid, row in rows.items()))
+            for table, rows in self.db.items()))
+
+    def _updates(self, requests, changes):
+        updates = {}
+        for table, rows in changes.items():
+            if table not in requests:
+                continue
+            columns = requests[table]['columns']
+            for uuid, (old, new) in rows.items():
+                change = {}
+                if old is not None:
+                    change['old'] = dict((c, old[c]) for c in columns
+                                         if c in old)
+                if new is not None:
+                    change['new'] = dict((c, new[c]) for c in columns
+                                         if c in new)
+                updates.setdefault(table, {})[uuid] = change
+        return updates
+
+    def _defaults(self, table):
+        row = {}
+        for column, spec in SCHEMA['tables'][table]['columns'].items():
+            col_type = spec['type']
+            if isinstance(col_type, dict) and 'value' in col_type:
+                row[column] = ['map', []]
+            elif isinstance(col_type, dict):
+                row[column] = ['set', []]
+            else:
+                row[column] = 0 if col_type == 'integer' else ''
+        return row
+
+    def _match(self, table, where):
+        uuids = []
+        for uuid, row in self.db[table].items():
+            for column, function, value in where:
+                current = ['uuid', uuid] if column == '_uuid' else row[column]
+                if function != '==' or current != value:
+                    break
+            else:
+                uuids.append(uuid)
+        return uuids
+
+    def _resolve(self, datum, named):
+        if isinstance(datum, dict):
+            return dict((k, self._resolve(v, named))
+                        for k, v in datum.items())
+        if isinstance(datum, list):
+            if datum and datum[0] == 'named-uuid':
+                return ['uuid', named[datum[1]]]
+            return [self._resolve(item, named) for item in datum]
+        return datum
+
+    def _mutate(self, datum, mutator, arg):
+        if mutator == '+=':
+            return datum + arg
+        if datum[0] == 'map' or arg[0] == 'map':
+            pairs = datum[1] if datum[0] == 'map' else []
+            if mutator == 'insert':
+                keys = [k for k, _v in pairs]
+                return ['map', pairs + [p for p in arg[1]
+                                        if p[0] not in keys]]
+            keys = _atoms(arg)
+            return ['map', [p for p in pairs if p[0] not in keys]]
+        atoms = _atoms(datum)
+        if mutator == 'insert':
+            return ['set', atoms + [a for a in _atoms(arg)
+                                    if a not in atoms]]
+        return ['set', [a for a in atoms if a not in _atoms(arg)]]
+
+    def _rpc_transact(self, client, params):
+        before = dict((table, dict((uuid, dict(row))
+                                   for uuid, row in rows.items()))
+                      for table, rows in self.db.items())
+        named = {}
+        results = []
+        for op in params[1:]:
+            table = self.db[op['table']]
+            if op['op'] == 'insert':
+                uuid = uuidutils.generate_uuid()
+                named[op.get('uuid-name')] = uuid
+                row = self._defaults(op['table'])
+                row.update(self._resolve(op['row'], named))
+                table[uuid] = row
+                results.append({'uuid': ['uuid', uuid]})
+                continue
+            uuids = self._match(op['table'], op['where'])
+            if op['op'] == 'update':
+                for uuid in uuids:
+                    table[uuid].update(self._resolve(op['row'], named))
+            elif op['op'] == 'mutate':
+                for uuid in uuids:
+                    for column, mutator, arg in op['mutations']:
+                        table[uuid][column] = self._mutate(
+                            table[uuid][column], mutator,
+                            self._resolve(arg, named))
+            elif op['op'] == 'select':
+                results.append({'rows': [
+                    dict((c, table[uuid][c]) for c in op['columns'])
+                    for uuid in uuids]})
+                continue
+            results.append({'count': len(uuids)})
+        self._run_vswitchd()
+        self._notify(before)
+        return results
+
+    def _run_vswitchd(self):
+        ports = set()
+        for row in self.db['Bridge'].values():
+            ports.update(uuid for _u, uuid in _atoms(row['ports']))
+        for uuid in set(self.db['Port']) - ports:
+            del self.db['Port'][uuid]
+        interfaces = set()
+        for row in self.db['Port'].values():
+            interfaces.update(uuid for _u, uuid in _atoms(row['interfaces']))
+        for uuid in set(self.db['Interface']) - interfaces:
+            del self.db['Interface'][uuid]
+        for row in self.db['Interface'].values():
+            if row.get('ofport', ['set', []]) == ['set', []]:
+                row['ofport'] = self._ofport()
+        for row in self.db['Open_vSwitch'].values():
+            row['cur_cfg'] = row['next_cfg']
+
+    def _notify(self, before):
+        changes = {}
+        for table, rows in self.db.items():
+            for uuid in set(rows) | set(before[table]):
+                old = before[table].get(uuid)
+                new = rows.get(uuid)
+                if old != new:
+                    changes.setdefault(table, {})[uuid] = (old, new)
+        for client, requests in self.monitors.items():
+            updates = self._updates(requests, changes)
+            if updates:
+                client.sendall(jsonutils.dumps(
+                    {'id': None, 'method': 'update',
+                     'params': [None, updates]}))
@@ -0,0 +1,80 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.openstack.common import importutils
+from neutron.tests import base
+from neutron.tests import fake_bgp_driver
+
+
+class TestBGPDriverRoutes(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestBGPDriverRoutes, self).setUp()
+        self.driver = fake_bgp_driver.FakeBGPDriver(12345, '127.0.0.1')
+
+    def test_advertise_routes_coalesces_batch(self):
+        self.driver.advertise_routes(['10.0.0.0/24', '10.0.0.1/24',
+                                      '10.0.1.0/24', '10.0.0.0/24'])
+        self.assertEqual([('advertise', ['10.0.0.0/24', '10.0.1.0/24'])],
+                         self.driver.batches)
+
+    def test_advertise_routes_skips_advertised(self):
+        self.driver.advertise_routes(['10.0.0.0/24'])
+        self.driver.advertise_routes(['10.0.0.0/24', '10.0.1.0/24'])
+        self.assertEqual(('advertise', ['10.0.1.0/24']),
+                         self.driver.batches[-1])
+        self.assertEqual(set(['10.0.0.0/24', '10.0.1.0/24']),
+                         self.driver.advertised_routes)
+
+    def test_withdraw_routes_skips_unknown(self):
+        self.driver.advertise_routes(['10.0.0.0/24', '10.0.1.0/24'])
+        self.driver.withdraw_routes(['10.0.1.0/24', '10.0.2.0/24'])
+        self.assertEqual(('withdraw', ['10.0.1.0/24']),
+                         self.driver.batches[-1])
+        self.assertEqual(set(['10.0.0.0/24']),
+                         self.driver.advertised_routes)
+
+
+class TestRyuBGPDriver(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRyuBGPDriver, self).setUp()
+        ryu_mod = mock.Mock()
+        bgpspeaker = ryu_mod.services.protocols.bgp.bgpspeaker
+        ryu_modules_p = mock.patch.dict('sys.modules', {
+            'ryu': ryu_mod,
+            'ryu.services': ryu_mod.services,
+            'ryu.services.protocols': ryu_mod.services.protocols,
+            'ryu.services.protocols.bgp': ryu_mod.services.protocols.bgp,
+            'ryu.services.protocols.bgp.bgpspeaker': bgpspeaker})
+        ryu_modules_p.start()
+        self.addCleanup(ryu_modules_p.stop)
+        ryu_driver = importutils.import_module(
+            'neutron.agent.linux.bgp.ryu_driver')
+        self.driver = ryu_driver.RyuBGPDriver(12345, '127.0.0.1')
+        self.speaker = bgpspeaker.BGPSpeaker.return_value
+
+    def test_advertise_routes(self):
+        self.driver.advertise_routes(['10.0.1.0/24', '10.0.0.0/24',
+                                      '10.0.0.0/24'])
+        self.assertEqual([mock.call('10.0.0.0/24'),
+                          mock.call('10.0.1.0/24')],
+                         self.speaker.prefix_add.call_args_list)
+
+    def test_withdraw_routes(self):
+        self.driver.advertise_routes(['10.0.0.0/24'])
+        self.driver.withdraw_routes(['10.0.0.0/24', '10.0.1.0/24'])
+        self.speaker.prefix_del.assert_called_once_with('10.0.0.0/24')
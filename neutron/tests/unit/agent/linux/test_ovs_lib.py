@@ -975,3 +975,83 @@ class TestDeferredOVSBridge(base.BaseTestCase):
     def test_getattr_unallowed_attr(self):
         with ovs_lib.DeferredOVSBridge(self.br) as deferred_br:
             self.assertRaises(AttributeError, getattr, deferred_br, 'failure')
+
+    def test_apply_bundle(self):
+        mocked_bundle = mock.patch.object(
+            self.br, 'do_bundled_action_flows').start()
+        with ovs_lib.DeferredOVSBridge(self.br,
+                                       use_bundle=True) as deferred_br:
+            deferred_br.delete_flows(**self.del_flow_dict1)
+            deferred_br.add_flow(**self.add_flow_dict1)
+        mocked_bundle.assert_called_once_with(
+            [('add', self.add_flow_dict1), ('del', self.del_flow_dict1)])
+        self._verify_mock_call([])
+
+
+class TestOVSBridgeDeferApply(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestOVSBridgeDeferApply, self).setUp()
+        self.br = ovs_lib.OVSBridge('br-int', 'sudo')
+        self.run_ofctl = mock.patch.object(self.br, 'run_ofctl').start()
+
+    def _program_flows(self, br):
+        br.add_flow(in_port=1, actions='drop')
+        br.add_flow(in_port=2, actions='drop')
+        br.delete_flows(in_port=1)
+        br.mod_flow(in_port=2, actions='normal')
+
+    def test_flows_applied_in_order_on_defer_apply_off(self):
+        self.br.defer_apply_on()
+        self._program_flows(self.br)
+        self.assertFalse(self.run_ofctl.called)
+        self.br.defer_apply_off()
+        self.assertEqual(
+            [mock.call('add-flows', ['-'],
+                       'hard_timeout=0,idle_timeout=0,priority=1,'
+                       'in_port=1,actions=drop\n'
+                       'hard_timeout=0,idle_timeout=0,priority=1,'
+                       'in_port=2,actions=drop'),
+             mock.call('del-flows', ['-'], 'in_port=1'),
+             mock.call('mod-flows', ['-'], 'in_port=2,actions=normal')],
+            self.run_ofctl.mock_calls)
+
+    def test_bundle_applies_one_ofctl_call(self):
+        self.br.defer_apply_on(use_bundle=True)
+        self._program_flows(self.br)
+        self.br.defer_apply_off()
+        self.run_ofctl.assert_called_once_with(
+            'add-flows', ['--bundle', '-'],
+            'add hard_timeout=0,idle_timeout=0,priority=1,'
+            'in_port=1,actions=drop\n'
+            'add hard_timeout=0,idle_timeout=0,priority=1,'
+            'in_port=2,actions=drop\n'
+            'delete in_port=1\n'
+            'modify in_port=2,actions=normal')
+
+    def test_deferred_bridge_flows_queued_on_bridge(self):
+        self.br.defer_apply_on()
+        with self.br.deferred() as deferred_br:
+            deferred_br.add_flow(in_port=1, actions='drop')
+        self.assertFalse(self.run_ofctl.called)
+        self.br.defer_apply_off()
+        self.assertEqual(1, self.run_ofctl.call_count)
+
+    def test_defer_apply_off_reports_failure(self):
+        self.run_ofctl.return_value = None
+        self.br.defer_apply_on()
+        self._program_flows(self.br)
+        self.assertFalse(self.br.defer_apply_off())
+
+    def test_bundle_defer_apply_off_reports_failure(self):
+        self.run_ofctl.return_value = None
+        self.br.defer_apply_on(use_bundle=True)
+        self._program_flows(self.br)
+        self.assertFalse(self.br.defer_apply_off())
+
+    def test_defer_apply_off_without_flows(self):
+        self.br.defer_apply_on()
+        self.br.defer_apply_off()
+        self.assertFalse(self.run_ofctl.called)
+        self.br.add_flow(in_port=1, actions='drop')
+        self.assertTrue(self.run_ofctl.called)
@@ -0,0 +1,143 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import ovsdb_native
+from neutron.plugins.common import constants as p_const
+from neutron.tests import base
+from neutron.tests import fake_ovsdb_server
+
+_MAP = {'key': 'string', 'value': 'string', 'min': 0, 'max': 'unlimited'}
+_TAG = {'key': 'integer', 'min': 0, 'max': 1}
+
+
+class TestDatumConversion(base.BaseTestCase):
+
+    def test_format_optional_integer(self):
+        self.assertEqual('5', ovsdb_native.format_datum(5, _TAG))
+        self.assertEqual('[]', ovsdb_native.format_datum(['set', []], _TAG))
+
+    def test_format_quotes_like_vsctl(self):
+        self.assertEqual('br-int', ovsdb_native.format_datum('br-int',
+                                                             'string'))
+        self.assertEqual('"0000aabbccdd"',
+                         ovsdb_native.format_datum('0000aabbccdd', 'string'))
+
+    def test_format_map(self):
+        datum = ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                         ['iface-id', 'abc']]]
+        self.assertEqual('{attached-mac="fa:16:3e:00:00:01", iface-id=abc}',
+                         ovsdb_native.format_datum(datum, _MAP))
+
+    def test_parse_round_trips(self):
+        for datum, col_type in ((5, _TAG),
+                                ('0000aabbccdd', 'string'),
+                                (['map', [['peer', 'patch-tun'],
+                                          ['remote_ip', '10.0.0.1']]], _MAP)):
+            value = ovsdb_native.format_datum(datum, col_type)
+            self.assertEqual(datum,
+                             ovsdb_native.parse_datum(value, col_type))
+
+
+class TestNativeOVSBridge(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNativeOVSBridge, self).setUp()
+        self.server = fake_ovsdb_server.FakeOvsdbServer()
+        self.server.add_bridge('br-int', port_count=3)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        cfg.CONF.set_override('ovsdb_interface', 'native')
+        cfg.CONF.set_override('ovsdb_connection', self.server.connection)
+        mock.patch.dict(ovsdb_native._connections, clear=True).start()
+        self.addCleanup(ovsdb_native._connections.clear)
+        self.addCleanup(self._close_connections)
+        self.br = ovs_lib.OVSBridge('br-int', 'sudo')
+        self.vsctl = mock.patch.object(self.br, 'run_vsctl').start()
+
+    def _close_connections(self):
+        for connection in ovsdb_native._connections.values():
+            connection.close()
+
+    def test_reads_served_from_cache(self):
+        self.assertEqual(set(['port-0', 'port-1', 'port-2']),
+                         self.br.get_vif_port_set())
+        self.assertEqual('1', self.br.get_port_ofport('tap0'))
+        self.assertEqual({'tap0': [], 'tap1': [], 'tap2': []},
+                         self.br.get_port_tag_dict())
+        self.assertFalse(self.vsctl.called)
+        self.assertEqual(['get_schema', 'monitor'], self.server.requests)
+
+    def test_bridges_share_one_connection(self):
+        other = ovs_lib.OVSBridge('br-int', 'sudo')
+        self.assertIs(self.br.ovsdb, other.ovsdb)
+
+    def test_add_and_delete_port(self):
+        ofport = self.br.add_port('tap3')
+        self.assertEqual('4', ofport)
+        self.assertIn('tap3', self.br.get_port_name_list())
+        self.assertEqual('br-int',
+                         self.br.get_bridge_name_for_port_name('tap3'))
+        self.br.delete_port('tap3')
+        self.assertNotIn('tap3', self.br.get_port_name_list())
+        self.assertFalse(self.br.port_exists('tap3'))
+        self.assertFalse(self.vsctl.called)
+
+    def test_add_tunnel_port_single_transaction(self):
+        ofport = self.br.add_tunnel_port('vxlan-1', '10.0.0.2', '10.0.0.1',
+                                         tunnel_type=p_const.TYPE_VXLAN)
+        self.assertEqual('4', ofport)
+        self.assertEqual(1, self.server.requests.count('transact'))
+        options = self.br.db_get_map('Interface', 'vxlan-1', 'options')
+        self.assertEqual({'remote_ip': '10.0.0.2', 'local_ip': '10.0.0.1',
+                          'in_key': 'flow', 'out_key': 'flow',
+                          'df_default': 'true'}, options)
+
+    def test_set_and_clear_db_attribute(self):
+        self.br.set_db_attribute('Port', 'tap0', 'tag', 5)
+        self.assertEqual('5', self.br.db_get_val('Port', 'tap0', 'tag'))
+        self.br.clear_db_attribute('Port', 'tap0', 'tag')
+        self.assertEqual('[]', self.br.db_get_val('Port', 'tap0', 'tag'))
+        self.br.set_db_attribute('Interface', 'tap1', 'options:peer',
+                                 'patch-tun')
+        self.assertEqual('patch-tun',
+                         self.br.db_get_val('Interface', 'tap1',
+                                            'options:peer'))
+        self.assertFalse(self.vsctl.called)
+
+    def test_sees_changes_made_by_others(self):
+        other = ovsdb_native.OvsdbConnection(self.server.connection, 5)
+        self.addCleanup(other.close)
+        self.br.get_port_name_list()
+        other.add_port('br-int', 'tap9')
+        self.assertIn('tap9', self.br.get_port_name_list())
+
+    def test_uncached_column_uses_vsctl(self):
+        self.vsctl.return_value = '{rx_bytes=1}'
+        self.assertEqual({'rx_bytes': '1'}, self.br.get_port_stats('tap0'))
+        self.vsctl.assert_called_once_with(
+            ['get', 'Interface', 'tap0', 'statistics'], False)
+
+    def test_unreachable_server_uses_vsctl(self):
+        self.server.stop()
+        cfg.CONF.set_override('ovsdb_connection', 'unix:/nonexistent')
+        br = ovs_lib.OVSBridge('br-int', 'sudo')
+        with mock.patch.object(br, 'run_vsctl',
+                               return_value='tap0\n') as vsctl:
+            self.assertEqual(['tap0'], br.get_port_name_list())
+        vsctl.assert_called_once_with(['list-ports', 'br-int'],
+                                      check_error=True)
@@ -15,11 +15,20 @@
 #
 # @author: Sergio Cazzolato, Intel
 
+import datetime
+
+import mock
+from sqlalchemy import orm
+import testtools
+
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
 from neutron.db import db_base_plugin_v2 as base_plugin
+from neutron.db import models_v2
 from neutron.db import quota_db
+from neutron.openstack.common import timeutils
+from neutron import quota
 from neutron.tests import base
 
 
@@ -148,3 +157,178 @@ class TestDbQuotaDriver(base.BaseTestCase):
         self.assertRaises(exceptions.QuotaResourceUnknown,
                           self.plugin.limit_check, context.get_admin_context(),
                           PROJECT, resources, values)
+
+
+class TestDbQuotaDriverReservations(base.BaseTestCase):
+    def setUp(self):
+        super(TestDbQuotaDriverReservations, self).setUp()
+        self.plugin = FakePlugin()
+        self.context = context.get_admin_context()
+        self.addCleanup(db.clear_db)
+        quota.QUOTAS._driver = None
+        self.addCleanup(setattr, quota.QUOTAS, '_driver', None)
+        self.resources = quota.QUOTAS.resources
+        self.network = self.resources['network']
+
+    def _reserve(self, resource, delta, count):
+        return self.plugin.make_reservation(
+            self.context, PROJECT, self.resources, resource, delta, count)
+
+    def _create_network(self):
+        return self.plugin.create_network(self.context, {'network': {
+            'name': 'net', 'tenant_id': PROJECT,
+            'admin_state_up': True, 'shared': False}})
+
+    def test_make_reservation_counts_reserved_items(self):
+        resources = {RESOURCE: TestResource(RESOURCE, 4)}
+        count = mock.Mock(return_value=1)
+        self.plugin.make_reservation(self.context, PROJECT, resources,
+                                     resources[RESOURCE], 2, count)
+        self.assertRaises(exceptions.OverQuota,
+                          self.plugin.make_reservation, self.context,
+                          PROJECT, resources, resources[RESOURCE], 2, count)
+
+    def test_make_reservation_unlimited(self):
+        resources = {RESOURCE: TestResource(RESOURCE, -1)}
+        count = mock.Mock()
+        self.assertIsNone(self.plugin.make_reservation(
+            self.context, PROJECT, resources, resources[RESOURCE], 1000,
+            count))
+        self.assertFalse(count.called)
+
+    def test_commit_reservation_releases_items(self):
+        resources = {RESOURCE: TestResource(RESOURCE, 2)}
+        count = mock.Mock(return_value=0)
+        reservation_id = self.plugin.make_reservation(
+            self.context, PROJECT, resources, resources[RESOURCE], 2, count)
+        self.plugin.commit_reservation(self.context, reservation_id)
+        self.plugin.make_reservation(self.context, PROJECT, resources,
+                                     resources[RESOURCE], 2, count)
+
+    def test_expired_reservation_is_removed(self):
+        resources = {RESOURCE: TestResource(RESOURCE, 2)}
+        count = mock.Mock(return_value=0)
+        self.plugin.make_reservation(self.context, PROJECT, resources,
+                                     resources[RESOURCE], 2, count)
+        later = timeutils.utcnow() + datetime.timedelta(hours=1)
+        with mock.patch.object(timeutils, 'utcnow', return_value=later):
+            self.plugin.make_reservation(self.context, PROJECT, resources,
+                                         resources[RESOURCE], 2, count)
+        self.assertEqual(
+            1, self.context.session.query(quota_db.Reservation).count())
+
+    def test_tracked_usage_is_not_counted_again(self):
+        self._create_network()
+        count = mock.Mock(return_value=1)
+        self._reserve(self.network, 1, count)
+        self._create_network()
+        self._create_network()
+        usage = self.context.session.query(quota_db.QuotaUsage).one()
+        self.assertEqual(3, usage.in_use)
+        self._reserve(self.network, 1, count)
+        self.assertEqual(1, count.call_count)
+
+    def test_tracked_usage_decremented_on_delete(self):
+        network = self._create_network()
+        self._reserve(self.network, 1, mock.Mock(return_value=1))
+        self.plugin.delete_network(self.context, network['id'])
+        usage = self.context.session.query(quota_db.QuotaUsage).one()
+        self.assertEqual(0, usage.in_use)
+
+    def test_bulk_delete_marks_usage_dirty(self):
+        self._create_network()
+        count = mock.Mock(return_value=1)
+        self._reserve(self.network, 1, count)
+        with self.context.session.begin():
+            self.context.session.query(quota_db.models_v2.Network).delete()
+        count.return_value = 0
+        self._reserve(self.network, 9, count)
+        self.assertEqual(2, count.call_count)
+
+    def test_tracked_usage_resync_interval(self):
+        count = mock.Mock(return_value=0)
+        self._reserve(self.network, 1, count)
+        later = timeutils.utcnow() + datetime.timedelta(hours=2)
+        with mock.patch.object(timeutils, 'utcnow', return_value=later):
+            self._reserve(self.network, 1, count)
+        self.assertEqual(2, count.call_count)
+
+    def test_tracked_usage_updated_on_commit(self):
+        self._reserve(self.network, 1, mock.Mock(return_value=0))
+        with self.context.session.begin():
+            self._create_network()
+            usage = self.context.session.query(quota_db.QuotaUsage).one()
+            self.assertEqual(0, usage.in_use)
+        self.context.session.refresh(usage)
+        self.assertEqual(1, usage.in_use)
+
+    def test_rolled_back_items_not_tracked(self):
+        self._reserve(self.network, 1, mock.Mock(return_value=0))
+        with testtools.ExpectedException(ValueError):
+            with self.context.session.begin():
+                self._create_network()
+                raise ValueError()
+        self._create_network()
+        usage = self.context.session.query(quota_db.QuotaUsage).one()
+        self.assertEqual(1, usage.in_use)
+
+    def test_reservation_released_by_create(self):
+        count = mock.Mock(return_value=0)
+        reservation_id = self._reserve(self.network, 2, count)
+        self._create_network()
+        reservation = self.context.session.query(quota_db.Reservation).one()
+        self.assertEqual(1, reservation.delta)
+        self._create_network()
+        self.assertFalse(
+            self.context.session.query(quota_db.Reservation).count())
+        # Counted once before the reservation is committed
+        self.assertRaises(exceptions.OverQuota,
+                          self._reserve, self.network, 9, count)
+        self._reserve(self.network, 8, count)
+        self.plugin.commit_reservation(self.context, reservation_id)
+
+    def test_concurrent_first_usage_is_used(self):
+        with self.context.session.begin():
+            self.context.session.add(quota_db.QuotaUsage(
+                tenant_id=PROJECT, resource='network', in_use=3,
+                dirty=False, synced_at=timeutils.utcnow()))
+        count = mock.Mock(return_value=0)
+        # The usage row is inserted after the reservation looked it up
+        with mock.patch.object(orm.Query, 'first', return_value=None):
+            self.assertRaises(exceptions.OverQuota,
+                              self._reserve, self.network, 8, count)
+        usage = self.context.session.query(quota_db.QuotaUsage).one()
+        self.assertEqual(3, usage.in_use)
+
+
+class TestQuotaEngineReservations(base.BaseTestCase):
+    def setUp(self):
+        super(TestQuotaEngineReservations, self).setUp()
+        self.context = context.get_admin_context()
+        self.driver = mock.Mock()
+        self.engine = quota.QuotaEngine()
+        self.engine._driver = self.driver
+        self.engine.register_resource(quota.TrackedResource(
+            'network', models_v2.Network, 'quota_network'))
+        self.engine.register_resource(quota.CountableResource(
+            RESOURCE, mock.Mock(return_value=0), 'quota_' + RESOURCE))
+        self.plugin = mock.Mock()
+        self.plugin.get_networks_count.return_value = 0
+
+    def test_make_reservation(self):
+        self.engine.make_reservation(self.context, PROJECT, 'network', 1,
+                                     self.plugin, 'networks')
+        self.assertTrue(self.driver.make_reservation.called)
+        self.assertFalse(self.driver.limit_check.called)
+
+    def test_make_reservation_without_tenant_only_counts(self):
+        self.engine.make_reservation(self.context, None, 'network', 1,
+                                     self.plugin, 'networks')
+        self.assertFalse(self.driver.make_reservation.called)
+        self.assertTrue(self.driver.limit_check.called)
+
+    def test_make_reservation_of_untracked_resource_only_counts(self):
+        self.engine.make_reservation(self.context, PROJECT, RESOURCE, 1,
+                                     self.plugin, RESOURCE + 's')
+        self.assertFalse(self.driver.make_reservation.called)
+        self.assertTrue(self.driver.limit_check.called)
@@ -0,0 +1,216 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo.config import cfg
+
+from neutron import context
+from neutron.db import models_v2
+from neutron.ipam import interval_driver
+from neutron import manager
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+INTERVAL_DRIVER = 'neutron.ipam.interval_driver.IntervalIpamDriver'
+OPTIMISTIC_DRIVER = 'neutron.ipam.interval_driver.OptimisticIpamDriver'
+
+
+class TestIpRangeSet(base.BaseTestCase):
+
+    def test_from_pools(self):
+        free = interval_driver.IpRangeSet.from_pools(
+            [(100, 120), (3, 10)], [3, 78, 7, 110, 11, 4, 111])
+        self.assertEqual([(5, 6), (8, 10), (100, 109), (112, 120)],
+                         free.ranges())
+        self.assertEqual(24, free.size)
+
+    def test_from_fully_allocated_pool(self):
+        free = interval_driver.IpRangeSet.from_pools([(3, 4)], [4, 3])
+        self.assertEqual([], free.ranges())
+        self.assertIsNone(free.pop())
+
+    def test_discard_splits_range(self):
+        free = interval_driver.IpRangeSet.from_pools([(1, 10)], [])
+        self.assertTrue(free.discard(5))
+        self.assertFalse(free.discard(5))
+        self.assertTrue(free.discard(1))
+        self.assertTrue(free.discard(10))
+        self.assertEqual([(2, 4), (6, 9)], free.ranges())
+        self.assertEqual(7, free.size)
+
+    def test_pop_returns_lowest(self):
+        free = interval_driver.IpRangeSet.from_pools([(1, 3)], [2])
+        self.assertEqual(1, free.pop())
+        self.assertEqual(3, free.pop())
+        self.assertIsNone(free.pop())
+
+    def test_pop_random(self):
+        free = interval_driver.IpRangeSet.from_pools([(1, 3), (10, 12)], [2])
+        popped = set()
+        for i in range(5):
+            ip = free.pop_random()
+            self.assertNotIn(ip, free)
+            popped.add(ip)
+        self.assertEqual(set([1, 3, 10, 11, 12]), popped)
+        self.assertIsNone(free.pop_random())
+
+    def test_ipv6_pool(self):
+        net = netaddr.IPNetwork('fd00::/64')
+        free = interval_driver.IpRangeSet.from_pools(
+            [(net.first + 1, net.last - 1)], [net.first + 1])
+        self.assertEqual(2 ** 64 - 3, free.size)
+        self.assertEqual(net.first + 2, free.pop())
+
+
+class IntervalIpamDriverMixin(object):
+
+    def setUp(self):
+        super(IntervalIpamDriverMixin, self).setUp()
+        cfg.CONF.set_override('ipam_driver', INTERVAL_DRIVER)
+
+
+class TestIntervalIpamDriver(IntervalIpamDriverMixin,
+                             test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def _driver(self):
+        return manager.NeutronManager.get_plugin().ipam_driver
+
+    def test_driver_loaded(self):
+        self.assertIsInstance(self._driver(),
+                              interval_driver.IntervalIpamDriver)
+
+    def _get_ranges(self):
+        return [(r.first_ip, r.last_ip) for r in
+                context.get_admin_context().session.query(
+                    models_v2.IPAvailabilityRange)]
+
+    def test_no_availability_range_used(self):
+        with self.subnet() as subnet:
+            ranges = self._get_ranges()
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual('10.0.0.2', ips[0]['ip_address'])
+                self.assertEqual(ranges, self._get_ranges())
+
+    def test_ip_reserved_for_port(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                allocations = context.get_admin_context().session.query(
+                    models_v2.IPAllocation).all()
+                self.assertEqual([('10.0.0.2', port['port']['id'])],
+                                 [(a.ip_address, a.port_id)
+                                  for a in allocations])
+
+    def test_deleted_subnet_evicted(self):
+        with self.network() as network:
+            with self.subnet(network=network) as subnet:
+                with self.port(subnet=subnet):
+                    pass
+                self.assertIn(subnet['subnet']['id'],
+                              self._driver()._subnets)
+            self.assertEqual({}, self._driver()._subnets)
+
+    def test_subnets_of_deleted_network_evicted(self):
+        with self.network(do_delete=False) as network:
+            with self.subnet(network=network, do_delete=False) as subnet:
+                with self.port(subnet=subnet):
+                    pass
+        # The subnets are removed by a bulk delete of the network.
+        self._delete('networks', network['network']['id'])
+        self.assertEqual({}, self._driver()._subnets)
+
+    def test_released_ip_not_reused_right_away(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                data = {'port': {'fixed_ips': [
+                    {'subnet_id': subnet['subnet']['id']}]}}
+                req = self.new_update_request('ports', data,
+                                              port['port']['id'])
+                res = self.deserialize(self.fmt, req.get_response(self.api))
+                ips = res['port']['fixed_ips']
+                self.assertEqual('10.0.0.3', ips[0]['ip_address'])
+
+    def test_ip_allocated_by_other_process_skipped(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet):
+                # Another server allocates the next address without this
+                # process knowing about it.
+                ctx = context.get_admin_context()
+                with ctx.session.begin(subtransactions=True):
+                    ctx.session.add(models_v2.IPAllocation(
+                        network_id=subnet['subnet']['network_id'],
+                        subnet_id=subnet['subnet']['id'],
+                        ip_address='10.0.0.3'))
+                with self.port(subnet=subnet) as port:
+                    ips = port['port']['fixed_ips']
+                    self.assertEqual('10.0.0.4', ips[0]['ip_address'])
+
+    def test_exhausted_subnet_reloaded(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            with self.port(subnet=subnet) as port:
+                pass
+            with self.port(subnet=subnet) as port2:
+                self.assertEqual(port['port']['fixed_ips'],
+                                 port2['port']['fixed_ips'])
+
+
+class TestPortsV2(IntervalIpamDriverMixin, test_db_plugin.TestPortsV2):
+    pass
+
+
+class TestSubnetsV2(IntervalIpamDriverMixin, test_db_plugin.TestSubnetsV2):
+    pass
+
+
+class TestOptimisticIpamDriver(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestOptimisticIpamDriver, self).setUp()
+        cfg.CONF.set_override('ipam_driver', OPTIMISTIC_DRIVER)
+
+    def _get_allocations(self, subnet):
+        return context.get_admin_context().session.query(
+            models_v2.IPAllocation).filter_by(
+                subnet_id=subnet['subnet']['id']).all()
+
+    def test_random_ip_reserved_for_port(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertIn(netaddr.IPAddress(ips[0]['ip_address']),
+                              netaddr.IPRange('10.0.0.2', '10.0.0.254'))
+                allocations = self._get_allocations(subnet)
+                self.assertEqual([(ips[0]['ip_address'], port['port']['id'])],
+                                 [(a.ip_address, a.port_id)
+                                  for a in allocations])
+
+    def test_duplicate_ip_retried(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            # Another server allocates 10.0.0.5 between the load of the free
+            # addresses and the insert.
+            ctx = context.get_admin_context()
+            with ctx.session.begin(subtransactions=True):
+                ctx.session.add(models_v2.IPAllocation(
+                    network_id=subnet['subnet']['network_id'],
+                    subnet_id=subnet['subnet']['id'],
+                    ip_address='10.0.0.5'))
+            candidates = [int(netaddr.IPAddress('10.0.0.5')),
+                          int(netaddr.IPAddress('10.0.0.6'))]
+            with mock.patch.object(interval_driver.IpRangeSet, 'pop_random',
+                                   side_effect=candidates):
+                with self.port(subnet=subnet) as port:
+                    ips = port['port']['fixed_ips']
+                    self.assertEqual('10.0.0.6', ips[0]['ip_address'])
+                    self.assertEqual(2, len(self._get_allocations(subnet)))
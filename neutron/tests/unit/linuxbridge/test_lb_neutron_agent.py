@@ -289,20 +289,34 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                        'added': set(['tap3', 'tap4']),
                        'updated': set(['tap2', 'tap3']),
                        'removed': set(['tap1'])}
-        agent.prepare_devices_filter = mock.Mock()
-        agent.refresh_firewall = mock.Mock()
+        agent.setup_port_filters = mock.Mock()
         agent.treat_devices_added_updated = mock.Mock(return_value=False)
         agent.treat_devices_removed = mock.Mock(return_value=False)
 
         agent.process_network_devices(device_info)
 
-        agent.prepare_devices_filter.assert_called_with(set(['tap3', 'tap4']))
-        self.assertTrue(agent.refresh_firewall.called)
+        agent.setup_port_filters.assert_called_with(set(['tap3', 'tap4']),
+                                                    set(['tap2', 'tap3']))
         agent.treat_devices_added_updated.assert_called_with(set(['tap2',
                                                                   'tap3',
                                                                   'tap4']))
         agent.treat_devices_removed.assert_called_with(set(['tap1']))
 
+    def test_security_groups_member_updated_deferred(self):
+        agent = self.agent
+        agent.firewall = mock.Mock()
+        agent.firewall.ports = {'tap1': {
+            'device': 'tap1',
+            'security_group_source_groups': ['fake_sgid']}}
+        agent.refresh_firewall = mock.Mock()
+        agent.security_groups_member_updated(['fake_sgid'])
+        self.assertFalse(agent.refresh_firewall.called)
+        self.assertTrue(agent.firewall_refresh_needed())
+
+        agent.setup_port_filters(set(), set())
+        agent.refresh_firewall.assert_called_once_with(set(['tap1']))
+        self.assertFalse(agent.firewall_refresh_needed())
+
     def test_treat_devices_added_updated_admin_state_up_true(self):
         agent = self.agent
         mock_details = {'device': 'dev123',
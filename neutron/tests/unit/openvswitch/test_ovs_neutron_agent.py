@@ -93,6 +93,11 @@ class CreateAgentConfigMap(base.BaseTestCase):
         cfgmap = ovs_neutron_agent.create_agent_config_map(cfg.CONF)
         self.assertEqual(cfgmap['enable_distributed_routing'], True)
 
+    def test_create_agent_config_map_use_ofctl_bundle(self):
+        cfg.CONF.set_override('use_ofctl_bundle', True, group='AGENT')
+        cfgmap = ovs_neutron_agent.create_agent_config_map(cfg.CONF)
+        self.assertTrue(cfgmap['use_ofctl_bundle'])
+
 
 class TestOvsNeutronAgent(base.BaseTestCase):
 
@@ -712,6 +717,65 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             self.assertTrue(treat_vif_port.called)
             self.assertTrue(upd_dev_down.called)
 
+    def _mock_treat_devices_flushed(self, flushed):
+        fake_details_dict = {'admin_state_up': True,
+                             'port_id': 'xxx',
+                             'device': 'xxx',
+                             'network_id': 'yyy',
+                             'physical_network': 'foo',
+                             'segmentation_id': 'bar',
+                             'network_type': 'baz',
+                             'fixed_ips': [],
+                             'device_owner': 'compute:None'
+                             }
+        parent = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[fake_details_dict]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=mock.MagicMock()),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
+            mock.patch.object(self.agent, 'treat_vif_port'),
+            mock.patch.object(self.agent, 'defer_apply_off',
+                              return_value=flushed),
+            mock.patch.object(self.agent, 'defer_apply_on')
+        ) as (get_dev_fn, get_vif_func, upd_dev_up, treat_vif_port,
+              defer_off, defer_on):
+            parent.attach_mock(upd_dev_up, 'update_device_up')
+            parent.attach_mock(defer_off, 'defer_apply_off')
+            self.agent.flows_deferred = True
+            if flushed:
+                self.agent.treat_devices_added_or_updated(['xxx'], False)
+            else:
+                self.assertRaises(
+                    ovs_neutron_agent.FlowsApplyError,
+                    self.agent.treat_devices_added_or_updated,
+                    ['xxx'], False)
+            self.assertTrue(defer_on.called)
+            return parent.mock_calls
+
+    def test_treat_devices_added_flushes_flows_before_device_up(self):
+        calls = self._mock_treat_devices_flushed(True)
+        self.assertEqual(['defer_apply_off', 'update_device_up'],
+                         [c[0] for c in calls])
+
+    def test_treat_devices_added_flush_failure_skips_device_up(self):
+        calls = self._mock_treat_devices_flushed(False)
+        self.assertEqual(['defer_apply_off'], [c[0] for c in calls])
+
+    def test_process_network_ports_resyncs_on_flush_failure(self):
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'treat_devices_added_or_updated',
+                              side_effect=ovs_neutron_agent.FlowsApplyError(
+                                  devices=['xxx'])),
+            mock.patch.object(self.agent, 'treat_devices_removed',
+                              return_value=False)
+        ):
+            self.assertTrue(self.agent.process_network_ports(
+                {'current': set(['xxx']), 'added': set(['xxx']),
+                 'removed': set()}, False))
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
         with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
                                side_effect=Exception()):
@@ -511,8 +511,19 @@ class TunnelTest(base.BaseTestCase):
 
         self.mock_int_bridge_expected += [
             mock.call.dump_flows_for_table(constants.CANARY_TABLE),
-            mock.call.dump_flows_for_table(constants.CANARY_TABLE)
+            mock.call.defer_apply_on(use_bundle=False),
+            mock.call.defer_apply_off(),
+            mock.call.dump_flows_for_table(constants.CANARY_TABLE),
+            mock.call.defer_apply_on(use_bundle=False)
         ]
+        # The second iteration is interrupted before flushing the flows
+        for expected in (self.mock_map_tun_bridge_expected,
+                         self.mock_tun_bridge_expected):
+            expected += [
+                mock.call.defer_apply_on(use_bundle=False),
+                mock.call.defer_apply_off(),
+                mock.call.defer_apply_on(use_bundle=False)
+            ]
 
         with contextlib.nested(
             mock.patch.object(log.ContextAdapter, 'exception'),
@@ -0,0 +1,102 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron import context
+from neutron.plugins.common import constants as plugin_constants
+from neutron.services.dynamic_routing import dr_rpc_base
+from neutron.tests import base
+
+
+HOST = 'host1'
+
+
+class TestDynamicRoutingRpcCallback(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDynamicRoutingRpcCallback, self).setUp()
+        self.dr_plugin = mock.Mock()
+        self.l3_plugin = mock.Mock()
+        service_plugins_p = mock.patch(
+            'neutron.manager.NeutronManager.get_service_plugins')
+        service_plugins = service_plugins_p.start()
+        service_plugins.return_value = {
+            plugin_constants.DYNAMIC_ROUTING: self.dr_plugin,
+            plugin_constants.L3_ROUTER_NAT: self.l3_plugin}
+        self.callbacks = dr_rpc_base.DynamicRoutingRpcCallbackMixin()
+        self.ctx = context.get_admin_context()
+
+        list_ri = self.dr_plugin.list_active_sync_routinginstances_on_dr_agent
+        list_ri.return_value = ['ri-id']
+        self.dr_plugin.get_routinginstances.return_value = [{'id': 'ri-id'}]
+        self.dr_plugin.list_networks_on_routinginstance.return_value = {
+            'networks': [{'id': 'net-id'}]}
+        self.dr_plugin.get_ports.return_value = [{'device_id': 'router-id'}]
+        self.l3_plugin.get_routers.return_value = [
+            {'id': 'router-id',
+             'routes': [{'destination': '172.16.0.0/16',
+                         'nexthop': '10.0.0.1'},
+                        {'destination': '192.168.0.0/16',
+                         'nexthop': '10.0.0.1'}]}]
+
+    def test_sync_discoverroutes_single_update_per_router(self):
+        routes = [{'destination': '172.16.0.0/16', 'nexthop': '10.0.0.1',
+                   'withdraw': True},
+                  {'destination': '172.17.0.0/16', 'nexthop': '10.0.0.2',
+                   'withdraw': False},
+                  {'destination': '172.18.0.0/16', 'nexthop': '10.0.0.2',
+                   'withdraw': False}]
+        self.callbacks.sync_discoverroutes(self.ctx, host=HOST,
+                                           routes=routes)
+        self.assertEqual(1, self.l3_plugin.update_router.call_count)
+        body = self.l3_plugin.update_router.call_args[0][2]
+        self.assertEqual(
+            sorted([{'destination': '192.168.0.0/16', 'nexthop': '10.0.0.1'},
+                    {'destination': '172.17.0.0/16', 'nexthop': '10.0.0.2'},
+                    {'destination': '172.18.0.0/16', 'nexthop': '10.0.0.2'}]),
+            sorted(body['router']['routes']))
+
+    def test_sync_discoverroutes_keeps_user_routes(self):
+        routes = [{'destination': '172.16.0.0/16', 'nexthop': '10.0.0.9',
+                   'withdraw': True},
+                  {'destination': '192.168.0.0/16', 'nexthop': '10.0.0.2',
+                   'withdraw': False, 'replaces': '10.0.0.3'}]
+        self.callbacks.sync_discoverroutes(self.ctx, host=HOST,
+                                           routes=routes)
+        body = self.l3_plugin.update_router.call_args[0][2]
+        self.assertEqual(
+            sorted([{'destination': '172.16.0.0/16', 'nexthop': '10.0.0.1'},
+                    {'destination': '192.168.0.0/16', 'nexthop': '10.0.0.1'},
+                    {'destination': '192.168.0.0/16', 'nexthop': '10.0.0.2'}]),
+            sorted(body['router']['routes']))
+
+    def test_sync_discoverroutes_replaces_discovered_route(self):
+        routes = [{'destination': '192.168.0.0/16', 'nexthop': '10.0.0.2',
+                   'withdraw': False, 'replaces': '10.0.0.1'}]
+        self.callbacks.sync_discoverroutes(self.ctx, host=HOST,
+                                           routes=routes)
+        body = self.l3_plugin.update_router.call_args[0][2]
+        self.assertEqual(
+            sorted([{'destination': '172.16.0.0/16', 'nexthop': '10.0.0.1'},
+                    {'destination': '192.168.0.0/16', 'nexthop': '10.0.0.2'}]),
+            sorted(body['router']['routes']))
+
+    def test_sync_discoverroutes_no_discovering_instance(self):
+        self.dr_plugin.get_routinginstances.return_value = []
+        self.callbacks.sync_discoverroutes(
+            self.ctx, host=HOST,
+            routes=[{'destination': '172.17.0.0/16', 'nexthop': '10.0.0.2',
+                     'withdraw': False}])
+        self.assertFalse(self.l3_plugin.update_router.called)
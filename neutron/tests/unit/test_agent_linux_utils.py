@@ -14,8 +14,10 @@
 
 import fixtures
 import mock
+from oslo.config import cfg
 import testtools
 
+from neutron.agent.common import config
 from neutron.agent.linux import utils
 from neutron.tests import base
 
@@ -111,6 +113,52 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
                 self.assertTrue(log.debug.called)
 
 
+class AgentUtilsRootwrapDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsRootwrapDaemonTest, self).setUp()
+        config.register_root_helper(cfg.CONF)
+        cfg.CONF.set_override('root_helper_daemon',
+                              'sudo neutron-rootwrap-daemon /etc/rw.conf',
+                              'AGENT')
+        mock.patch.object(utils.RootwrapDaemonHelper, '_client', None).start()
+        self.client_cls = mock.patch.object(utils.client, 'Client').start()
+        self.client = self.client_cls.return_value
+        self.client.execute.return_value = (0, 'out', '')
+        self.create_process = mock.patch.object(utils,
+                                                'create_process').start()
+
+    def test_daemon_used_with_root_helper(self):
+        self.assertEqual('out', utils.execute(['ip', 'link'], 'sudo'))
+        self.assertEqual('out', utils.execute(['ip', 'addr'], 'sudo',
+                                              process_input='in'))
+        self.client_cls.assert_called_once_with(
+            ['sudo', 'neutron-rootwrap-daemon', '/etc/rw.conf'])
+        self.client.execute.assert_called_with(['ip', 'addr'], stdin='in')
+        self.assertFalse(self.create_process.called)
+
+    def test_daemon_not_used_without_root_helper(self):
+        self.create_process.return_value = FakeCreateProcess(0), ['ls']
+        utils.execute(['ls'])
+        self.assertFalse(self.client.execute.called)
+
+    def test_daemon_not_used_when_not_configured(self):
+        cfg.CONF.set_override('root_helper_daemon', None, 'AGENT')
+        self.create_process.return_value = FakeCreateProcess(0), ['ip']
+        utils.execute(['ip'], 'sudo')
+        self.assertFalse(self.client.execute.called)
+
+    def test_daemon_addl_env(self):
+        utils.execute(['dnsmasq'], 'sudo', addl_env={'FOO': 'bar'})
+        self.client.execute.assert_called_once_with(
+            ['env', 'FOO=bar', 'dnsmasq'], stdin=None)
+
+    def test_daemon_return_code_raises(self):
+        self.client.execute.return_value = (1, '', 'error')
+        self.assertRaises(RuntimeError, utils.execute, ['ip'], 'sudo')
+        self.assertEqual('', utils.execute(['ip'], 'sudo',
+                                           check_exit_code=False))
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
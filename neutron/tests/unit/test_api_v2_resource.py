@@ -368,3 +368,38 @@ class ResourceTestCase(base.BaseTestCase):
         res = resource.post('', params='{"key": "val"}',
                             extra_environ=environ)
         self.assertEqual(res.status_int, 200)
+
+    def _test_list(self, fmt, threshold):
+        self.config(stream_list_threshold=threshold)
+        controller = mock.MagicMock()
+        networks = {'networks': [{'id': 'a', 'name': 'net1'},
+                                 {'id': 'b', 'name': 'net2'}]}
+        controller.index = lambda request: networks
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': fmt})}
+        with mock.patch.object(wsgi.JSONDictSerializer, 'serialize_iter',
+                               autospec=True,
+                               side_effect=lambda self, data: iter(
+                                   [self.default(data)])) as serialize_iter:
+            res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        if fmt == 'json':
+            self.assertEqual(networks,
+                             wsgi.JSONDeserializer().deserialize(
+                                 res.body)['body'])
+        return serialize_iter.called
+
+    def test_list_streamed(self):
+        self.assertTrue(self._test_list('json', 2))
+
+    def test_list_below_threshold_not_streamed(self):
+        self.assertFalse(self._test_list('json', 3))
+
+    def test_list_streaming_disabled(self):
+        self.assertFalse(self._test_list('json', -1))
+
+    def test_xml_list_not_streamed(self):
+        self.assertFalse(self._test_list('xml', 0))
@@ -951,6 +951,19 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
             self._test_list_resources('port', [port1],
                                       query_params=query_params)
 
+    def test_list_ports_filtered_by_fixed_ips_with_fields(self):
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.5'},
+                         {'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.6'}]
+            with self.port(subnet=subnet, fixed_ips=fixed_ips) as port:
+                # The port is listed once although both addresses match
+                query_params = ('fixed_ips=ip_address%3D10.0.0.5&'
+                                'fixed_ips=ip_address%3D10.0.0.6&fields=id')
+                res = self._list('ports', query_params=query_params)
+                self.assertEqual([{'id': port['port']['id']}], res['ports'])
+
     def test_list_ports_public_network(self):
         with self.network(shared=True) as network:
             with self.subnet(network) as subnet:
@@ -1962,6 +1975,19 @@ class TestNetworksV2(NeutronDbPluginV2TestCase):
         res = self._create_bulk_from_list(self.fmt, 'network', networks)
         self.assertEqual(res.status_int, webob.exc.HTTPConflict.code)
 
+    def test_create_networks_bulk_failure_releases_quota(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk network create")
+        quota = 2
+        cfg.CONF.set_override('quota_network', quota, group='QUOTAS')
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch.object(plugin, 'create_network_bulk',
+                               side_effect=ValueError):
+            res = self._create_network_bulk(self.fmt, quota, 'test', True)
+            self.assertEqual(webob.exc.HTTPServerError.code, res.status_int)
+        res = self._create_network_bulk(self.fmt, quota, 'test', True)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+
     def test_create_networks_bulk_emulated(self):
         real_has_attr = hasattr
 
@@ -2109,6 +2135,15 @@ class TestNetworksV2(NeutronDbPluginV2TestCase):
                                             (net1, net2, net3),
                                             ('name', 'asc'), 2, 2)
 
+    def test_list_networks_with_unknown_marker_native(self):
+        if self._skip_native_pagination:
+            self.skipTest("Skip test for not implemented pagination feature")
+        with self.network():
+            req = self.new_list_request('networks',
+                                        params='limit=1&marker=unknown')
+            res = req.get_response(self.api)
+            self.assertEqual(webob.exc.HTTPNotFound.code, res.status_int)
+
     def test_list_networks_with_pagination_emulated(self):
         helper_patcher = mock.patch(
             'neutron.api.v2.base.Controller._get_pagination_helper',
@@ -3973,6 +4008,79 @@ class NeutronDbPluginV2AsMixinTestCase(base.BaseTestCase):
         net = self.plugin.create_network(self.context, self.net_data)
         self.assertEqual(net['status'], 'BUILD')
 
+    def _create_networks(self, names):
+        for index, name in enumerate(names):
+            self.net_data['network'].update(id='net-%d' % index, name=name)
+            self.plugin.create_network(self.context, self.net_data)
+
+    def test_get_networks_with_marker(self):
+        self._create_networks(['c', 'b', 'a'])
+        with mock.patch.object(self.plugin, '_get_network') as get_network:
+            nets = self.plugin.get_networks(self.context,
+                                            sorts=[('id', True)], limit=2,
+                                            marker='net-0')
+        self.assertFalse(get_network.called)
+        self.assertEqual(['net-1', 'net-2'], [net['id'] for net in nets])
+
+    def test_get_networks_with_marker_sorted_by_name(self):
+        self._create_networks(['c', 'b', 'a', 'b'])
+        nets = self.plugin.get_networks(self.context,
+                                        sorts=[('name', False), ('id', True)],
+                                        limit=2, marker='net-1')
+        self.assertEqual(['net-3', 'net-2'], [net['id'] for net in nets])
+
+    def test_get_networks_with_marker_page_reverse(self):
+        self._create_networks(['c', 'b', 'a'])
+        nets = self.plugin.get_networks(self.context,
+                                        sorts=[('name', True), ('id', True)],
+                                        limit=2, marker='net-0',
+                                        page_reverse=True)
+        self.assertEqual(['net-2', 'net-1'], [net['id'] for net in nets])
+
+    def test_get_networks_with_unknown_marker(self):
+        self._create_networks(['a'])
+        self.assertRaises(n_exc.NotFound, self.plugin.get_networks,
+                          self.context, sorts=[('name', True), ('id', True)],
+                          limit=2, marker='unknown')
+
+    def test_get_networks_sorted_by_id_with_unknown_marker(self):
+        self._create_networks(['a'])
+        self.assertRaises(n_exc.NotFound, self.plugin.get_networks,
+                          self.context, sorts=[('id', True)],
+                          limit=2, marker='unknown')
+
+    def test_get_networks_with_column_fields(self):
+        self.plugin.create_network(self.context, self.net_data)
+        with mock.patch.object(self.plugin,
+                               '_make_network_dict') as make_network_dict:
+            nets = self.plugin.get_networks(self.context,
+                                            fields=['name', 'shared'])
+        self.assertFalse(make_network_dict.called)
+        self.assertEqual([{'name': 'net1', 'shared': False}], nets)
+
+    def test_get_networks_with_fields_not_in_columns(self):
+        self.plugin.create_network(self.context, self.net_data)
+        nets = self.plugin.get_networks(self.context,
+                                        fields=['name', 'subnets'])
+        self.assertEqual([{'name': 'net1', 'subnets': []}], nets)
+
+    def test_get_ports_with_column_fields(self):
+        self.plugin.create_network(self.context, self.net_data)
+        port = self.plugin.create_port(
+            self.context,
+            {'port': {'tenant_id': 'test-tenant', 'network_id': 'fake-id',
+                      'name': 'port1', 'admin_state_up': True,
+                      'device_id': 'fake-device', 'device_owner': '',
+                      'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                      'fixed_ips': attributes.ATTR_NOT_SPECIFIED}})
+        with mock.patch.object(self.plugin,
+                               '_make_port_dict') as make_port_dict:
+            ports = self.plugin.get_ports(self.context,
+                                          fields=['id', 'device_id', 'id'])
+        self.assertFalse(make_port_dict.called)
+        self.assertEqual([{'id': port['id'], 'device_id': 'fake-device'}],
+                         ports)
+
 
 class TestBasicGetXML(TestBasicGet):
     fmt = 'xml'
@@ -130,6 +130,44 @@ class TestDhcpRpcCallbackMixin(base.BaseTestCase):
         self.assertEqual(retval['subnets'], subnet_retval)
         self.assertEqual(retval['ports'], port_retval)
 
+    def _test_get_active_networks_changes(self, revisions):
+        self.plugin.get_networks.side_effect = lambda *args, **kwargs: [
+            dict(id='a'), dict(id='b')]
+        self.plugin.get_subnets.return_value = [
+            dict(id='s1', network_id='a')]
+        self.plugin.get_ports.return_value = [
+            dict(id='p2', network_id='a'), dict(id='p1', network_id='a'),
+            dict(id='p3', network_id='b')]
+        return self.callbacks.get_active_networks_changes(
+            mock.Mock(), host='host', revisions=revisions)
+
+    def test_get_active_networks_changes(self):
+        changes = self._test_get_active_networks_changes(None)
+        self.assertEqual([], changes['unchanged'])
+        self.assertEqual(['a', 'b'],
+                         [network['id'] for network in changes['networks']])
+        revisions = dict((network['id'], network['revision'])
+                         for network in changes['networks'])
+
+        revisions['b'] = 'stale'
+        changes = self._test_get_active_networks_changes(revisions)
+        self.assertEqual(['a'], changes['unchanged'])
+        self.assertEqual(['b'],
+                         [network['id'] for network in changes['networks']])
+
+    def test_get_network_revision_ignores_order(self):
+        network = dict(id='a', subnets=[],
+                       ports=[dict(id='p1'), dict(id='p2')])
+        reordered = dict(id='a', subnets=[],
+                         ports=[dict(id='p2'), dict(id='p1')])
+        self.assertEqual(
+            self.callbacks._get_network_revision(network),
+            self.callbacks._get_network_revision(reordered))
+        reordered['ports'][0]['mac_address'] = 'fa:16:3e:00:00:01'
+        self.assertNotEqual(
+            self.callbacks._get_network_revision(network),
+            self.callbacks._get_network_revision(reordered))
+
     def _test_get_dhcp_port_helper(self, port_retval, other_expectations=[],
                                    update_port=None, create_port=None):
         subnets_retval = [dict(id='a', enable_dhcp=True),
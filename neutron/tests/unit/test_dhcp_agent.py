@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import sys
 import uuid
@@ -240,10 +241,21 @@ class TestDhcpAgent(base.BaseTestCase):
             trace_level='warning',
             expected_sync=False)
 
+    def test_call_driver_failure_forgets_revision(self):
+        network = dhcp.NetModel(True, dict(id='1', subnets=[], ports=[],
+                                           revision='r1'))
+        self.driver.return_value.foo.side_effect = Exception
+        dhcp_agt = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp_agt.cache.put(network)
+        with mock.patch.object(dhcp_agent.LOG, 'exception'):
+            self.assertIsNone(dhcp_agt.call_driver('foo', network))
+        self.assertEqual({}, dhcp_agt.cache.get_revisions())
+
     def _test_sync_state_helper(self, known_networks, active_networks):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.return_value = active_networks
+            mock_plugin.get_active_networks_changes.return_value = (
+                active_networks, [])
             plug.return_value = mock_plugin
 
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
@@ -294,7 +306,7 @@ class TestDhcpAgent(base.BaseTestCase):
     def test_sync_state_plugin_error(self):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.side_effect = Exception
+            mock_plugin.get_active_networks_changes.side_effect = Exception
             plug.return_value = mock_plugin
 
             with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
@@ -306,6 +318,93 @@ class TestDhcpAgent(base.BaseTestCase):
                     self.assertTrue(log.called)
                     self.assertTrue(schedule_resync.called)
 
+    def _test_sync_state_changes(self, known_networks, unchanged_ids,
+                                 networks):
+        with mock.patch(DHCP_PLUGIN) as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks_changes.return_value = (
+                networks, unchanged_ids)
+            plug.return_value = mock_plugin
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            for network_id in known_networks:
+                dhcp.cache.put(dhcp_agent.dhcp.NetModel(
+                    True, {'id': network_id, 'subnets': [], 'ports': [],
+                           'revision': 'r-%s' % network_id}))
+            with contextlib.nested(
+                mock.patch.object(dhcp, 'safe_configure_dhcp_for_network'),
+                mock.patch.object(dhcp, 'disable_dhcp_helper')
+            ) as (configure, disable):
+                dhcp.sync_state()
+            mock_plugin.get_active_networks_changes.assert_called_once_with(
+                dict(('%s' % network_id, 'r-%s' % network_id)
+                     for network_id in known_networks))
+            return configure, disable
+
+    def test_sync_state_only_changed_networks(self):
+        new_net = dhcp.NetModel(True, dict(id='new', subnets=[], ports=[]))
+        changed_net = dhcp.NetModel(True, dict(id='changed', subnets=[],
+                                               ports=[]))
+        configure, disable = self._test_sync_state_changes(
+            ['unchanged', 'changed', 'deleted'], ['unchanged'],
+            [changed_net, new_net])
+        disable.assert_called_once_with('deleted')
+        # The networks unknown to the agent come first
+        self.assertEqual([mock.call(new_net), mock.call(changed_net)],
+                         configure.call_args_list)
+
+    def _test_sync_state_without_changes_rpc(self, exc_type):
+        with mock.patch(DHCP_PLUGIN) as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks_changes.side_effect = (
+                n_rpc.RemoteError(exc_type))
+            mock_plugin.get_active_networks_info.return_value = [fake_network]
+            plug.return_value = mock_plugin
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(
+                    dhcp, 'safe_configure_dhcp_for_network') as configure:
+                dhcp.sync_state()
+                dhcp.sync_state()
+            self.assertEqual(
+                1, mock_plugin.get_active_networks_changes.call_count)
+            self.assertEqual(
+                2, mock_plugin.get_active_networks_info.call_count)
+            self.assertEqual(2, configure.call_count)
+            self.assertFalse(dhcp.use_active_networks_changes_rpc)
+
+    def test_sync_state_without_changes_rpc(self):
+        self._test_sync_state_without_changes_rpc('UnsupportedVersion')
+
+    def test_sync_state_without_changes_rpc_method(self):
+        self._test_sync_state_without_changes_rpc('NoSuchMethod')
+
+    def test_sync_network_skipped_after_event(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.pending_syncs = {fake_network.id: fake_network}
+        with contextlib.nested(
+            mock.patch.object(dhcp, 'safe_configure_dhcp_for_network'),
+            mock.patch.object(dhcp, 'enable_dhcp_helper')
+        ) as (configure, enable):
+            dhcp.network_create_end(
+                None, {'network': {'id': fake_network.id}})
+            dhcp._sync_network(fake_network.id)
+        enable.assert_called_once_with(fake_network.id)
+        self.assertFalse(configure.called)
+
+    def test_sync_network_refetched_after_port_event(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.cache.put(copy.deepcopy(fake_network))
+        dhcp.pending_syncs = {fake_network.id: fake_network}
+        with contextlib.nested(
+            mock.patch.object(dhcp, 'safe_configure_dhcp_for_network'),
+            mock.patch.object(dhcp, 'safe_get_network_info'),
+            mock.patch.object(dhcp, 'call_driver')
+        ) as (configure, get_network_info, call_driver):
+            dhcp.port_update_end(None, {'port': fake_port2})
+            self.assertFalse(call_driver.called)
+            dhcp._sync_network(fake_network.id)
+        get_network_info.assert_called_once_with(fake_network.id)
+        configure.assert_called_once_with(get_network_info.return_value)
+
     def test_periodic_resync(self):
         dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
         with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
@@ -826,6 +925,35 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_events_reload_merged(self):
+        cfg.CONF.set_override('reload_allocations_interval', 1)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with contextlib.nested(
+            mock.patch.object(dhcp_agent.eventlet, 'spawn_n'),
+            mock.patch.object(dhcp_agent.eventlet, 'sleep')
+        ) as (spawn_n, sleep):
+            self.dhcp.port_update_end(None, dict(port=fake_port1))
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            self.assertEqual(1, spawn_n.call_count)
+            self.assertFalse(self.call_driver.called)
+            spawn_n.call_args[0][0]()
+            sleep.assert_called_once_with(1)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual(set(), self.dhcp.pending_reloads)
+
+    def test_port_events_reload_merged_network_disabled(self):
+        cfg.CONF.set_override('reload_allocations_interval', 1)
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(dhcp_agent.eventlet, 'spawn_n') as spawn_n:
+            self.dhcp.port_update_end(None, dict(port=fake_port1))
+            self.cache.get_network_by_id.return_value = None
+            with mock.patch.object(dhcp_agent.eventlet, 'sleep'):
+                spawn_n.call_args[0][0]()
+        self.assertFalse(self.call_driver.called)
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -847,6 +975,15 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
                                               network_id='netid',
                                               host='foo')
 
+    def test_get_network_info_compact_models(self):
+        proxy = dhcp_agent.DhcpPluginApi('foo', {}, None,
+                                         compact_models=True)
+        with mock.patch.object(proxy, 'call') as call:
+            call.return_value = dict(id='netid', ports=[dict(id='a')])
+            retval = proxy.get_network_info('netid')
+        self.assertIsInstance(retval, dhcp.CompactNetModel)
+        self.assertIsInstance(retval.ports[0], dhcp.PortModel)
+
     def test_get_dhcp_port(self):
         self.call.return_value = dict(a=1)
         retval = self.proxy.get_dhcp_port('netid', 'devid')
@@ -866,6 +1003,20 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
         self.make_msg.assert_called_once_with('get_active_networks_info',
                                               host='foo')
 
+    def test_get_active_networks_changes(self):
+        self.call.return_value = {'networks': [dict(id='a', subnets=[],
+                                                    ports=[])],
+                                  'unchanged': ['b']}
+        networks, unchanged_ids = self.proxy.get_active_networks_changes(
+            {'a': 'r1', 'b': 'r2'})
+        self.make_msg.assert_called_once_with('get_active_networks_changes',
+                                              host='foo',
+                                              revisions={'a': 'r1',
+                                                         'b': 'r2'})
+        self.assertEqual('1.2', self.call.call_args[1]['version'])
+        self.assertEqual(['a'], [network.id for network in networks])
+        self.assertEqual(['b'], unchanged_ids)
+
     def test_create_dhcp_port(self):
         port_body = (
             {'port':
@@ -953,6 +1104,13 @@ class TestNetworkCache(base.BaseTestCase):
         self.assertEqual(nc.port_lookup,
                          {fake_port1.id: fake_network.id})
 
+    def test_get_revisions(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        nc.put(dhcp.NetModel(True, dict(id='with-revision', subnets=[],
+                                        ports=[], revision='r1')))
+        self.assertEqual({'with-revision': 'r1'}, nc.get_revisions())
+
     def test_remove_network(self):
         nc = dhcp_agent.NetworkCache()
         nc.cache = {fake_network.id: fake_network}
@@ -1016,6 +1174,24 @@ class TestNetworkCache(base.BaseTestCase):
         self.assertEqual(len(nc.port_lookup), 2)
         self.assertIn(fake_port2, fake_net.ports)
 
+    def _test_port_change_forgets_revision(self, change, port):
+        fake_net = dhcp.NetModel(
+            True, dict(id='12345678-1234-5678-1234567890ab',
+                       tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                       subnets=[fake_subnet1],
+                       ports=[fake_port1, fake_port2],
+                       revision='r1'))
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_net)
+        getattr(nc, change)(port)
+        self.assertEqual({}, nc.get_revisions())
+
+    def test_put_port_forgets_revision(self):
+        self._test_port_change_forgets_revision('put_port', fake_port2)
+
+    def test_remove_port_forgets_revision(self):
+        self._test_port_change_forgets_revision('remove_port', fake_port2)
+
     def test_remove_port_existing(self):
         fake_net = dhcp.NetModel(
             True, dict(id='12345678-1234-5678-1234567890ab',
@@ -1463,3 +1639,69 @@ class TestNetModel(base.BaseTestCase):
     def test_ns_name_none_namespace(self):
         network = dhcp.NetModel(None, {'id': 'foo'})
         self.assertIsNone(network.namespace)
+
+
+class TestSlotModel(base.BaseTestCase):
+    def test_fields(self):
+        port = dhcp.PortModel(dict(id='a', fixed_ips=[dict(subnet_id='b')]))
+        self.assertEqual(port.id, 'a')
+        self.assertEqual(port.fixed_ips[0].subnet_id, 'b')
+        self.assertIsInstance(port.fixed_ips[0], dhcp.FixedIpModel)
+        self.assertEqual(port['id'], 'a')
+        self.assertIn('id', port)
+        self.assertNotIn('name', port)
+        self.assertRaises(AttributeError, getattr, port, 'name')
+        self.assertIsNone(getattr(port, 'extra_dhcp_opts', None))
+
+    def test_extra_fields(self):
+        port = dhcp.PortModel({'id': 'a', 'binding:host_id': 'host',
+                               'allowed_address_pairs': [dict(a=1)]})
+        self.assertEqual(port['binding:host_id'], 'host')
+        self.assertEqual(port.allowed_address_pairs[0].a, 1)
+        port.foo = 'bar'
+        self.assertEqual(port.foo, 'bar')
+        del port.foo
+        self.assertRaises(AttributeError, getattr, port, 'foo')
+
+    def test_shared_strings(self):
+        network = dhcp.CompactNetModel(True, dict(
+            id=str(uuid.uuid4()), subnets=[],
+            ports=[dict(network_id=str(uuid.uuid4()))]))
+        port = network.ports[0]
+        self.assertIsNot(port.network_id, network.id)
+        network = dhcp.CompactNetModel(True, dict(
+            id=''.join(port.network_id), subnets=[],
+            ports=[dict(network_id=''.join(port.network_id))]))
+        self.assertIs(network.ports[0].network_id, network.id)
+
+    def test_equal_to_dict_model(self):
+        d = dict(id='a', fixed_ips=[dict(subnet_id='b', ip_address='c')],
+                 extra_dhcp_opts=[dict(opt_name='d', opt_value='e')])
+        port = dhcp.PortModel(d)
+        self.assertEqual(port, dhcp.DictModel(d))
+        self.assertEqual(dhcp.DictModel(d), port)
+        self.assertEqual(port, copy.deepcopy(port))
+        self.assertEqual(d, port.to_dict())
+        self.assertNotEqual(port, dhcp.PortModel(dict(d, id='b')))
+
+
+class TestCompactNetModel(base.BaseTestCase):
+    def test_ns_name(self):
+        network = dhcp.CompactNetModel(True, {'id': 'foo'})
+        self.assertEqual(network.namespace, 'qdhcp-foo')
+
+    def test_ns_name_false_namespace(self):
+        network = dhcp.CompactNetModel(False, {'id': 'foo'})
+        self.assertIsNone(network.namespace)
+
+    def test_same_as_net_model(self):
+        d = dict(id=fake_network.id, tenant_id=fake_network.tenant_id,
+                 admin_state_up=True,
+                 subnets=[dict(fake_subnet1), dict(fake_subnet2)],
+                 ports=[dict(fake_port1, fixed_ips=[dict(fake_fixed_ip1)])])
+        network = dhcp.CompactNetModel(True, d)
+        self.assertEqual(dhcp.DictModel(d), network)
+        self.assertEqual(network.subnets[0].allocation_pools.start,
+                         '172.9.9.2')
+        self.assertEqual(network.ports[0].fixed_ips[0].ip_address,
+                         '172.9.9.9')
@@ -0,0 +1,294 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.agent import dr_agent
+from neutron.openstack.common import uuidutils
+from neutron.tests import base
+from neutron.tests import fake_bgp_driver
+
+
+_uuid = uuidutils.generate_uuid
+HOSTNAME = 'myhost'
+RI_ID = _uuid()
+
+
+class DRAgentTestBase(base.BaseTestCase):
+
+    def setUp(self):
+        super(DRAgentTestBase, self).setUp()
+        cfg.CONF.register_opts(dr_agent.DRAgent.OPTS)
+        cfg.CONF.set_override('local_as_number', 12345)
+        cfg.CONF.set_override('router_id', '127.0.0.1')
+
+        driver_cls = mock.Mock()
+        self.driver = driver_cls.return_value
+        driver_cls_p = mock.patch.object(dr_agent.DRAgent,
+                                         'BGP_DRIVER_CLASS', driver_cls)
+        driver_cls_p.start()
+
+        plugin_api_cls_p = mock.patch('neutron.agent.dr_agent.'
+                                      'DRAgentPluginApi')
+        self.plugin_api = plugin_api_cls_p.start().return_value
+        self.plugin_api.get_peers.return_value = []
+        self.plugin_api.get_advertise_routes_snapshot.return_value = {
+            'routinginstance_id': RI_ID,
+            'generation': 3,
+            'prefixes': ['10.0.0.0/24', '10.0.1.0/24']}
+
+        self.agent = dr_agent.DRAgent(HOSTNAME)
+
+
+class TestDRAgent(DRAgentTestBase):
+
+    def _delta(self, generation, added=None, removed=None,
+               routinginstance_id=RI_ID):
+        return {'routinginstance_id': routinginstance_id,
+                'generation': generation,
+                'added': added or [],
+                'removed': removed or []}
+
+    def test_full_sync_fetches_snapshot(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.assertFalse(self.agent.fullsync)
+        self.assertEqual(3, self.agent.advertise_generation)
+        self.assertEqual(set(['10.0.0.0/24', '10.0.1.0/24']),
+                         self.agent.advertise_networks)
+
+    def test_steady_state_only_polls_generation(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.plugin_api.get_advertise_routes_generation.return_value = {
+            'routinginstance_id': RI_ID, 'generation': 3}
+        self.plugin_api.get_advertise_routes_snapshot.reset_mock()
+
+        self.agent._sync_peers_task(self.agent.context)
+        self.assertFalse(
+            self.plugin_api.get_advertise_routes_snapshot.called)
+        self.assertFalse(self.plugin_api.get_peers.call_count > 1)
+
+    def test_generation_mismatch_fetches_snapshot(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.plugin_api.get_advertise_routes_generation.return_value = {
+            'routinginstance_id': RI_ID, 'generation': 5}
+        self.plugin_api.get_advertise_routes_snapshot.return_value = {
+            'routinginstance_id': RI_ID,
+            'generation': 5,
+            'prefixes': ['10.0.2.0/24']}
+
+        self.agent._sync_peers_task(self.agent.context)
+        self.assertEqual(5, self.agent.advertise_generation)
+        self.assertEqual(set(['10.0.2.0/24']), self.agent.advertise_networks)
+
+    def test_delta_applied_in_order(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.agent.advertise_routes_changed(
+            self.agent.context, self._delta(4, added=['10.0.2.0/24'],
+                                            removed=['10.0.0.0/24']))
+        self.assertEqual(4, self.agent.advertise_generation)
+        self.assertEqual(set(['10.0.1.0/24', '10.0.2.0/24']),
+                         self.agent.advertise_networks)
+
+    def test_stale_delta_ignored(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.agent.advertise_routes_changed(
+            self.agent.context, self._delta(3, added=['10.0.2.0/24']))
+        self.assertEqual(3, self.agent.advertise_generation)
+        self.assertNotIn('10.0.2.0/24', self.agent.advertise_networks)
+
+    def test_delta_for_other_routinginstance_ignored(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.agent.advertise_routes_changed(
+            self.agent.context, self._delta(4, added=['10.0.2.0/24'],
+                                            routinginstance_id=_uuid()))
+        self.assertEqual(3, self.agent.advertise_generation)
+        self.assertNotIn('10.0.2.0/24', self.agent.advertise_networks)
+
+    def test_gap_schedules_fullsync(self):
+        self.agent._sync_peers_task(self.agent.context)
+        self.agent.advertise_routes_changed(
+            self.agent.context, self._delta(5, added=['10.0.2.0/24']))
+        self.assertTrue(self.agent.fullsync)
+        self.assertNotIn('10.0.2.0/24', self.agent.advertise_networks)
+
+    def test_failed_sync_schedules_fullsync(self):
+        self.plugin_api.get_peers.side_effect = Exception()
+        self.agent._sync_peers_task(self.agent.context)
+        self.assertTrue(self.agent.fullsync)
+
+    def test_routinginstance_rescheduled_fetches_snapshot(self):
+        self.plugin_api.get_advertise_routes_snapshot.return_value = {
+            'routinginstance_id': RI_ID,
+            'generation': 3,
+            'prefixes': ['10.0.0.0/24']}
+        self.agent.routinginstance_rescheduled(self.agent.context, RI_ID)
+        self.assertEqual(RI_ID, self.agent.routinginstance_id)
+        self.assertEqual(set(['10.0.0.0/24']), self.agent.advertise_networks)
+
+    def test_routinginstance_rescheduled_failure_schedules_fullsync(self):
+        self.agent.fullsync = False
+        self.plugin_api.get_advertise_routes_snapshot.side_effect = (
+            Exception())
+        self.agent.routinginstance_rescheduled(self.agent.context, RI_ID)
+        self.assertTrue(self.agent.fullsync)
+
+    def test_add_remove_routingpeer(self):
+        peer = {'id': _uuid(), 'peer': '10.23.43.22', 'remote_as': 1324,
+                'password': ''}
+        self.agent.add_routingpeer(self.agent.context, peer)
+        self.driver.add_peer.assert_called_once_with('10.23.43.22', 1324,
+                                                     password=None)
+        self.agent.remove_routingpeer(self.agent.context, peer['id'])
+        self.driver.del_peer.assert_called_once_with('10.23.43.22')
+        self.assertEqual({}, self.agent.peers)
+
+
+class TestDRAgentWithFakeSpeaker(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDRAgentWithFakeSpeaker, self).setUp()
+        cfg.CONF.register_opts(dr_agent.DRAgent.OPTS)
+        cfg.CONF.set_override('local_as_number', 12345)
+        cfg.CONF.set_override('router_id', '127.0.0.1')
+        mock.patch.object(dr_agent.DRAgent, 'BGP_DRIVER_CLASS',
+                          fake_bgp_driver.FakeBGPDriver).start()
+        plugin_api_cls_p = mock.patch('neutron.agent.dr_agent.'
+                                      'DRAgentPluginApi')
+        self.plugin_api = plugin_api_cls_p.start().return_value
+        self.plugin_api.get_peers.return_value = []
+        self.agent = dr_agent.DRAgent(HOSTNAME)
+
+    def test_restart_advertises_snapshot_in_one_batch(self):
+        prefixes = ['10.%d.%d.0/24' % (i // 256, i % 256)
+                    for i in range(10000)]
+        self.plugin_api.get_advertise_routes_snapshot.return_value = {
+            'routinginstance_id': RI_ID,
+            'generation': 1,
+            'prefixes': prefixes}
+        self.agent._sync_peers_task(self.agent.context)
+        self.assertEqual(1, len(self.agent.driver.batches))
+        self.assertEqual(set(prefixes), self.agent.driver.advertised_routes)
+
+    def test_delta_withdraws_and_advertises(self):
+        self.plugin_api.get_advertise_routes_snapshot.return_value = {
+            'routinginstance_id': RI_ID,
+            'generation': 1,
+            'prefixes': ['10.0.0.0/24']}
+        self.agent._sync_peers_task(self.agent.context)
+        self.agent.advertise_routes_changed(
+            self.agent.context, {'routinginstance_id': RI_ID,
+                                 'generation': 2,
+                                 'added': ['10.0.1.0/24'],
+                                 'removed': ['10.0.0.0/24']})
+        self.assertEqual(set(['10.0.1.0/24']),
+                         self.agent.driver.advertised_routes)
+
+
+class TestDiscoveredRouteQueue(base.BaseTestCase):
+
+    def test_flapping_prefix_coalesced(self):
+        queue = dr_agent.DiscoveredRouteQueue(100, 10)
+        queue.put('172.16.0.0/16', '10.0.0.1', False)
+        queue.put('172.16.0.0/16', '10.0.0.1', True)
+        queue.put('172.16.0.0/16', '10.0.0.2', False)
+        batches = list(queue.batches())
+        self.assertEqual([[{'destination': '172.16.0.0/16',
+                            'nexthop': '10.0.0.2',
+                            'withdraw': False}]], batches)
+        self.assertEqual(3, queue.stats['received'])
+        self.assertEqual(2, queue.stats['coalesced'])
+        self.assertEqual(0, len(queue))
+
+    def test_batches_bounded_by_batch_size(self):
+        queue = dr_agent.DiscoveredRouteQueue(100, 2)
+        for i in range(5):
+            queue.put('172.16.%d.0/24' % i, '10.0.0.1', False)
+        self.assertEqual([2, 2, 1],
+                         [len(batch) for batch in queue.batches()])
+        self.assertEqual(3, queue.stats['batches'])
+
+    def test_put_reports_full_queue(self):
+        queue = dr_agent.DiscoveredRouteQueue(2, 10)
+        self.assertFalse(queue.put('172.16.0.0/24', '10.0.0.1', False))
+        self.assertTrue(queue.put('172.16.1.0/24', '10.0.0.1', False))
+        self.assertEqual(1, queue.stats['forced_flushes'])
+
+    def test_requeue_keeps_newer_state(self):
+        queue = dr_agent.DiscoveredRouteQueue(100, 10)
+        queue.put('172.16.0.0/16', '10.0.0.1', False)
+        batch = list(queue.batches())[0]
+        queue.put('172.16.0.0/16', '10.0.0.1', True)
+        queue.requeue(batch)
+        self.assertTrue(list(queue.batches())[0][0]['withdraw'])
+
+    def test_acknowledged_nexthop_recorded(self):
+        queue = dr_agent.DiscoveredRouteQueue(100, 10)
+        queue.put('172.16.0.0/16', '10.0.0.1', False)
+        queue.acknowledge(list(queue.batches())[0])
+        queue.put('172.16.0.0/16', '10.0.0.2', False)
+        batch = list(queue.batches())[0]
+        self.assertEqual([{'destination': '172.16.0.0/16',
+                           'nexthop': '10.0.0.2',
+                           'replaces': '10.0.0.1',
+                           'withdraw': False}], batch)
+        queue.acknowledge(batch)
+        queue.put('172.16.0.0/16', '10.0.0.3', True)
+        self.assertEqual([{'destination': '172.16.0.0/16',
+                           'nexthop': '10.0.0.2',
+                           'withdraw': True}], list(queue.batches())[0])
+
+
+class TestDRAgentDiscoveredRoutes(DRAgentTestBase):
+
+    def _event(self, prefix, nexthop='10.0.0.1', is_withdraw=False):
+        return mock.Mock(remote_as=64512, prefix=prefix, nexthop=nexthop,
+                         is_withdraw=is_withdraw)
+
+    def test_best_path_changes_sent_in_one_cast(self):
+        for i in range(10):
+            self.agent.best_path_changed(self._event('172.16.0.0/16'))
+        self.agent.best_path_changed(self._event('172.17.0.0/16'))
+        self.assertFalse(self.plugin_api.put_discoverroutes.called)
+        self.agent._send_discovered_routes()
+        self.plugin_api.put_discoverroutes.assert_called_once_with(
+            self.agent.context, mock.ANY)
+        routes = self.plugin_api.put_discoverroutes.call_args[0][1]
+        self.assertEqual(['172.16.0.0/16', '172.17.0.0/16'],
+                         [route['destination'] for route in routes])
+
+    def test_full_queue_flushed_immediately(self):
+        cfg.CONF.set_override('discovered_routes_max_pending', 2)
+        agent = dr_agent.DRAgent(HOSTNAME)
+        agent.best_path_changed(self._event('172.16.0.0/16'))
+        self.assertFalse(self.plugin_api.put_discoverroutes.called)
+        agent.best_path_changed(self._event('172.17.0.0/16'))
+        self.assertTrue(self.plugin_api.put_discoverroutes.called)
+
+    def test_failed_send_requeued(self):
+        self.plugin_api.put_discoverroutes.side_effect = Exception()
+        self.agent.best_path_changed(self._event('172.16.0.0/16'))
+        self.agent._send_discovered_routes()
+        self.assertEqual(1, len(self.agent.discovered_routes))
+
+    def test_failed_send_not_acknowledged(self):
+        self.plugin_api.put_discoverroutes.side_effect = Exception()
+        self.agent.best_path_changed(self._event('172.16.0.0/16'))
+        self.agent._send_discovered_routes()
+        self.plugin_api.put_discoverroutes.side_effect = None
+        self.agent.best_path_changed(
+            self._event('172.16.0.0/16', nexthop='10.0.0.2'))
+        self.agent._send_discovered_routes()
+        routes = self.plugin_api.put_discoverroutes.call_args[0][1]
+        self.assertNotIn('replaces', routes[0])
@@ -12,6 +12,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 import contextlib
+
+import mock
 from oslo.config import cfg
 
 from neutron.api.v2 import attributes
@@ -21,6 +23,7 @@ from neutron.db import dr_db
 from neutron.extensions import agent
 from neutron.extensions import dr_agentscheduler as dras
 from neutron.extensions import dynamic_routing
+from neutron import manager
 from neutron.openstack.common import importutils
 from neutron.openstack.common import uuidutils
 from neutron.tests.unit import test_agent_ext_plugin
@@ -233,6 +236,163 @@ class DynamicRoutingBaseTestCase(DynamicRoutingEntityCreationMixin):
             self.assertIn('5.62.23.123/32',
                           body['routinginstance']['advertise_routes'])
 
+    def test_routinginstance_advertise_routes_generation(self):
+        with self.routinginstance() as ri:
+            routinginstance_id = ri['routinginstance']['id']
+            plugin = manager.NeutronManager.get_plugin()
+            ctx = context.get_admin_context()
+            with mock.patch.object(
+                    plugin, '_notify_advertise_routes_changed') as notify:
+                data = {'routinginstance': {
+                           'advertise_routes': ['12.43.5.0/24']}}
+                self._update('routinginstances', routinginstance_id, data)
+                notify.assert_called_once_with(
+                    mock.ANY, routinginstance_id, 1, ['12.43.5.0/24'], [])
+
+                # Unchanged routes do not bump the generation.
+                notify.reset_mock()
+                self._update('routinginstances', routinginstance_id, data)
+                self.assertFalse(notify.called)
+
+            snapshot = plugin.get_advertise_routes_snapshot(
+                ctx, routinginstance_id)
+            self.assertEqual(1, snapshot['generation'])
+            self.assertEqual(['12.43.5.0/24'], snapshot['prefixes'])
+
+    def test_routinginstance_snapshot_includes_network_subnets(self):
+        with self.subnet(cidr='10.10.0.0/24') as subnet:
+            with self.routinginstance() as ri:
+                routinginstance_id = ri['routinginstance']['id']
+                data = {'network_id': subnet['subnet']['network_id']}
+                req = self.new_create_request(
+                    'routinginstances', data, self.fmt, routinginstance_id,
+                    'networks')
+                res = req.get_response(self.ext_api)
+                self.assertEqual(res.status_int, exc.HTTPCreated.code)
+
+                plugin = manager.NeutronManager.get_plugin()
+                snapshot = plugin.get_advertise_routes_snapshot(
+                    context.get_admin_context(), routinginstance_id)
+                self.assertEqual(1, snapshot['generation'])
+                self.assertEqual(['10.10.0.0/24'], snapshot['prefixes'])
+
+    def test_routinginstance_bulk_add_remove_networks(self):
+        with contextlib.nested(self.subnet(cidr='10.10.0.0/24'),
+                               self.subnet(cidr='10.20.0.0/24'),
+                               self.routinginstance()) as (sub1, sub2, ri):
+            routinginstance_id = ri['routinginstance']['id']
+            net_ids = [sub1['subnet']['network_id'],
+                       sub2['subnet']['network_id']]
+            plugin = manager.NeutronManager.get_plugin()
+            ctx = context.get_admin_context()
+            with mock.patch.object(
+                    plugin, '_notify_advertise_routes_changed') as notify:
+                added = plugin.add_networks_to_routinginstance(
+                    ctx, routinginstance_id, net_ids)
+                self.assertEqual(sorted(net_ids), added)
+                notify.assert_called_once_with(
+                    mock.ANY, routinginstance_id, 1,
+                    ['10.10.0.0/24', '10.20.0.0/24'], [])
+
+                # Already associated networks are skipped
+                self.assertEqual([], plugin.add_networks_to_routinginstance(
+                    ctx, routinginstance_id, net_ids))
+                nets = plugin.list_networks_on_routinginstance(
+                    ctx, routinginstance_id)['networks']
+                self.assertEqual(sorted(net_ids),
+                                 sorted(net['id'] for net in nets))
+
+                notify.reset_mock()
+                removed = plugin.remove_networks_from_routinginstance(
+                    ctx, routinginstance_id, net_ids[:1])
+                self.assertEqual(net_ids[:1], removed)
+                notify.assert_called_once_with(
+                    mock.ANY, routinginstance_id, 2, [], ['10.10.0.0/24'])
+
+            self.assertEqual(
+                {routinginstance_id: ['10.20.0.0/24']},
+                plugin.get_advertise_prefixes(ctx, [routinginstance_id]))
+
+    def test_routinginstance_advertise_toggle(self):
+        with self.routinginstance(advertise=False) as ri:
+            routinginstance_id = ri['routinginstance']['id']
+            plugin = manager.NeutronManager.get_plugin()
+            ctx = context.get_admin_context()
+            with mock.patch.object(
+                    plugin, '_notify_advertise_routes_changed') as notify:
+                self._update('routinginstances', routinginstance_id,
+                             {'routinginstance': {
+                                 'advertise_routes': ['12.43.5.0/24']}})
+                self.assertFalse(notify.called)
+                snapshot = plugin.get_advertise_routes_snapshot(
+                    ctx, routinginstance_id)
+                self.assertEqual([], snapshot['prefixes'])
+
+                self._update('routinginstances', routinginstance_id,
+                             {'routinginstance': {'advertise': True}})
+                notify.assert_called_once_with(
+                    mock.ANY, routinginstance_id, 1, ['12.43.5.0/24'], [])
+
+                notify.reset_mock()
+                self._update('routinginstances', routinginstance_id,
+                             {'routinginstance': {'advertise': False}})
+                notify.assert_called_once_with(
+                    mock.ANY, routinginstance_id, 2, [], ['12.43.5.0/24'])
+
+    def test_remove_network_keeps_prefix_still_advertised(self):
+        with contextlib.nested(self.subnet(cidr='10.10.0.0/24'),
+                               self.routinginstance()) as (subnet, ri):
+            routinginstance_id = ri['routinginstance']['id']
+            network_id = subnet['subnet']['network_id']
+            plugin = manager.NeutronManager.get_plugin()
+            ctx = context.get_admin_context()
+            self._update('routinginstances', routinginstance_id,
+                         {'routinginstance': {
+                             'advertise_routes': ['10.10.0.0/24']}})
+            plugin.add_network_to_routinginstance(ctx, routinginstance_id,
+                                                  network_id)
+            with mock.patch.object(
+                    plugin, '_notify_advertise_routes_changed') as notify:
+                plugin.remove_network_from_routinginstance(
+                    ctx, routinginstance_id, network_id)
+                self.assertFalse(notify.called)
+            snapshot = plugin.get_advertise_routes_snapshot(
+                ctx, routinginstance_id)
+            self.assertEqual(['10.10.0.0/24'], snapshot['prefixes'])
+
+    def test_subnet_changes_bump_generation(self):
+        with contextlib.nested(self.network(),
+                               self.routinginstance()) as (network, ri):
+            routinginstance_id = ri['routinginstance']['id']
+            plugin = manager.NeutronManager.get_plugin()
+            ctx = context.get_admin_context()
+            plugin.add_network_to_routinginstance(
+                ctx, routinginstance_id, network['network']['id'])
+            with self.subnet(network=network, cidr='10.30.0.0/24'):
+                snapshot = plugin.get_advertise_routes_snapshot(
+                    ctx, routinginstance_id)
+                self.assertEqual(1, snapshot['generation'])
+                self.assertEqual(['10.30.0.0/24'], snapshot['prefixes'])
+            snapshot = plugin.get_advertise_routes_snapshot(
+                ctx, routinginstance_id)
+            self.assertEqual(2, snapshot['generation'])
+            self.assertEqual([], snapshot['prefixes'])
+
+    def test_get_advertise_prefixes_many_instances(self):
+        with contextlib.nested(self.routinginstance(),
+                               self.routinginstance()) as (ri1, ri2):
+            ri_ids = [ri1['routinginstance']['id'],
+                      ri2['routinginstance']['id']]
+            for ri_id, route in zip(ri_ids, ['10.1.0.0/16', '10.2.0.0/16']):
+                self._update('routinginstances', ri_id,
+                             {'routinginstance': {
+                                 'advertise_routes': [route]}})
+            plugin = manager.NeutronManager.get_plugin()
+            prefixes = plugin.get_advertise_prefixes(
+                context.get_admin_context(), ri_ids)
+            self.assertEqual({ri_ids[0]: ['10.1.0.0/16'],
+                              ri_ids[1]: ['10.2.0.0/16']}, prefixes)
+
     def test_routingpeer_show_non_existent(self):
         req = self.new_show_request('routingpeers', _uuid(), fmt=self.fmt)
         res = req.get_response(self.ext_api)
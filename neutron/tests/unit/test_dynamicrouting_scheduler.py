@@ -13,6 +13,7 @@
 # under the License.
 import contextlib
 import mock
+import os
 import time
 
 from oslo.config import cfg
@@ -23,6 +24,7 @@ from neutron.extensions import agent
 from neutron.extensions import dr_agentscheduler as dras
 from neutron.extensions import dynamic_routing
 from neutron import manager
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common import uuidutils
 from neutron.tests.unit import test_agent_ext_plugin
 from neutron.tests.unit import test_db_plugin
@@ -163,6 +165,23 @@ class DynamicRoutingSchedulerTestCase(
                 self.adminContext, 'host2')
             self.assertEqual(len(r), 0)
 
+    def test_list_advertise_routes_on_dr_agent(self):
+        with self.routinginstance() as ri:
+            routinginstance_id = ri['routinginstance']['id']
+            self._update('routinginstances', routinginstance_id,
+                         {'routinginstance': {
+                             'advertise_routes': ['10.1.0.0/16']}})
+            self._register_one_dr_agent(host='host1')
+            self.plugin.auto_schedule_routinginstances(
+                self.adminContext, 'host1')
+            self.assertEqual(
+                {routinginstance_id: ['10.1.0.0/16']},
+                self.plugin.list_advertise_routes_on_dr_agent(
+                    self.adminContext, 'host1'))
+            self.assertEqual(
+                {}, self.plugin.list_advertise_routes_on_dr_agent(
+                    self.adminContext, 'host2'))
+
     def test_behaviour_when_agent_down(self):
         """Check nothing will raise an exception if agent down."""
         with contextlib.nested(
@@ -253,3 +272,117 @@ class DynamicRoutingSchedulerTestCase(
         auto_sp = self.plugin.auto_schedule_routingpeers(
                       self.adminContext, 'host1')
         self.assertFalse(auto_sp)
+
+
+class LeastLoadedDynamicRoutingSchedulerTestCase(
+    test_db_plugin.NeutronDbPluginV2TestCase,
+    test_agent_ext_plugin.AgentDBTestMixIn,
+    test_dynamicrouting_plugin.DynamicRoutingEntityCreationMixin):
+
+    def setUp(self):
+        cfg.CONF.set_override('dynamic_routing_scheduler_driver',
+                              'neutron.scheduler.dr_agent_scheduler.'
+                              'LeastLoadedDynamicRoutingScheduler')
+        ext_mgr = DynamicRoutingTestExtensionManager()
+        super(LeastLoadedDynamicRoutingSchedulerTestCase, self).setUp(
+            plugin=DB_PLUGIN_KLASS, ext_mgr=ext_mgr)
+        self.adminContext = n_context.get_admin_context()
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.notifier = mock.Mock()
+        self.plugin._dr_rpc_notifier = self.notifier
+
+    def _agent_id(self, host):
+        return [agent['id'] for agent in
+                self.plugin.get_agents(self.adminContext)
+                if agent['host'] == host][0]
+
+    def _peers_on_host(self, host):
+        return self.plugin.list_active_sync_routingpeers_on_dr_agent(
+            self.adminContext, host)
+
+    def test_routingpeers_spread_across_agents(self):
+        self._register_one_dr_agent(host='host1')
+        self._register_one_dr_agent(host='host2')
+        with contextlib.nested(
+                self.routingpeer(peer='10.0.0.1'),
+                self.routingpeer(peer='10.0.0.2'),
+                self.routingpeer(peer='10.0.0.3'),
+                self.routingpeer(peer='10.0.0.4')):
+            self.assertEqual(2, len(self._peers_on_host('host1')))
+            self.assertEqual(2, len(self._peers_on_host('host2')))
+            self.assertEqual(4, self.notifier.add_routingpeer.call_count)
+
+    def test_routinginstances_go_to_free_agents(self):
+        self._register_one_dr_agent(host='host1')
+        self._register_one_dr_agent(host='host2')
+        with contextlib.nested(
+                self.routinginstance(nexthop='10.0.0.1'),
+                self.routinginstance(nexthop='10.0.0.2')):
+            for host in ('host1', 'host2'):
+                self.assertEqual(
+                    1, len(self.plugin.
+                           list_active_sync_routinginstances_on_dr_agent(
+                               self.adminContext, host)))
+
+    def test_rebalance_moves_bindings_off_dead_agent(self):
+        self._register_one_dr_agent(host='host1')
+        with self.routingpeer() as rp:
+            self._register_one_dr_agent(host='host2')
+            with mock.patch.object(self.plugin, 'agent_notifiers',
+                                   return_value=[]):
+                self.plugin.update_agent(
+                    self.adminContext, self._agent_id('host1'),
+                    {'agent': {'admin_state_up': False}})
+            moves = self.plugin.rebalance_dr_agents(self.adminContext)
+            self.assertEqual(1, len(moves))
+            self.assertEqual(rp['routingpeer']['id'], moves[0]['id'])
+            self.assertEqual([rp['routingpeer']['id']],
+                             self._peers_on_host('host2'))
+            self.notifier.remove_routingpeer.assert_called_once_with(
+                mock.ANY, rp['routingpeer']['id'], 'host1')
+
+    def test_rebalance_notifies_rescheduled_routinginstance(self):
+        self._register_one_dr_agent(host='host1')
+        with self.routinginstance() as ri:
+            self._register_one_dr_agent(host='host2')
+            with mock.patch.object(self.plugin, 'agent_notifiers',
+                                   return_value=[]):
+                self.plugin.update_agent(
+                    self.adminContext, self._agent_id('host1'),
+                    {'agent': {'admin_state_up': False}})
+            self.plugin.rebalance_dr_agents(self.adminContext)
+            ri_id = ri['routinginstance']['id']
+            self.assertEqual(
+                [mock.call(mock.ANY, ri_id, 'host1'),
+                 mock.call(mock.ANY, ri_id, 'host2')],
+                self.notifier.routinginstance_rescheduled.call_args_list)
+
+    def test_periodic_rebalance_stops_in_forked_workers(self):
+        self.plugin._rebalance_pid = os.getpid() + 1
+        with mock.patch.object(self.plugin,
+                               'rebalance_dr_agents') as rebalance:
+            self.assertRaises(loopingcall.LoopingCallDone,
+                              self.plugin._periodic_rebalance)
+            self.assertFalse(rebalance.called)
+
+    def test_rebalance_evens_out_overloaded_agent(self):
+        cfg.CONF.set_override('dynamic_routing_rebalance_threshold', 1)
+        self._register_one_dr_agent(host='host1')
+        with contextlib.nested(
+                self.routingpeer(peer='10.0.0.1'),
+                self.routingpeer(peer='10.0.0.2'),
+                self.routingpeer(peer='10.0.0.3'),
+                self.routingpeer(peer='10.0.0.4')):
+            self._register_one_dr_agent(host='host2')
+            self.assertEqual(4, len(self._peers_on_host('host1')))
+            moves = self.plugin.rebalance_dr_agents(self.adminContext)
+            self.assertEqual(2, len(moves))
+            self.assertEqual(2, len(self._peers_on_host('host1')))
+            self.assertEqual(2, len(self._peers_on_host('host2')))
+
+    def test_rebalance_nothing_to_move(self):
+        self._register_one_dr_agent(host='host1')
+        self._register_one_dr_agent(host='host2')
+        with self.routingpeer():
+            self.assertEqual(
+                [], self.plugin.rebalance_dr_agents(self.adminContext))
@@ -0,0 +1,90 @@
+# Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+
+class TestIpsetManager(base.BaseTestCase):
+    def setUp(self):
+        super(TestIpsetManager, self).setUp()
+        self.execute = mock.patch(
+            'neutron.agent.linux.utils.execute').start()
+        self.ipset = ipset_manager.IpsetManager(root_helper='sudo')
+
+    def _assert_restore(self, lines):
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'], root_helper='sudo',
+            process_input='\n'.join(lines) + '\n')
+
+    def test_get_ipset_name(self):
+        name = ipset_manager.get_ipset_name(
+            'N', 'IPv6', '0b6d59c8-8a5f-4f0a-9e4b-3c0a1c8c1f2e')
+        self.assertEqual('NIPv60b6d59c8-8a5f-4f0a-9e4b-3c', name)
+        self.assertEqual(ipset_manager.IPSET_NAME_MAX_LENGTH, len(name))
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members('set1', 'IPv6', ['fe80::1/128'])
+        self._assert_restore(['create set1 hash:net family inet6',
+                              'flush set1',
+                              'add set1 fe80::1/128'])
+
+    def test_set_members_applies_delta(self):
+        self.ipset.set_members('set1', 'IPv4', ['10.0.0.1', '10.0.0.2'])
+        self.execute.reset_mock()
+        self.ipset.set_members('set1', 'IPv4', ['10.0.0.2', '10.0.0.3'])
+        self._assert_restore(['add set1 10.0.0.3', 'del set1 10.0.0.1'])
+        self.assertEqual(set(['10.0.0.2', '10.0.0.3']),
+                         self.ipset.ipsets['set1'])
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members('set1', 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members('set1', 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_destroy(self):
+        self.ipset.set_members('set1', 'IPv4', [])
+        self.ipset.destroy('set1')
+        self.execute.assert_called_with(['ipset', 'destroy', 'set1'],
+                                        root_helper='sudo',
+                                        process_input=None)
+        self.assertEqual({}, self.ipset.ipsets)
+
+    def test_destroy_unknown(self):
+        self.ipset.set_members('NIPv4known', 'IPv4', [])
+        self.execute.reset_mock()
+        self.execute.side_effect = ['NIPv4known\nNIPv6stale\nother\n', '']
+        self.ipset.destroy_unknown(['NIPv4', 'NIPv6'])
+        self.assertEqual(
+            [mock.call(['ipset', 'list', '-name'], root_helper='sudo',
+                       process_input=None),
+             mock.call(['ipset', 'destroy', 'NIPv6stale'],
+                       root_helper='sudo', process_input=None)],
+            self.execute.mock_calls)
+
+    def test_destroy_unknown_keeps_used_set(self):
+        self.execute.side_effect = ['NIPv4used\n', RuntimeError()]
+        self.ipset.destroy_unknown(['NIPv4'])
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_namespace(self):
+        self.ipset = ipset_manager.IpsetManager(root_helper='sudo',
+                                                namespace='ns')
+        self.ipset.set_members('set1', 'IPv4', [])
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'ipset', 'restore', '-exist'],
+            root_helper='sudo', process_input=mock.ANY)
@@ -58,6 +58,14 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                 'fixed_ips': [FAKE_IP['IPv4'],
                               FAKE_IP['IPv6']]}
 
+    def test_incremental_iptables(self):
+        cfg.CONF.set_override('incremental_iptables', True, 'SECURITYGROUP')
+        with mock.patch('neutron.agent.linux.iptables_manager.'
+                        'IptablesManager') as iptables_cls:
+            iptables_firewall.IptablesFirewallDriver()
+        iptables_cls.assert_called_once_with(
+            root_helper=mock.ANY, use_ipv6=True, incremental=True)
+
     def test_prepare_port_filter_with_no_sg(self):
         port = self._fake_port()
         self.firewall.prepare_port_filter(port)
@@ -1221,3 +1229,107 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  mock.call.add_rule('ofake_dev', '-j $sg-fallback'),
                  mock.call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallIpsetTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+        cfg.CONF.register_opts(a_cfg.ROOT_HELPER_OPTS, 'AGENT')
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        self.execute = mock.patch(
+            'neutron.agent.linux.utils.execute').start()
+        self.execute.return_value = ''
+        iptables_cls = mock.patch(
+            'neutron.agent.linux.iptables_manager.IptablesManager').start()
+        self.iptables_inst = mock.Mock()
+        self.v4filter_inst = mock.Mock()
+        self.v6filter_inst = mock.Mock()
+        self.iptables_inst.ipv4 = {'filter': self.v4filter_inst}
+        self.iptables_inst.ipv6 = {'filter': self.v6filter_inst}
+        iptables_cls.return_value = self.iptables_inst
+        self.firewall = iptables_firewall.IptablesFirewallDriver()
+
+    def _fake_port(self, members):
+        rules = [{'ethertype': 'IPv4', 'direction': 'ingress',
+                  'protocol': 'tcp', 'port_range_min': 22,
+                  'port_range_max': 22, 'remote_group_id': 'fake_sgid',
+                  'source_ip_prefix': member} for member in members]
+        return {'device': 'tapfake_dev',
+                'mac_address': 'ff:ff:ff:ff:ff:ff',
+                'fixed_ips': [FAKE_IP['IPv4']],
+                'security_group_rules': rules,
+                'security_group_source_groups': ['fake_sgid']}
+
+    def _ipset_restores(self):
+        return [call[1]['process_input']
+                for call in self.execute.call_args_list
+                if call[0][0] == ['ipset', 'restore', '-exist']]
+
+    def test_prepare_port_filter_uses_one_rule_per_group(self):
+        self.firewall.prepare_port_filter(
+            self._fake_port(['10.0.0.2/32', '10.0.0.3/32']))
+        rule = ('-p tcp -m set --match-set NIPv4fake_sgid src '
+                '-m tcp --dport 22 -j RETURN')
+        rules = [call[1] for call in self.v4filter_inst.add_rule.mock_calls
+                 if call[1][0] == 'ifake_dev']
+        self.assertEqual(1, rules.count(('ifake_dev', rule)))
+        self.assertEqual(['create NIPv4fake_sgid hash:net family inet\n'
+                          'flush NIPv4fake_sgid\n'
+                          'add NIPv4fake_sgid 10.0.0.2/32\n'
+                          'add NIPv4fake_sgid 10.0.0.3/32\n'],
+                         self._ipset_restores())
+
+    def test_member_update_only_updates_ipset(self):
+        self.firewall.prepare_port_filter(
+            self._fake_port(['10.0.0.2/32', '10.0.0.3/32']))
+        self.iptables_inst.reset_mock()
+        self.v4filter_inst.reset_mock()
+        self.execute.reset_mock()
+        self.firewall.update_port_filter(
+            self._fake_port(['10.0.0.3/32', '10.0.0.4/32']))
+        self.assertFalse(self.iptables_inst.apply.called)
+        self.assertFalse(self.v4filter_inst.add_rule.called)
+        self.assertEqual(['add NIPv4fake_sgid 10.0.0.4/32\n'
+                          'del NIPv4fake_sgid 10.0.0.2/32\n'],
+                         self._ipset_restores())
+
+    def test_deferred_member_update_only_updates_ipset(self):
+        self.firewall.prepare_port_filter(self._fake_port(['10.0.0.2/32']))
+        self.v4filter_inst.reset_mock()
+        self.execute.reset_mock()
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(
+                self._fake_port(['10.0.0.4/32']))
+        self.assertFalse(self.v4filter_inst.add_rule.called)
+        self.iptables_inst.defer_apply_off.assert_called_once_with(
+            apply=False)
+        self.assertEqual(['add NIPv4fake_sgid 10.0.0.4/32\n'
+                          'del NIPv4fake_sgid 10.0.0.2/32\n'],
+                         self._ipset_restores())
+
+    def test_rule_update_rewrites_iptables(self):
+        self.firewall.prepare_port_filter(self._fake_port(['10.0.0.2/32']))
+        self.iptables_inst.reset_mock()
+        port = self._fake_port(['10.0.0.2/32'])
+        port['security_group_rules'][0]['port_range_max'] = 23
+        self.firewall.update_port_filter(port)
+        self.iptables_inst.apply.assert_called_once_with()
+
+    def test_unknown_ipsets_destroyed_once(self):
+        self.execute.return_value = 'NIPv4fake_sgid\nNIPv6stale\n'
+        self.firewall.prepare_port_filter(self._fake_port(['10.0.0.2/32']))
+        self.firewall.prepare_port_filter(self._fake_port(['10.0.0.3/32']))
+        calls = [call[0][0] for call in self.execute.call_args_list
+                 if call[0][0][1] != 'restore']
+        self.assertEqual([['ipset', 'list', '-name'],
+                          ['ipset', 'destroy', 'NIPv6stale']], calls)
+
+    def test_remove_port_filter_destroys_unused_ipset(self):
+        port = self._fake_port(['10.0.0.2/32'])
+        self.firewall.prepare_port_filter(port)
+        self.firewall.remove_port_filter(port)
+        self.execute.assert_called_with(['ipset', 'destroy',
+                                         'NIPv4fake_sgid'],
+                                        root_helper=mock.ANY,
+                                        process_input=None)
+        self.assertEqual({}, self.firewall.ipset.ipsets)
@@ -692,6 +692,14 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         ret_str = self._test_find_last_entry(find_str)
         self.assertIsNone(ret_str)
 
+    def test_defer_apply_off_without_apply(self):
+        self.iptables.defer_apply_on()
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP')
+        self.iptables.apply()
+        self.iptables.defer_apply_off(apply=False)
+        self.assertFalse(self.execute.called)
+        self.assertFalse(self.iptables.iptables_apply_deferred)
+
 
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
@@ -701,3 +709,96 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_nat_not_found(self):
         self.assertNotIn('nat', self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper='sudo', state_less=True, incremental=True)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        self.filter = self.iptables.ipv4['filter']
+        self.filter.add_chain('port1')
+        self.filter.add_rule('port1', '-j DROP')
+        self.filter.add_rule('FORWARD', '-j $port1')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _assert_noflush_restore(self, lines):
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'],
+            process_input='\n'.join(lines) % IPTABLES_ARG,
+            root_helper='sudo')
+
+    def test_first_apply_is_full(self):
+        self.iptables = iptables_manager.IptablesManager(
+            state_less=True, incremental=True)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.assertEqual(
+            [mock.call(['iptables-save', '-c'], root_helper=None),
+             mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                       root_helper=None)],
+            self.execute.call_args_list)
+
+    def test_apply_writes_changed_chains_only(self):
+        self.filter.add_chain('port2')
+        self.filter.add_rule('port2', '-j ACCEPT')
+        self.filter.add_rule('FORWARD', '-j $port2')
+        self.iptables.apply()
+        self._assert_noflush_restore(
+            ['*filter',
+             ':%(bn)s-FORWARD - [0:0]',
+             ':%(bn)s-port2 - [0:0]',
+             '-A %(bn)s-FORWARD -j %(bn)s-port1',
+             '-A %(bn)s-FORWARD -j %(bn)s-port2',
+             '-A %(bn)s-port2 -j ACCEPT',
+             'COMMIT'])
+
+    def test_apply_unchanged_chains(self):
+        self.filter.remove_chain('port1')
+        self.filter.add_chain('port1')
+        self.filter.add_rule('port1', '-j DROP')
+        self.filter.add_rule('FORWARD', '-j $port1')
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_removed_chain(self):
+        self.filter.remove_chain('port1')
+        self.iptables.apply()
+        self._assert_noflush_restore(
+            ['*filter',
+             ':%(bn)s-FORWARD - [0:0]',
+             ':%(bn)s-port1 - [0:0]',
+             '-X %(bn)s-port1',
+             'COMMIT'])
+
+    def test_apply_duplicate_rules(self):
+        self.filter.add_rule('port1', '-j ACCEPT')
+        self.filter.add_rule('port1', '-j DROP')
+        self.iptables.apply()
+        self._assert_noflush_restore(
+            ['*filter',
+             ':%(bn)s-port1 - [0:0]',
+             '-A %(bn)s-port1 -j ACCEPT',
+             '-A %(bn)s-port1 -j DROP',
+             'COMMIT'])
+
+    def test_apply_unwrapped_chain_change_is_full(self):
+        self.filter.add_rule('FORWARD', '-j ACCEPT', wrap=False)
+        self.iptables.apply()
+        self.assertEqual(['iptables-save', '-c'],
+                         self.execute.call_args_list[0][0][0])
+
+    def test_apply_after_failure_is_full(self):
+        self.filter.add_rule('port1', '-j ACCEPT')
+        self.execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self.iptables.apply()
+        self.assertEqual(['iptables-save', '-c'],
+                         self.execute.call_args_list[0][0][0])
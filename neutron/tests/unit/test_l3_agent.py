@@ -705,6 +705,86 @@ class TestBasicRouterOperations(base.BaseTestCase):
         ri.router['gw_port_host'] = None
         self._test_process_router(ri)
 
+    def _prepare_reconcile_agent(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.process_router_floating_ip_addresses = mock.Mock(
+            return_value={})
+        agent.process_router_floating_ip_nat_rules = mock.Mock()
+        agent._get_existing_devices = mock.Mock(return_value=[])
+        agent._handle_router_snat_rules = mock.Mock()
+        return agent
+
+    def test_process_router_unchanged_skips_reconcile(self):
+        agent = self._prepare_reconcile_agent()
+        router = prepare_router_data()
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.process_router(ri)
+        self.assertEqual(1, agent._get_existing_devices.call_count)
+        self.assertEqual(1, agent._handle_router_snat_rules.call_count)
+        self.assertEqual(1, self.plugin_api.update_floatingip_statuses.
+                         call_count)
+
+        ri.router = copy.deepcopy(router)
+        agent.process_router(ri)
+        self.assertEqual(1, agent._get_existing_devices.call_count)
+        self.assertEqual(1, agent._handle_router_snat_rules.call_count)
+        self.assertEqual(
+            1, agent.process_router_floating_ip_addresses.call_count)
+        self.assertEqual(1, self.plugin_api.update_floatingip_statuses.
+                         call_count)
+
+    def test_process_router_floating_ip_change_only(self):
+        agent = self._prepare_reconcile_agent()
+        router = prepare_router_data()
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.process_router(ri)
+
+        router = copy.deepcopy(router)
+        router[l3_constants.FLOATINGIP_KEY] = [
+            {'id': _uuid(),
+             'floating_ip_address': '8.8.8.8',
+             'fixed_ip_address': '7.7.7.7',
+             'port_id': _uuid()}]
+        ri.router = router
+        agent.process_router(ri)
+        self.assertEqual(1, agent._get_existing_devices.call_count)
+        self.assertEqual(1, agent._handle_router_snat_rules.call_count)
+        self.assertEqual(
+            2, agent.process_router_floating_ip_addresses.call_count)
+        self.assertEqual(
+            2, agent.process_router_floating_ip_nat_rules.call_count)
+
+    def test_process_router_removed_port_lists_devices(self):
+        agent = self._prepare_reconcile_agent()
+        agent.internal_network_removed = mock.Mock()
+        router = prepare_router_data(num_internal_ports=2)
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.process_router(ri)
+
+        router = copy.deepcopy(router)
+        del router[l3_constants.INTERFACE_KEY][1]
+        ri.router = router
+        agent.process_router(ri)
+        self.assertEqual(2, agent._get_existing_devices.call_count)
+        self.assertEqual(2, agent._handle_router_snat_rules.call_count)
+
+    def test_process_router_failure_forces_full_reconcile(self):
+        agent = self._prepare_reconcile_agent()
+        router = prepare_router_data()
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        with mock.patch.object(agent, 'routes_updated',
+                               side_effect=RuntimeError):
+            self.assertRaises(RuntimeError, agent.process_router, ri)
+        self.assertIsNone(ri.applied_state)
+
+        agent.process_router(ri)
+        self.assertEqual(2, agent._get_existing_devices.call_count)
+        self.assertIsNotNone(ri.applied_state)
+
     def _test_process_router(self, ri):
         router = ri.router
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -1532,6 +1612,52 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self.assertEqual(['1234'], agent._router_ids())
         self.assertFalse(agent._clean_stale_namespaces)
 
+    def test_router_processing_workers_zero_rejected(self):
+        self.conf.set_override('router_processing_workers', 0)
+        self.assertRaises(SystemExit, l3_agent.L3NATAgent,
+                          HOSTNAME, self.conf)
+
+    def test_process_routers_loop_pool_size(self):
+        self.conf.set_override('router_processing_workers', 32)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(l3_agent.eventlet, 'GreenPool') as pool:
+            pool.return_value.spawn_n.side_effect = [None, None,
+                                                     StopIteration]
+            self.assertRaises(StopIteration, agent._process_routers_loop)
+        pool.assert_called_once_with(size=32)
+        self.assertEqual(3, pool.return_value.spawn_n.call_count)
+
+    def test_process_router_update_records_time(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid()}
+        agent._queue.add(l3_agent.RouterUpdate(router['id'],
+                                               l3_agent.PRIORITY_RPC,
+                                               router=router))
+        with contextlib.nested(
+            mock.patch.object(agent, '_process_routers'),
+            mock.patch.object(l3_agent.time, 'time',
+                              side_effect=[10.0, 12.5])):
+            agent._process_router_update()
+        self.assertEqual({router['id']: 2.5}, agent.router_processing_times)
+        self.assertEqual({'routers': 1, 'average_time': 2.5,
+                          'max_time': 2.5},
+                         agent.get_router_processing_stats())
+
+    def test_process_router_update_removed_router_drops_time(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent.router_processing_times[router_id] = 1.0
+        agent._queue.add(l3_agent.RouterUpdate(router_id,
+                                               l3_agent.PRIORITY_RPC,
+                                               action=l3_agent.DELETE_ROUTER))
+        with mock.patch.object(agent, '_router_removed') as removed:
+            agent._process_router_update()
+        removed.assert_called_once_with(router_id)
+        self.assertEqual({}, agent.router_processing_times)
+        self.assertEqual({'routers': 0, 'average_time': 0.0,
+                          'max_time': 0.0},
+                         agent.get_router_processing_stats())
+
     def test_process_routers_with_no_ext_net_in_conf(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = 'aaa'
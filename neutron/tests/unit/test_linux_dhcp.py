@@ -14,8 +14,10 @@
 #    under the License.
 
 import contextlib
+import io
 import os
 
+import fixtures
 import mock
 from oslo.config import cfg
 import testtools
@@ -1208,7 +1210,62 @@ tag:tag0,option:router""".lstrip()
                 mock.call(exp_addn_name, exp_addn_data),
                 mock.call(exp_opt_name, exp_opt_data),
             ])
-            mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
+            # The config files are read as well, to compare them
+            mock_open.assert_any_call('/proc/5/cmdline', 'r')
+
+    def test_reload_allocations_unchanged(self):
+        fake_net = FakeDualNetwork()
+        dm = dhcp.Dnsmasq(self.conf, fake_net,
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+
+        with contextlib.nested(
+            mock.patch('os.path.isdir', return_value=True),
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, 'interface_name'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map'),
+            mock.patch.object(dhcp.Dnsmasq, '_release_unused_leases'),
+            mock.patch.object(dm, 'device_manager')
+        ) as (isdir, active, pid, interface_name, ip_map, release,
+              device_manager):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            interface_name.__get__ = mock.Mock(return_value='tap12345678-12')
+            ip_map.return_value = {}
+            files = {}
+            self.safe.side_effect = files.__setitem__
+            dm.reload_allocations()
+            self.assertEqual(3, self.safe.call_count)
+            self.assertEqual(1, self.execute.call_count)
+
+            with mock.patch('__builtin__.open') as mock_open:
+                mock_open.side_effect = (
+                    lambda name: io.BytesIO(files[name]))
+                dm.reload_allocations()
+            self.assertEqual(3, self.safe.call_count)
+            self.assertEqual(1, self.execute.call_count)
+            self.assertEqual(2, device_manager.update.call_count)
+
+    def test_replace_file_if_changed(self):
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork())
+        dm._conf_files_changed = False
+        filename = os.path.join(self.useFixture(
+            fixtures.TempDir()).path, 'host')
+
+        def replace_file(name, data):
+            with open(name, 'w') as f:
+                f.write(data)
+
+        self.safe.side_effect = replace_file
+
+        dm._replace_file_if_changed(filename, 'data')
+        self.assertTrue(dm._conf_files_changed)
+        dm._conf_files_changed = False
+        dm._replace_file_if_changed(filename, 'data')
+        self.assertFalse(dm._conf_files_changed)
+        dm._replace_file_if_changed(filename, 'other data')
+        self.assertTrue(dm._conf_files_changed)
+        self.assertEqual(2, self.safe.call_count)
 
     def test_release_unused_leases(self):
         dnsmasq = dhcp.Dnsmasq(self.conf, FakeDualNetwork())
@@ -45,6 +45,8 @@ class FakeConf(object):
     nova_client_cert = 'nova_cert'
     nova_client_priv_key = 'nova_priv_key'
     cache_url = ''
+    port_index_ttl = 0
+    port_index_negative_ttl = 2
 
 
 class FakeConfCache(FakeConf):
@@ -407,6 +409,121 @@ class TestMetadataProxyHandlerNoCache(TestMetadataProxyHandlerCache):
             2, self.qclient.return_value.list_ports.call_count)
 
 
+class FakeConfPortIndex(FakeConf):
+    port_index_ttl = 5
+
+
+class TestMetadataProxyHandlerPortIndex(base.BaseTestCase):
+    def setUp(self):
+        super(TestMetadataProxyHandlerPortIndex, self).setUp()
+        self.qclient_p = mock.patch('neutronclient.v2_0.client.Client')
+        self.qclient = self.qclient_p.start()
+        self.list_ports = self.qclient.return_value.list_ports
+        self.list_ports.return_value = {'ports': [
+            {'network_id': 'net1', 'device_id': 'device1',
+             'tenant_id': 'tenant1',
+             'fixed_ips': [{'ip_address': '10.0.0.2'}]},
+            {'network_id': 'net2', 'device_id': 'device2',
+             'tenant_id': 'tenant2',
+             'fixed_ips': [{'ip_address': '10.0.1.2'}]}]}
+        self.time_p = mock.patch('time.time', return_value=100)
+        self.time = self.time_p.start()
+        self.handler = agent.MetadataProxyHandler(FakeConfPortIndex)
+
+    def _get_ports(self, remote_address):
+        return self.handler._get_ports(remote_address,
+                                       network_id=None,
+                                       router_id='router-id')
+
+    def test_get_ports(self):
+        with mock.patch.object(self.handler, '_get_router_networks',
+                               return_value=('net1', 'net2')):
+            ports = self._get_ports('10.0.1.2')
+            self.assertEqual(['device2'],
+                             [port['device_id'] for port in ports])
+            ports = self._get_ports('10.0.0.2')
+            self.assertEqual(['device1'],
+                             [port['device_id'] for port in ports])
+        self.list_ports.assert_called_once_with(
+            network_id=['net1', 'net2'],
+            fields=['network_id', 'device_id', 'tenant_id', 'fixed_ips'])
+
+    def test_get_ports_expired(self):
+        with mock.patch.object(self.handler, '_get_router_networks',
+                               return_value=('net1', 'net2')):
+            self._get_ports('10.0.0.2')
+            self.time.return_value = 105
+            self._get_ports('10.0.0.2')
+        self.assertEqual(2, self.list_ports.call_count)
+
+    def test_get_ports_unknown_address(self):
+        with mock.patch.object(self.handler, '_get_router_networks',
+                               return_value=('net1', 'net2')):
+            self._get_ports('10.0.0.2')
+            self.time.return_value = 101
+            # Fetched again, then remembered as a miss
+            self.assertEqual([], self._get_ports('10.0.0.3'))
+            self.assertEqual([], self._get_ports('10.0.0.3'))
+            self.assertEqual(2, self.list_ports.call_count)
+            self.time.return_value = 103
+            self.assertEqual([], self._get_ports('10.0.0.3'))
+            self.assertEqual(3, self.list_ports.call_count)
+
+    def test_get_ports_new_port(self):
+        self.list_ports.return_value['ports'].pop()
+        with mock.patch.object(self.handler, '_get_router_networks',
+                               return_value=('net1',)):
+            self._get_ports('10.0.0.2')
+            self.time.return_value = 101
+            self.list_ports.return_value = {'ports': [
+                {'network_id': 'net1', 'device_id': 'device3',
+                 'tenant_id': 'tenant1',
+                 'fixed_ips': [{'ip_address': '10.0.0.3'}]}]}
+            ports = self._get_ports('10.0.0.3')
+        self.assertEqual(['device3'], [port['device_id'] for port in ports])
+        self.list_ports.assert_called_with(
+            network_id=['net1'],
+            fields=['network_id', 'device_id', 'tenant_id', 'fixed_ips'])
+
+    def test_get_ports_old_hit_verified(self):
+        with mock.patch.object(self.handler, '_get_router_networks',
+                               return_value=('net1', 'net2')):
+            self._get_ports('10.0.0.2')
+            self.time.return_value = 103
+            self.list_ports.return_value = {'ports': [
+                self.list_ports.return_value['ports'][0]]}
+            ports = self._get_ports('10.0.0.2')
+        self.assertEqual(['device1'], [port['device_id'] for port in ports])
+        self.assertEqual(
+            [mock.call(network_id=['net1', 'net2'],
+                       fields=['network_id', 'device_id', 'tenant_id',
+                               'fixed_ips']),
+             mock.call(fixed_ips=['ip_address=10.0.0.2'])],
+            self.list_ports.mock_calls)
+
+    def test_get_ports_moved_address(self):
+        with mock.patch.object(self.handler, '_get_router_networks',
+                               return_value=('net1', 'net2')):
+            self._get_ports('10.0.0.2')
+            self.time.return_value = 103
+            # The address now belongs to another instance
+            self.list_ports.return_value = {'ports': [
+                {'network_id': 'net1', 'device_id': 'device3',
+                 'tenant_id': 'tenant1',
+                 'fixed_ips': [{'ip_address': '10.0.0.2'}]}]}
+            ports = self._get_ports('10.0.0.2')
+            self.assertEqual(['device3'],
+                             [port['device_id'] for port in ports])
+            # The networks are fetched again
+            ports = self._get_ports('10.0.0.2')
+            self.assertEqual(['device3'],
+                             [port['device_id'] for port in ports])
+        self.assertEqual(3, self.list_ports.call_count)
+        self.list_ports.assert_called_with(
+            network_id=['net1', 'net2'],
+            fields=['network_id', 'device_id', 'tenant_id', 'fixed_ips'])
+
+
 class TestUnixDomainHttpProtocol(base.BaseTestCase):
     def test_init_empty_client(self):
         u = agent.UnixDomainHttpProtocol(mock.Mock(), '', mock.Mock())
@@ -428,6 +428,73 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             result = policy.enforce(self.context, action, target)
             self.assertTrue(result)
 
+    def _test_filter_authorized(self, context, action, targets):
+        expected = [target for target in targets
+                    if policy.check(context, action, target)]
+        self.assertEqual(expected,
+                         policy.filter_authorized(context, action, targets))
+        return expected
+
+    def test_filter_authorized_owner_or_shared(self):
+        targets = [{'tenant_id': 'fake', 'shared': False},
+                   {'tenant_id': 'other', 'shared': False},
+                   {'tenant_id': 'other', 'shared': True}]
+        authorized = self._test_filter_authorized(
+            self.context, 'get_network', targets)
+        self.assertEqual([targets[0], targets[2]], authorized)
+
+    def test_filter_authorized_admin(self):
+        targets = [{'tenant_id': 'fake'}, {'tenant_id': 'other'}]
+        admin_context = context.get_admin_context()
+        with mock.patch.object(policy.OwnerCheck, '__call__') as owner_check:
+            self.assertEqual(targets, policy.filter_authorized(
+                admin_context, 'get_network', targets))
+        # The owner checks are not evaluated for an admin
+        self.assertFalse(owner_check.called)
+
+    def test_filter_authorized_not_check(self):
+        self.rules['get_network'] = common_policy.parse_rule(
+            'not role:user and not tenant_id:%(tenant_id)s')
+        policy.init()
+        targets = [{'tenant_id': 'fake'}, {'tenant_id': 'other'}]
+        self.assertEqual([], self._test_filter_authorized(
+            self.context, 'get_network', targets))
+        admin_context = context.Context('admin', 'other', roles=['admin'])
+        self.assertEqual([{'tenant_id': 'fake'}],
+                         self._test_filter_authorized(
+                             admin_context, 'get_network', targets))
+
+    def test_filter_authorized_missing_rule(self):
+        self.rules = dict(
+            (name, rule) for name, rule in self.rules.items()
+            if name not in ('get_network', 'default'))
+        policy.init()
+        self.assertEqual([], self._test_filter_authorized(
+            self.context, 'get_network', [{'tenant_id': 'fake'}]))
+
+    def test_filter_authorized_parent_resource(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            'rule:admin_or_network_owner')
+        policy.init()
+
+        def fakegetnetwork(context, network_id, fields=None):
+            return {'tenant_id': network_id}
+
+        targets = [{'network_id': 'fake'}, {'network_id': 'other'}]
+        with mock.patch.object(manager.NeutronManager.get_instance().plugin,
+                               'get_network', new=fakegetnetwork):
+            self.assertEqual([{'network_id': 'fake'}],
+                             [dict(network_id=target['network_id'])
+                              for target in policy.filter_authorized(
+                                  self.context, 'get_port', targets)])
+
+    def test_filter_authorized_write(self):
+        targets = [{'tenant_id': 'fake'}, {'tenant_id': 'fake',
+                                           'shared': True}]
+        self.assertEqual([{'tenant_id': 'fake'}],
+                         self._test_filter_authorized(
+                             self.context, 'create_network', targets))
+
     def test_enforce_plugin_failure(self):
 
         def fakegetnetwork(*args, **kwargs):
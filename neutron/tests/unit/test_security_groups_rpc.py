@@ -382,6 +382,117 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def _create_port_with_remote_group_rule(self, n, sg1_id, sg2_id):
+        rule1 = self._build_security_group_rule(
+            sg1_id,
+            'ingress', const.PROTO_NAME_TCP, '24',
+            '25', remote_group_id=sg2_id)
+        rules = {
+            'security_group_rules': [rule1['security_group_rule']]}
+        res = self._create_security_group_rule(self.fmt, rules)
+        self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+        ports = []
+        for security_groups in ([sg1_id, sg2_id], [sg2_id]):
+            res = self._create_port(
+                self.fmt, n['network']['id'],
+                security_groups=security_groups)
+            ports.append(self.deserialize(self.fmt, res)['port'])
+        return ports
+
+    def test_security_group_info_for_devices(self):
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group(),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1,
+                                                              sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                port1, port2 = self._create_port_with_remote_group_rule(
+                    n, sg1_id, sg2_id)
+                ctx = context.get_admin_context()
+                devices = [port1['id'], 'no_exist_device']
+                self.rpc.devices = {port1['id']: dict(port1)}
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                self.assertEqual([port1['id']], sg_info['devices'].keys())
+                self.assertEqual(
+                    sorted([sg1_id, sg2_id]),
+                    sorted(sg_info['devices'][port1['id']][
+                        'security_groups']))
+                self.assertEqual(sorted([sg1_id, sg2_id]),
+                                 sorted(sg_info['security_groups'].keys()))
+                self.assertEqual(
+                    {sg2_id: sorted(ip['ip_address']
+                                    for port in (port1, port2)
+                                    for ip in port['fixed_ips'])},
+                    dict((sg_id, sorted(ips)) for sg_id, ips in
+                         sg_info['sg_member_ips'].items()))
+
+                self.rpc.devices = {port1['id']: dict(port1)}
+                ports_rpc = self.rpc.security_group_rules_for_devices(
+                    ctx, devices=devices)
+                port_rpc = sg_rpc.convert_security_group_info(
+                    sg_info)[port1['id']]
+                self.assertEqual(
+                    sorted(ports_rpc[port1['id']]['security_group_rules']),
+                    sorted(port_rpc['security_group_rules']))
+                self.assertEqual([sg2_id],
+                                 port_rpc['security_group_source_groups'])
+                self._delete('ports', port1['id'])
+                self._delete('ports', port2['id'])
+
+    def test_security_group_info_for_devices_cache(self):
+        cfg.CONF.set_override('security_group_info_cache', True)
+        self.addCleanup(sg_db_rpc.SG_INFO_CACHE.invalidate_member_ips)
+        self.addCleanup(sg_db_rpc.SG_INFO_CACHE.invalidate_rules)
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group(),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1,
+                                                              sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                port1, port2 = self._create_port_with_remote_group_rule(
+                    n, sg1_id, sg2_id)
+                ctx = context.get_admin_context()
+                devices = [port1['id']]
+                self.rpc.devices = {port1['id']: dict(port1)}
+                self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+
+                with contextlib.nested(
+                    mock.patch.object(
+                        self.rpc, '_select_rules_for_security_groups'),
+                    mock.patch.object(
+                        self.rpc, '_select_ips_for_remote_group')
+                ) as (select_rules, select_ips):
+                    self.rpc.devices = {port1['id']: dict(port1)}
+                    sg_info = self.rpc.security_group_info_for_devices(
+                        ctx, devices=devices)
+                    self.assertFalse(select_rules.called)
+                    self.assertFalse(select_ips.called)
+                self.assertEqual(3, len(sg_info['security_groups'][sg1_id]))
+
+                # The test plugin doesn't invalidate the cache itself
+                rule = self._build_security_group_rule(
+                    sg1_id, 'ingress', const.PROTO_NAME_UDP, '53', '53')
+                self._create_security_group_rule(self.fmt, rule)
+                res = self._create_port(self.fmt, n['network']['id'],
+                                        security_groups=[sg2_id])
+                port3 = self.deserialize(self.fmt, res)['port']
+                sg_db_rpc.SG_INFO_CACHE.invalidate_rules([sg1_id])
+                sg_db_rpc.SG_INFO_CACHE.invalidate_member_ips([sg2_id])
+                self.rpc.devices = {port1['id']: dict(port1)}
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                self.assertEqual(4, len(sg_info['security_groups'][sg1_id]))
+                self.assertIn(port3['fixed_ips'][0]['ip_address'],
+                              sg_info['sg_member_ips'][sg2_id])
+                for port in (port1, port2, port3):
+                    self._delete('ports', port['id'])
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = FAKE_PREFIX[const.IPv6]
         fake_gateway = FAKE_IP[const.IPv6]
@@ -833,6 +944,33 @@ class SGServerRpcCallBackMixinTestCaseXML(SGServerRpcCallBackMixinTestCase):
     fmt = 'xml'
 
 
+class SecurityGroupInfoCacheTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupInfoCacheTestCase, self).setUp()
+        self.cache = sg_db_rpc.SecurityGroupInfoCache()
+        cfg.CONF.set_override('security_group_info_cache', True)
+
+    def test_enabled(self):
+        self.assertTrue(self.cache.enabled())
+
+    def test_disabled(self):
+        cfg.CONF.set_override('security_group_info_cache', False)
+        self.assertFalse(self.cache.enabled())
+
+    def _test_refused_with_workers(self, option):
+        cfg.CONF.set_override(option, 2)
+        with mock.patch.object(sg_db_rpc.LOG, 'error') as log_error:
+            self.assertFalse(self.cache.enabled())
+            self.assertFalse(self.cache.enabled())
+        self.assertEqual(1, log_error.call_count)
+
+    def test_refused_with_api_workers(self):
+        self._test_refused_with_workers('api_workers')
+
+    def test_refused_with_rpc_workers(self):
+        self._test_refused_with_workers('rpc_workers')
+
+
 class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
     def setUp(self):
         super(SGAgentRpcCallBackMixinTestCase, self).setUp()
@@ -885,6 +1023,7 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.firewall = self.firewall
         rpc = mock.Mock()
         self.agent.plugin_rpc = rpc
+        self.agent.use_security_group_info_rpc = False
         self.fake_device = {'device': 'fake_device',
                             'security_groups': ['fake_sgid1', 'fake_sgid2'],
                             'security_group_source_groups': ['fake_sgid2'],
@@ -962,6 +1101,68 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.refresh_firewall([])
         self.firewall.assert_has_calls([])
 
+    def _mock_security_group_info(self):
+        self.agent.use_security_group_info_rpc = True
+        sg_info = {
+            'devices': {'fake_device': {'device': 'fake_device',
+                                        'fixed_ips': ['10.0.0.2'],
+                                        'security_groups': ['fake_sgid1'],
+                                        'security_group_rules': []}},
+            'security_groups': {'fake_sgid1': [
+                {'direction': 'ingress', 'ethertype': const.IPv4,
+                 'security_group_id': 'fake_sgid1',
+                 'remote_group_id': 'fake_sgid2'}]},
+            'sg_member_ips': {'fake_sgid2': ['10.0.0.3', 'fe80::3']}}
+        self.agent.plugin_rpc.security_group_info_for_devices.return_value = (
+            sg_info)
+
+    def test_prepare_devices_filter_with_security_group_info(self):
+        self._mock_security_group_info()
+        self.agent.prepare_devices_filter(['fake_device'])
+        expected = {'device': 'fake_device',
+                    'fixed_ips': ['10.0.0.2'],
+                    'security_groups': ['fake_sgid1'],
+                    'security_group_source_groups': ['fake_sgid2'],
+                    'security_group_rules': [
+                        {'direction': 'ingress', 'ethertype': const.IPv4,
+                         'security_group_id': 'fake_sgid1',
+                         'remote_group_id': 'fake_sgid2',
+                         'source_ip_prefix': '10.0.0.3/32'}]}
+        self.firewall.prepare_port_filter.assert_called_once_with(expected)
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_rules_for_devices.called)
+
+    def _test_prepare_devices_filter_security_group_info_unsupported(
+            self, exc_type):
+        self._mock_security_group_info()
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = (
+            n_rpc.RemoteError(exc_type))
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall(['fake_device'])
+        self.firewall.prepare_port_filter.assert_called_once_with(
+            self.fake_device)
+        self.assertFalse(self.agent.use_security_group_info_rpc)
+        self.assertEqual(1, rpc.security_group_info_for_devices.call_count)
+        self.assertEqual(2, rpc.security_group_rules_for_devices.call_count)
+
+    def test_prepare_devices_filter_security_group_info_unsupported(self):
+        self._test_prepare_devices_filter_security_group_info_unsupported(
+            'NoSuchMethod')
+
+    def test_prepare_devices_filter_security_group_info_old_version(self):
+        # A server older than the call rejects its version
+        self._test_prepare_devices_filter_security_group_info_unsupported(
+            'UnsupportedVersion')
+
+    def test_prepare_devices_filter_security_group_info_error(self):
+        self._mock_security_group_info()
+        self.agent.plugin_rpc.security_group_info_for_devices.side_effect = (
+            n_rpc.RemoteError('ValueError'))
+        self.assertRaises(n_rpc.RemoteError,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+        self.assertTrue(self.agent.use_security_group_info_rpc)
+
 
 class SecurityGroupAgentRpcWithDeferredRefreshTestCase(
     SecurityGroupAgentRpcTestCase):
@@ -1186,6 +1387,16 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
               'namespace': None},
              version=sg_rpc.SG_RPC_VERSION)])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [mock.call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+              'method': 'security_group_info_for_devices',
+              'namespace': None},
+             version='1.2')])
+
 
 class FakeSGNotifierAPI(n_rpc.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -1233,6 +1444,37 @@ class SecurityGroupAgentRpcApiTestCase(base.BaseTestCase):
             None, security_groups=[])
         self.assertEqual(False, self.notifier.fanout_cast.called)
 
+    def test_security_groups_member_updated_merged(self):
+        cfg.CONF.set_override('sg_member_update_interval', 2)
+        with contextlib.nested(
+            mock.patch.object(sg_rpc.eventlet, 'spawn_n'),
+            mock.patch.object(sg_rpc.eventlet, 'sleep')
+        ) as (spawn_n, sleep):
+            self.notifier.security_groups_member_updated(
+                None, security_groups=['fake_sgid1'])
+            self.notifier.security_groups_member_updated(
+                None, security_groups=['fake_sgid1', 'fake_sgid2'])
+            self.assertFalse(self.notifier.fanout_cast.called)
+            self.assertEqual(1, spawn_n.call_count)
+            spawn_n.call_args[0][0]()
+            sleep.assert_called_once_with(2)
+        self.notifier.fanout_cast.assert_called_once_with(
+            None,
+            {'args': {'security_groups': mock.ANY},
+             'method': 'security_groups_member_updated',
+             'namespace': None},
+            version=sg_rpc.SG_RPC_VERSION,
+            topic='fake-security_group-update')
+        args = self.notifier.fanout_cast.call_args[0][1]['args']
+        self.assertEqual(['fake_sgid1', 'fake_sgid2'],
+                         sorted(args['security_groups']))
+
+        # The next update starts a new interval
+        with mock.patch.object(sg_rpc.eventlet, 'spawn_n') as spawn_n:
+            self.notifier.security_groups_member_updated(
+                None, security_groups=['fake_sgid3'])
+            self.assertEqual(1, spawn_n.call_count)
+
 #Note(nati) bn -> binary_name
 # id -> device_id
 
@@ -1831,6 +2073,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
         self.rpc = mock.Mock()
         self.agent.plugin_rpc = self.rpc
+        self.agent.use_security_group_info_rpc = False
         rule1 = [{'direction': 'ingress',
                   'protocol': const.PROTO_NAME_UDP,
                   'ethertype': const.IPv4,
@@ -2039,6 +2282,31 @@ class SGNotificationTestMixin():
                         [mock.call.security_groups_member_updated(
                             mock.ANY, [mock.ANY])])
 
+    def test_security_group_rule_updated_invalidates_cache(self):
+        with mock.patch.object(sg_db_rpc, 'SG_INFO_CACHE') as cache:
+            with self.security_group() as sg:
+                security_group_id = sg['security_group']['id']
+                with self.security_group_rule(security_group_id):
+                    pass
+            cache.invalidate_rules.assert_has_calls(
+                [mock.call([security_group_id]),
+                 mock.call([security_group_id])])
+
+    def test_security_group_member_updated_invalidates_cache(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    with mock.patch.object(sg_db_rpc,
+                                           'SG_INFO_CACHE') as cache:
+                        res = self._create_port(
+                            self.fmt, n['network']['id'],
+                            security_groups=[security_group_id])
+                        port = self.deserialize(self.fmt, res)
+                        self._delete('ports', port['port']['id'])
+                    cache.invalidate_member_ips.assert_any_call(
+                        [security_group_id])
+
 
 class TestSecurityGroupAgentWithOVSIptables(
         TestSecurityGroupAgentWithIptables):
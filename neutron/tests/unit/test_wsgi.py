@@ -602,6 +602,22 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        input_dict = {'networks': [{'id': 'a', 'name': u'\u7f51\u7edc'},
+                                   {'id': 'b', 'name': 'net2'}],
+                      'networks_links': [],
+                      'count': 2}
+        serializer = wsgi.JSONDictSerializer()
+        serializer.chunk_size = 10
+        chunks = list(serializer.serialize_iter(input_dict))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(serializer.serialize(input_dict), ''.join(chunks))
+
+    def test_serialize_iter_not_dict(self):
+        serializer = wsgi.JSONDictSerializer()
+        self.assertEqual(['[1, 2]'], list(serializer.serialize_iter([1, 2])))
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
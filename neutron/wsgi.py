@@ -390,11 +390,53 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Size of the chunks yielded by serialize_iter()
+    chunk_size = 65536
+
     def default(self, data):
         def sanitizer(obj):
             return unicode(obj)
         return jsonutils.dumps(data, default=sanitizer)
 
+    def serialize_iter(self, data):
+        """Serialize data as default() does, but by chunks.
+
+        The lists of a dict, like the collection of a list response, are
+        serialized one item at a time, so that the whole document is never
+        held in memory.
+        """
+        chunk = []
+        size = 0
+        for part in self._iter_parts(data):
+            chunk.append(part)
+            size += len(part)
+            if size >= self.chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield ''.join(chunk)
+
+    def _iter_parts(self, data):
+        if not isinstance(data, dict):
+            yield self.default(data)
+            return
+        yield '{'
+        for index, (key, value) in enumerate(data.iteritems()):
+            if index:
+                yield ', '
+            yield '%s: ' % self.default(key)
+            if isinstance(value, list):
+                yield '['
+                for item_index, item in enumerate(value):
+                    if item_index:
+                        yield ', '
+                    yield self.default(item)
+                yield ']'
+            else:
+                yield self.default(value)
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -0,0 +1,134 @@
+#    Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the memory taken by the network models of the DHCP agent cache.
+
+For each model a child process fills a NetworkCache with --networks
+networks of --ports ports each, decoded from JSON like the payload of
+get_active_networks_info, and reports how much its resident memory grew.
+The ports carry the attributes returned by an ML2 server with the port
+binding, security group and extra DHCP options extensions.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import os
+import resource
+import time
+import uuid
+
+from neutron.agent import dhcp_agent
+from neutron.agent.linux import dhcp
+from neutron.openstack.common import jsonutils
+
+MODELS = {
+    'dict': dhcp.NetModel,
+    'compact': dhcp.CompactNetModel,
+}
+
+
+def make_network(tenant_id, index, num_ports):
+    network_id = str(uuid.uuid4())
+    subnet_id = str(uuid.uuid4())
+    subnet = {
+        'id': subnet_id, 'name': 'subnet-%d' % index,
+        'network_id': network_id, 'tenant_id': tenant_id, 'ip_version': 4,
+        'cidr': '10.0.0.0/16', 'gateway_ip': '10.0.0.1', 'enable_dhcp': True,
+        'allocation_pools': [{'start': '10.0.0.2', 'end': '10.0.255.254'}],
+        'dns_nameservers': [], 'host_routes': [], 'shared': False,
+        'ipv6_ra_mode': None, 'ipv6_address_mode': None}
+    ports = []
+    for port_index in range(num_ports):
+        ip = port_index + 2
+        ports.append({
+            'id': str(uuid.uuid4()), 'name': '', 'network_id': network_id,
+            'tenant_id': tenant_id, 'admin_state_up': True,
+            'status': 'ACTIVE',
+            'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                index % 256, ip // 256 % 256, ip % 256),
+            'fixed_ips': [{'subnet_id': subnet_id,
+                           'ip_address': '10.0.%d.%d' % (ip // 256,
+                                                         ip % 256)}],
+            'device_id': str(uuid.uuid4()), 'device_owner': 'compute:nova',
+            'security_groups': [str(uuid.uuid4())],
+            'allowed_address_pairs': [], 'extra_dhcp_opts': [],
+            'binding:host_id': 'compute-%d' % (ip % 100),
+            'binding:vif_type': 'ovs', 'binding:vnic_type': 'normal',
+            'binding:vif_details': {'port_filter': True,
+                                    'ovs_hybrid_plug': True},
+            'binding:profile': {}})
+    network = {
+        'id': network_id, 'name': 'network-%d' % index,
+        'tenant_id': tenant_id, 'admin_state_up': True, 'status': 'ACTIVE',
+        'shared': False, 'subnets': [subnet], 'ports': ports}
+    # The strings received by the agent are unicode
+    return jsonutils.loads(jsonutils.dumps(network))
+
+
+def get_rss():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def fill_cache(model, args):
+    cache = dhcp_agent.NetworkCache()
+    tenant_id = str(uuid.uuid4())
+    gc.collect()
+    rss = get_rss()
+    start = time.time()
+    for index in range(args.networks):
+        cache.put(model(True, make_network(tenant_id, index, args.ports)))
+    elapsed = time.time() - start
+    gc.collect()
+    return get_rss() - rss, elapsed
+
+
+def run(name, args):
+    """Measure a model in a child process, so that each starts afresh."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read_fd)
+        rss, elapsed = fill_cache(MODELS[name], args)
+        os.write(write_fd, '%d %f' % (rss, elapsed))
+        os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 64)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    rss, elapsed = result.split()
+    rss = int(rss)
+    print('%-8s %d networks, %d ports: %.1f MiB (%d bytes per port), '
+          'loaded in %.2fs' %
+          (name, args.networks, args.networks * args.ports,
+           rss / 1048576.0, rss // max(args.networks * args.ports, 1),
+           float(elapsed)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--networks', type=int, default=500)
+    parser.add_argument('--ports', type=int, default=40,
+                        help='ports per network')
+    parser.add_argument('--models', nargs='+', default=sorted(MODELS),
+                        choices=sorted(MODELS))
+    args = parser.parse_args()
+    for name in args.models:
+        run(name, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#    Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the listing of ports with and without the column-only selects.
+
+--ports ports are created on a network, then get_ports() is called with
+the fields asked by GET /v2.0/ports?fields=id&fields=name, which adds the
+tenant_id needed by the policy, first loading the whole ports like before,
+then selecting only the columns of these fields.
+
+The default database is a temporary SQLite file. Use --connection to run
+against the database of a real deployment.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import tempfile
+import time
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.db import db_base_plugin_v2
+
+FIELDS = ['id', 'name', 'tenant_id']
+
+
+def create_ports(plugin, ctx, count):
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'list-benchmark', 'tenant_id': ctx.tenant_id,
+        'admin_state_up': True, 'shared': False}})
+    subnet = plugin.create_subnet(ctx, {'subnet': {
+        'name': '', 'tenant_id': ctx.tenant_id,
+        'network_id': network['id'], 'cidr': '10.0.0.0/16', 'ip_version': 4,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED,
+        'enable_dhcp': False, 'shared': False,
+        'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED}})
+    for index in range(count):
+        plugin.create_port(ctx, {'port': {
+            'name': 'port-%d' % index, 'tenant_id': ctx.tenant_id,
+            'network_id': network['id'], 'admin_state_up': True,
+            'device_id': '', 'device_owner': '',
+            'mac_address': attributes.ATTR_NOT_SPECIFIED,
+            'fixed_ips': [{'subnet_id': subnet['id']}]}})
+
+
+def measure(plugin, ctx, iterations):
+    start = time.time()
+    for _i in range(iterations):
+        ports = plugin.get_ports(ctx, fields=FIELDS)
+    return (time.time() - start) / iterations, len(ports)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connection',
+                        help='database to use instead of a SQLite file')
+    parser.add_argument('--ports', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    connection = args.connection
+    if connection is None:
+        connection = 'sqlite:///%s' % os.path.join(tempfile.mkdtemp(),
+                                                   'neutron.db')
+    cfg.CONF.set_override('connection', connection, 'database')
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    plugin = db_base_plugin_v2.NeutronDbPluginV2()
+    ctx = context.Context('', 'list-benchmark', is_admin=True)
+    create_ports(plugin, ctx, args.ports)
+
+    column_fields = db_base_plugin_v2.PORT_COLUMN_FIELDS
+    for name, fields in (('objects', frozenset()),
+                         ('columns', column_fields)):
+        db_base_plugin_v2.PORT_COLUMN_FIELDS = fields
+        elapsed, count = measure(plugin, ctx, args.iterations)
+        print('%-8s %d ports listed in %.1fms' % (name, count,
+                                                  elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#    Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the ovs-vsctl and native OVSDB interfaces of ovs_lib.
+
+Each iteration performs the OVSDB reads of one OVS agent rpc_loop scan:
+list the VIF ports, read their tags and look up the ofport of every port.
+
+Without --connection a stub ovsdb-server populated with --ports ports is
+started and only the native interface is measured, as ovs-vsctl needs a
+real server. Point --connection at a real ovsdb-server, e.g.
+unix:/var/run/openvswitch/db.sock, to compare both interfaces.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from oslo.config import cfg
+
+from neutron.agent.linux import ovs_lib
+from neutron.tests import fake_ovsdb_server
+
+
+class VsctlBridge(ovs_lib.OVSBridge):
+    """OVSBridge running ovs-vsctl against a given ovsdb-server."""
+
+    def __init__(self, br_name, root_helper, connection):
+        super(VsctlBridge, self).__init__(br_name, root_helper)
+        self.connection = connection
+
+    def run_vsctl(self, args, check_error=False):
+        return super(VsctlBridge, self).run_vsctl(
+            ['--db=%s' % self.connection] + args, check_error)
+
+
+def scan(bridge):
+    ports = bridge.get_vif_port_set()
+    bridge.get_port_tag_dict()
+    for name in bridge.get_port_name_list():
+        bridge.get_port_ofport(name)
+    return ports
+
+
+def measure(bridge, iterations):
+    scan(bridge)
+    start = time.time()
+    for _i in range(iterations):
+        scan(bridge)
+    return (time.time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connection',
+                        help='ovsdb-server to use instead of the stub')
+    parser.add_argument('--bridge', default='br-int')
+    parser.add_argument('--ports', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--root-helper', default=None)
+    args = parser.parse_args()
+
+    connection = args.connection
+    if connection is None:
+        server = fake_ovsdb_server.FakeOvsdbServer()
+        server.add_bridge(args.bridge, port_count=args.ports)
+        server.start()
+        connection = server.connection
+
+    cfg.CONF.set_override('ovsdb_interface', 'native')
+    cfg.CONF.set_override('ovsdb_connection', connection)
+    bridge = ovs_lib.OVSBridge(args.bridge, args.root_helper)
+    native = measure(bridge, args.iterations)
+    ports = len(bridge.get_port_name_list())
+    print('native: %.4fs per scan of %d ports' % (native, ports))
+
+    if args.connection is None:
+        print('vsctl: skipped, pass --connection to a real ovsdb-server')
+        return
+    cfg.CONF.set_override('ovsdb_interface', 'vsctl')
+    vsctl = measure(VsctlBridge(args.bridge, args.root_helper, connection),
+                    args.iterations)
+    print('vsctl: %.4fs per scan of %d ports (%.1fx)' %
+          (vsctl, ports, vsctl / native))
+
+
+if __name__ == '__main__':
+    main()
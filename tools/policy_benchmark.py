@@ -0,0 +1,89 @@
+#    Copyright 2014 Midokura SARL.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the policy checks of a list request, per item and compiled.
+
+The authorization of the --ports ports returned by a GET /v2.0/ports is
+checked against --policy-file, first with one policy.check() per port like
+the API controller used to, then with policy.filter_authorized(). Half of
+the ports belong to the tenant of the member context.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import time
+import uuid
+
+from oslo.config import cfg
+
+from neutron.common import config  # noqa
+from neutron import context
+from neutron import policy
+
+POLICY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'etc', 'policy.json')
+
+
+def make_ports(tenant_id, count):
+    return [{'id': str(uuid.uuid4()), 'name': '',
+             'network_id': str(uuid.uuid4()),
+             'tenant_id': tenant_id if index % 2 else str(uuid.uuid4()),
+             'admin_state_up': True, 'status': 'ACTIVE',
+             'mac_address': 'fa:16:3e:00:00:01',
+             'fixed_ips': [{'subnet_id': str(uuid.uuid4()),
+                            'ip_address': '10.0.0.2'}],
+             'device_id': str(uuid.uuid4()), 'device_owner': 'compute:nova'}
+            for index in range(count)]
+
+
+def check_each(ctx, ports):
+    return [port for port in ports if policy.check(ctx, 'get_port', port)]
+
+
+def filter_authorized(ctx, ports):
+    return policy.filter_authorized(ctx, 'get_port', ports)
+
+
+def measure(func, ctx, ports, iterations):
+    start = time.time()
+    for _i in range(iterations):
+        authorized = func(ctx, ports)
+    return (time.time() - start) / iterations, len(authorized)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--policy-file', default=POLICY_FILE)
+    parser.add_argument('--ports', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    cfg.CONF.set_override('policy_file', os.path.abspath(args.policy_file))
+    policy.init()
+    tenant_id = str(uuid.uuid4())
+    ports = make_ports(tenant_id, args.ports)
+    contexts = [('admin', context.get_admin_context()),
+                ('member', context.Context('user', tenant_id,
+                                           roles=['member']))]
+    for name, ctx in contexts:
+        for func in (check_each, filter_authorized):
+            elapsed, count = measure(func, ctx, ports, args.iterations)
+            print('%-7s %-18s %d of %d ports in %.1fms' %
+                  (name, func.__name__, count, args.ports, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()